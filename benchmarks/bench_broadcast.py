@@ -0,0 +1,180 @@
+"""
+Бенчмарк вечерней рассылки итогов дня (services.broadcast)
+
+Создаёт базу с --users пользователями, у каждого по --meals записей за
+сегодня и --history записей за прошлые дни на всех. Сравнивает подсчёт
+итогов одним запросом с группировкой и запросом SUM на каждого
+пользователя, затем рассылает итоги через SendScheduler на локальный
+Bot API (FakeTelegram): рассылка останавливается через --stop секунд,
+как при перезапуске бота, и продолжается заново. В конце проверяется,
+что каждый пользователь получил ровно одно сообщение.
+
+Лимит Telegram — около 30 сообщений в секунду; чтобы измерить сам
+конвейер, общий лимит планировщика задаётся --rate.
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_broadcast --users 100000
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+from collections import Counter
+from datetime import date, timedelta
+
+os.environ.setdefault("BOT_TOKEN", "42:benchmark")
+
+TMP = tempfile.mkdtemp(prefix="bench_broadcast_")
+# Путь к базе читается при импорте database.db
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{os.path.join(TMP, 'bench.db')}"
+
+from aiogram import Bot  # noqa: E402
+from aiogram.client.session.aiohttp import AiohttpSession  # noqa: E402
+from aiogram.client.telegram import TelegramAPIServer  # noqa: E402
+from sqlalchemy import select  # noqa: E402
+
+from benchmarks.fake_telegram import FakeTelegram  # noqa: E402
+
+API_PORT = 18096
+# Первый telegram_id: чаты пользователей не пересекаются с id в базе
+CHAT_OFFSET = 5_000_000
+
+
+async def prepare(args):
+    from database.db import engine, init_db
+
+    await init_db()
+    rnd = random.Random(1)
+    today = date.today()
+    async with engine.begin() as conn:
+        await conn.exec_driver_sql(
+            "INSERT INTO users (id, telegram_id, daily_goal, created_at) VALUES (?, ?, ?, ?)",
+            [(user_id, CHAT_OFFSET + user_id, rnd.choice((1800, 2000, 2500)), today.isoformat())
+             for user_id in range(1, args.users + 1)]
+        )
+        await conn.exec_driver_sql("INSERT INTO products (name, kcal_per_100g, source) VALUES ('гречка', 110, 'seed')")
+        rows = [
+            (rnd.randint(1, args.users), rnd.randint(50, 400) * 110, (today - timedelta(days=rnd.randint(1, 90))).isoformat())
+            for _ in range(args.history)
+        ]
+        rows += [
+            (user_id, rnd.randint(50, 400) * 110, today.isoformat())
+            for user_id in range(1, args.users + 1) for _ in range(args.meals)
+        ]
+        await conn.exec_driver_sql(
+            "INSERT INTO meals (user_id, product_id, grams, calories_x100, date) VALUES (?, 1, 100, ?, ?)", rows
+        )
+
+
+async def compare_queries(args):
+    from database.db import read_session_maker
+    from database.models import Meal, User
+    from services.broadcast import day_totals
+
+    async with read_session_maker() as session:
+        started = time.perf_counter()
+        totals = await day_totals(session, date.today())
+        grouped = time.perf_counter() - started
+
+        # Как без группировки: запрос пользователей и SUM на каждого (замер на части)
+        sample = min(args.users, 2000)
+        started = time.perf_counter()
+        users = (await session.execute(select(User.id, User.telegram_id, User.daily_goal).limit(sample))).all()
+        for user in users:
+            await session.scalar(
+                select(Meal.calories_sum()).where(Meal.user_id == user.id, Meal.date == date.today())
+            )
+        naive = (time.perf_counter() - started) * args.users / sample
+
+    print(
+        f"Итоги дня {len(totals)} пользователей: одним запросом {grouped * 1000:.0f} мс, "
+        f"запросом на каждого ~{naive * 1000:.0f} мс (оценка по {sample})"
+    )
+    return totals
+
+
+async def run(args):
+    from database.db import engine
+    from services.broadcast import CHECKPOINT_KEY, run_broadcast
+    from services.send_scheduler import SendScheduler
+    from database.models import Meta
+
+    await prepare(args)
+    totals = await compare_queries(args)
+    expected = {CHAT_OFFSET + total.user_id for total in totals}
+
+    fake = FakeTelegram(latency=args.latency)
+    received = Counter()
+    fake.on_call = lambda method, params: received.update([int(params["chat_id"])]) if method == "sendMessage" else None
+    runner = await fake.start(port=API_PORT)
+
+    scheduler = SendScheduler(global_rate=args.rate, chat_rate=1, chat_burst=1)
+    session = AiohttpSession(api=TelegramAPIServer.from_base(f"http://127.0.0.1:{API_PORT}"))
+    session.middleware(scheduler)
+    bot = Bot(token=os.environ["BOT_TOKEN"], session=session)
+
+    try:
+        started = time.perf_counter()
+        first = asyncio.create_task(run_broadcast(bot))
+        await asyncio.sleep(args.stop)
+        # Остановка бота посреди рассылки
+        first.cancel()
+        try:
+            await first
+        except asyncio.CancelledError:
+            pass
+        before_restart = sum(received.values())
+        async with engine.connect() as conn:
+            checkpoint = await conn.scalar(
+                select(Meta.value).where(Meta.key == CHECKPOINT_KEY.format(day=date.today().isoformat()))
+            )
+        print(
+            f"Остановка через {args.stop:.0f} с: отправлено {before_restart}, "
+            f"сохранённый прогресс {len(checkpoint)} байт"
+        )
+
+        stats = await run_broadcast(bot)
+        elapsed = time.perf_counter() - started
+        again = await run_broadcast(bot)
+    finally:
+        await bot.session.close()
+        await runner.cleanup()
+
+    duplicates = sum(1 for count in received.values() if count > 1)
+    missed = len(expected - set(received))
+    print(
+        f"После перезапуска: отправлено {stats.sent}, уже получили {stats.skipped}; повторный запуск "
+        f"отправил {again.sent}\n"
+        f"Всего {len(expected)} пользователей за {elapsed:.1f} с ({len(expected) / elapsed:,.0f} в секунду, "
+        f"лимит планировщика {args.rate:.0f}); при лимите Telegram 30 в секунду — "
+        f"{len(expected) / 30 / 60:.0f} мин\n"
+        f"Получили дважды: {duplicates}, не получили: {missed}, "
+        f"чатов в памяти планировщика после паузы: ",
+        end=""
+    )
+    await asyncio.sleep(1.5)
+    print(len(scheduler._chats))
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--meals", type=int, default=3, help="записей за сегодня у каждого")
+    parser.add_argument("--history", type=int, default=500_000, help="записей за прошлые дни")
+    parser.add_argument("--rate", type=float, default=5000, help="общий лимит планировщика, сообщений в секунду")
+    parser.add_argument("--latency", type=float, default=0.01, help="задержка ответа Bot API, с")
+    parser.add_argument("--stop", type=float, default=10, help="через сколько секунд остановить рассылку")
+    args = parser.parse_args()
+
+    from database.db import close_db
+
+    try:
+        await run(args)
+    finally:
+        await close_db()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
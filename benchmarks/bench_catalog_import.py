@@ -0,0 +1,121 @@
+"""
+Бенчмарк потокового импорта каталога
+
+Генерирует файл с заданным числом строк (около 3% повторов названий
+и 1% некорректных записей), импортирует его во временную базу и
+печатает время, скорость и пиковую память процесса. С --interrupt
+импорт прерывается после первой пачки и продолжается с --resume.
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_catalog_import --rows 1000000
+    python -m benchmarks.bench_catalog_import --rows 1000000 --format csv --gzip
+"""
+import argparse
+import asyncio
+import csv
+import gzip
+import json
+import os
+import random
+import resource
+import tempfile
+import time
+
+os.environ.setdefault("BOT_TOKEN", "42:benchmark")
+
+WORDS = [
+    "сыр", "молоко", "хлеб", "йогурт", "кефир", "творог", "рис", "гречка", "овсянка",
+    "яблоко", "банан", "груша", "курица", "говядина", "рыба", "сок", "печенье", "шоколад"
+]
+BRANDS = ["Домик", "Простоквашино", "Агуша", "Слобода", "Мираторг", "Макфа", "Бабаевский"]
+
+
+def generate(path: str, rows: int, file_format: str, seed: int = 1):
+    rnd = random.Random(seed)
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "wt", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f, delimiter="\t") if file_format == "csv" else None
+        if writer:
+            writer.writerow(["code", "product_name", "energy-kcal_100g"])
+        for i in range(rows):
+            # Повтор названия из недавних строк: в дампах одно и то же встречается у разных штрихкодов
+            n = i - rnd.randint(1, 1000) if i > 1000 and rnd.random() < 0.03 else i
+            name = f"{WORDS[n % len(WORDS)]}  {BRANDS[n % len(BRANDS)]} {n}"
+            kcal = "" if rnd.random() < 0.01 else round(rnd.uniform(0, 600), 1)
+            if writer:
+                writer.writerow([i, name, kcal])
+            else:
+                f.write(json.dumps({"code": i, "product_name": name, "energy-kcal_100g": kcal}, ensure_ascii=False))
+                f.write("\n")
+
+
+async def run(args, path: str):
+    from database.db import engine, init_db, close_db
+    from services.catalog_import import import_catalog
+
+    await init_db()
+    try:
+        started = time.perf_counter()
+        if args.interrupt:
+            await _interrupted(engine, path, args)
+        stats = await import_catalog(engine, path, "bench", batch_size=args.batch_size, resume=args.interrupt)
+        elapsed = time.perf_counter() - started
+        async with engine.connect() as conn:
+            count = (await conn.exec_driver_sql("SELECT count(*) FROM products WHERE source = 'bench'")).scalar()
+    finally:
+        await close_db()
+
+    print(
+        f"{args.rows} строк ({os.path.getsize(path) / 2 ** 20:.0f} МБ): {elapsed:.1f} с, "
+        f"{args.rows / elapsed:,.0f} строк/с\n"
+        f"    прочитано {stats.read}, записано {stats.written}, пропущено {stats.skipped}, "
+        f"повторов в пачках {stats.duplicates}, в таблице {count}\n"
+        f"    пик памяти процесса {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} МБ"
+    )
+
+
+async def _interrupted(engine, path: str, args):
+    """Импорт, оборванный после первой пачки"""
+    import services.catalog_import as catalog_import
+
+    original = catalog_import._write_batch
+    calls = 0
+
+    async def write_batch(*a, **kw):
+        nonlocal calls
+        calls += 1
+        if calls > 1:
+            raise KeyboardInterrupt
+        return await original(*a, **kw)
+
+    catalog_import._write_batch = write_batch
+    try:
+        await catalog_import.import_catalog(engine, path, "bench", batch_size=args.batch_size)
+    except KeyboardInterrupt:
+        print("⏹️ Импорт прерван после первой пачки")
+    finally:
+        catalog_import._write_batch = original
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--format", choices=("jsonl", "csv"), default="jsonl")
+    parser.add_argument("--gzip", action="store_true")
+    parser.add_argument("--batch-size", type=int, default=50_000)
+    parser.add_argument("--interrupt", action="store_true", help="прервать и продолжить импорт")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, f"catalog.{args.format}" + (".gz" if args.gzip else ""))
+        started = time.perf_counter()
+        generate(path, args.rows, args.format)
+        print(f"Файл сгенерирован за {time.perf_counter() - started:.1f} с")
+
+        # База создаётся при импорте database.db, поэтому путь задаём заранее
+        os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{os.path.join(tmp, 'bench.db')}"
+        asyncio.run(run(args, path))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+"""
+Бенчмарк выгрузки истории (/export)
+
+Создаёт пользователя с --rows записями (часть из них переносится в архив),
+выгружает историю потоково и наивно (все строки в память) и печатает время
+и пиковую память Python (tracemalloc). Затем проверяет содержимое файла и
+отправляет /export от нескольких пользователей одновременно через диспетчер:
+лишние выгрузки получают отказ, а обработчики в это время отвечают.
+
+Ещё --archive-users пользователей получают историю в архивных месяцах;
+выгрузка пользователя с короткой историей по оглавлению архива
+сравнивается с чтением архивных месяцев целиком.
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_export --rows 300000
+"""
+import argparse
+import asyncio
+import csv
+import gzip
+import io
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+os.environ.setdefault("BOT_TOKEN", "42:benchmark")
+
+TMP = tempfile.mkdtemp(prefix="bench_export_")
+# Путь к базе читается при импорте database.db
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{os.path.join(TMP, 'bench.db')}"
+os.environ["ARCHIVE_DIR"] = os.path.join(TMP, "archive")
+os.environ["FSM_STORAGE"] = "memory"
+
+from aiogram import Bot  # noqa: E402
+from aiogram.types import Update  # noqa: E402
+from sqlalchemy import select  # noqa: E402
+
+from benchmarks.fake_telegram import FakeSession, message_update  # noqa: E402
+
+USERS = 8
+
+
+async def prepare(rows: int, days: int, archive: bool, archive_users: int):
+    from database.db import engine, read_engine, init_db
+    from services.archive import archive_meals
+
+    await init_db()
+    rnd = random.Random(1)
+    today = date.today()
+    async with engine.begin() as conn:
+        await conn.exec_driver_sql(
+            "INSERT INTO users (id, telegram_id, daily_goal, created_at) VALUES (?, ?, 2000, ?)",
+            [(user_id, user_id, today.isoformat()) for user_id in range(1, USERS + archive_users + 1)]
+        )
+        batch = []
+        for i in range(rows):
+            grams = rnd.randint(50, 400)
+            day = today - timedelta(days=days - 1 - i * days // rows)
+            batch.append((1, f"продукт {i % 500}", grams, grams * 150, day.isoformat()))
+        # Остальным пользователям — небольшая история
+        for user_id in range(2, USERS + 1):
+            batch += [(user_id, "яблоко", 100, 5200, today.isoformat())] * 200
+        # И истории тех, кто записывал давно: они попадают в те же архивные месяцы
+        for user_id in range(USERS + 1, USERS + archive_users + 1):
+            batch += [
+                (user_id, "каша", 250, 25000, (today - timedelta(days=rnd.randint(120, days))).isoformat())
+                for _ in range(20)
+            ]
+        await conn.exec_driver_sql(
+            "INSERT INTO meals (user_id, product_name, grams, calories_x100, date) VALUES (?, ?, ?, ?, ?)", batch
+        )
+        await conn.exec_driver_sql(
+            "INSERT INTO daily_summaries (user_id, date, calories_x100, items, goal) "
+            "SELECT user_id, date, sum(calories_x100), count(*), 2000 FROM meals GROUP BY user_id, date"
+        )
+    if archive:
+        stats = await archive_meals(engine, read_engine, os.environ["ARCHIVE_DIR"], after_days=90)
+        print(f"В архиве {stats.archived} записей за {stats.months} мес.")
+
+
+async def naive_export(session, user_id: int) -> bytes:
+    """Как сделали бы без потоковой выгрузки: все строки в память"""
+    from database.models import Meal
+
+    result = await session.execute(select(Meal).where(Meal.user_id == user_id).order_by(Meal.date, Meal.id))
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for meal in result.scalars().all():
+        writer.writerow((meal.date.isoformat(), meal.name, meal.grams, round(meal.calories, 2)))
+    return gzip.compress(buffer.getvalue().encode())
+
+
+async def measure(title: str, coro_factory):
+    # Время — без tracemalloc (он сильно замедляет), память — отдельным прогоном
+    started = time.perf_counter()
+    await coro_factory()
+    elapsed = time.perf_counter() - started
+    tracemalloc.start()
+    result = await coro_factory()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{title}: {elapsed:.2f} с, пик памяти Python {peak / 2 ** 20:.1f} МБ")
+    return result
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=300_000)
+    parser.add_argument("--days", type=int, default=3 * 365, help="за сколько дней история")
+    parser.add_argument("--no-archive", action="store_true", help="не переносить старые записи в архив")
+    parser.add_argument("--archive-users", type=int, default=10_000, help="пользователей с историей в архиве")
+    args = parser.parse_args()
+
+    import bot as bot_module
+
+    try:
+        await run(args, bot_module)
+    finally:
+        await bot_module.on_shutdown()
+
+
+async def run(args, bot_module):
+    from database.db import read_session_maker
+    from services.export import write_export
+
+    await prepare(args.rows, args.days, not args.no_archive, args.archive_users)
+
+    async def streaming():
+        async with read_session_maker() as session:
+            spool, count = await write_export(session, 1, "csv", os.environ["ARCHIVE_DIR"])
+            with spool:
+                data = spool.read()
+            return data, count
+
+    async def naive():
+        async with read_session_maker() as session:
+            return await naive_export(session, 1)
+
+    data, count = await measure(f"Потоковая выгрузка ({count_label(args)})", streaming)
+    if args.no_archive:
+        await measure("Наивная выгрузка (все строки в память)", naive)
+
+    lines = gzip.decompress(data).decode().splitlines()
+    dates = [line.split(",", 1)[0] for line in lines[1:]]
+    print(
+        f"    файл {len(data) / 2 ** 20:.1f} МБ, строк {len(lines) - 1} из {args.rows}, "
+        f"по порядку дат: {'да' if dates == sorted(dates) else 'НЕТ'}"
+    )
+
+    if not args.no_archive:
+        await compare_archive_index(os.environ["ARCHIVE_DIR"])
+
+    # Одновременные /export и обычные обработчики через диспетчер
+    session = FakeSession()
+    bot = Bot(token=os.environ["BOT_TOKEN"], session=session)
+    dp = bot_module.create_dispatcher(await bot_module.create_storage())
+    latencies = []
+
+    async def feed(raw):
+        started = time.perf_counter()
+        result = await dp.feed_update(bot, Update.model_validate(raw, context={"bot": bot}))
+        if result is not None and not isinstance(result, bool):
+            await bot(result)
+        return time.perf_counter() - started
+
+    async def interactive():
+        for i in range(20):
+            latencies.append(await feed(message_update(10_000 + i, 2, "📊 Статистика дня")))
+
+    started = time.perf_counter()
+    # Сначала большая выгрузка, пока она идёт — повтор от того же пользователя и выгрузки других
+    big = asyncio.create_task(feed(message_update(1, 1, "/export")))
+    await asyncio.sleep(0.2)
+    await asyncio.gather(
+        big,
+        *(feed(message_update(i, user_id, "/export")) for i, user_id in enumerate([1] + list(range(2, 6)), 2)),
+        interactive()
+    )
+    print(
+        f"6 одновременных /export за {time.perf_counter() - started:.2f} с: отправлено документов "
+        f"{session.calls['SendDocument']}, отказов {session.calls['SendMessage'] - len(latencies)}; "
+        f"«Статистика дня» в это время: p50 {statistics.median(latencies) * 1000:.0f} мс, "
+        f"max {max(latencies) * 1000:.0f} мс"
+    )
+
+
+async def compare_archive_index(archive_dir: str):
+    """Выгрузка короткой истории по оглавлению архива и чтение месяцев целиком"""
+    from database.db import read_session_maker
+    from services.export import write_export
+
+    async def export_small():
+        async with read_session_maker() as session:
+            spool, count = await write_export(session, USERS + 1, "csv", archive_dir)
+            spool.close()
+            return count
+
+    started = time.perf_counter()
+    count = await export_small()
+    with_index = time.perf_counter() - started
+
+    # Без оглавления пришлось бы распаковать и разобрать каждый месяц целиком
+    paths = [os.path.join(archive_dir, name) for name in os.listdir(archive_dir) if name.endswith(".jsonl.gz")]
+    started = time.perf_counter()
+    count_without = await asyncio.get_running_loop().run_in_executor(None, scan_archive, paths, USERS + 1)
+    without_index = time.perf_counter() - started
+    print(
+        f"Выгрузка {count} записей из {len(paths)} архивных месяцев: по оглавлению {with_index * 1000:.0f} мс, "
+        f"распаковкой месяцев целиком {without_index * 1000:.0f} мс"
+        + ("" if count == count_without else f" (НЕ СОВПАДАЕТ: {count_without})")
+    )
+
+
+def scan_archive(paths, user_id: int) -> int:
+    count = 0
+    for path in paths:
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            count += sum(json.loads(line)["user_id"] == user_id for line in f)
+    return count
+
+
+def count_label(args) -> str:
+    return f"{args.rows} записей" + ("" if args.no_archive else ", часть в архиве")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,75 @@
+"""
+Бенчмарк хранилища FSM: задержка get/set и память на активные диалоги
+
+Сравнивает MemoryStorage из aiogram и SQLiteStorage. Каждый диалог —
+это set_state + update_data(product_id=...) + get_state + get_data,
+как в сценарии добавления продукта.
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_fsm_storage --dialogs 100000
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+import tracemalloc
+
+os.environ.setdefault("BOT_TOKEN", "0:benchmark")
+
+from aiogram.fsm.storage.base import StorageKey  # noqa: E402
+from aiogram.fsm.storage.memory import MemoryStorage  # noqa: E402
+
+from benchmarks.latency import percentile  # noqa: E402
+from database.fsm_storage import SQLiteStorage  # noqa: E402
+from states.user_states import AddProductStates  # noqa: E402
+
+
+async def run(title: str, storage, dialogs: int):
+    timings = {"set": [], "get": []}
+
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+
+    for user_id in range(1, dialogs + 1):
+        key = StorageKey(bot_id=1, chat_id=user_id, user_id=user_id)
+
+        started = time.perf_counter()
+        await storage.set_state(key, AddProductStates.waiting_for_grams)
+        await storage.update_data(key, {"product_id": user_id % 1000})
+        timings["set"].append((time.perf_counter() - started) * 1000)
+
+        started = time.perf_counter()
+        await storage.get_state(key)
+        await storage.get_data(key)
+        timings["get"].append((time.perf_counter() - started) * 1000)
+
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    memory = sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+
+    print(f"{title}: {memory / dialogs:.0f} байт на диалог, {memory / 1024 / 1024:.1f} МБ всего")
+    for kind, values in timings.items():
+        print(
+            f"    {kind}  p50 {statistics.median(values) * 1000:7.1f} мкс | "
+            f"p99 {percentile(values, 0.99) * 1000:7.1f} мкс"
+        )
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dialogs", type=int, default=100_000)
+    args = parser.parse_args()
+
+    await run("MemoryStorage", MemoryStorage(), args.dialogs)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        storage = SQLiteStorage(f"sqlite+aiosqlite:///{os.path.join(tmp, 'fsm.db')}", cache_size=args.dialogs)
+        await storage.start()
+        await run("SQLiteStorage", storage, args.dialogs)
+        await storage.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
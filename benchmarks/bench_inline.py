@@ -0,0 +1,140 @@
+"""
+Бенчмарк подсказок inline-режима (ProductIndex.complete)
+
+Строит индекс из --size синтетических продуктов с популярностью по закону
+Ципфа и «набирает» названия по буквам, как пользователь в поле ввода:
+на каждое нажатие — запрос по префиксу. Печатает время построения и
+задержки без кэша, с кэшем ответов по префиксам и через Dispatcher
+(обработчик inline-запроса с FakeSession). Для сравнения — перебор всего
+каталога на каждый запрос. Затем индекс перестраивается в пуле потоков,
+пока идут запросы: они не должны ни падать, ни получать пустой ответ.
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_inline --size 1000000
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import tempfile
+import time
+
+os.environ.setdefault("BOT_TOKEN", "42:benchmark")
+# Путь к базе читается при импорте database.db; в этом бенчмарке база не используется
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+os.environ["FSM_STORAGE"] = "memory"
+
+from aiogram import Bot  # noqa: E402
+from aiogram.types import Update  # noqa: E402
+
+from benchmarks.bench_product_index import make_names  # noqa: E402
+from benchmarks.latency import percentile  # noqa: E402
+from benchmarks.fake_telegram import FakeSession, inline_update  # noqa: E402
+from services.product_index import IndexedProduct, product_index  # noqa: E402
+
+
+def rss_mb() -> float:
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+
+
+def keystrokes(names, count: int, rnd: random.Random):
+    """Префиксы, которые видит бот, пока пользователи набирают названия"""
+    queries = []
+    while len(queries) < count:
+        name = rnd.choice(names)
+        queries += [name[:length] for length in range(1, len(name) + 1)]
+    return queries[:count]
+
+
+def report(title: str, latencies):
+    print(
+        f"{title:38} p50 {statistics.median(latencies):7.3f} мс | "
+        f"p99 {percentile(latencies, 0.99):7.3f} мс | max {max(latencies):7.2f} мс"
+    )
+
+
+def timed(function, queries):
+    latencies = []
+    for query in queries:
+        started = time.perf_counter()
+        function(query)
+        latencies.append((time.perf_counter() - started) * 1000)
+    return latencies
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=1_000_000)
+    parser.add_argument("--queries", type=int, default=20_000)
+    parser.add_argument("--popular-share", type=float, default=0.1, help="доля продуктов, которые хоть раз добавляли")
+    args = parser.parse_args()
+
+    rnd = random.Random(1)
+    names = make_names(args.size)
+    products = [IndexedProduct(i, name, rnd.randint(20, 600)) for i, name in enumerate(names, 1)]
+    popular = rnd.sample(range(1, args.size + 1), int(args.size * args.popular_share))
+    popularity = {product_id: int(10_000 / rank) + 1 for rank, product_id in enumerate(popular, 1)}
+
+    rss = rss_mb()
+    started = time.perf_counter()
+    product_index.load(products, popularity, version="bench")
+    print(
+        f"{args.size} продуктов: индекс построен за {time.perf_counter() - started:.1f} с, "
+        f"память процесса +{rss_mb() - rss:.0f} МБ, готовых списков для частых префиксов "
+        f"{len(product_index._snapshot.dense)}"
+    )
+
+    queries = keystrokes(names, args.queries, rnd)
+    cache_size = product_index.completion_cache_size
+    product_index.completion_cache_size = 0
+    report("Без кэша ответов", timed(lambda query: product_index.complete(query, 20), queries))
+    product_index.completion_cache_size = cache_size
+    timed(lambda query: product_index.complete(query, 20), queries)
+    report("Кэш ответов по префиксам (повтор)", timed(lambda query: product_index.complete(query, 20), queries))
+
+    def scan(query):
+        # Без индекса: перебор всего каталога
+        found = [product for product in products if product.name.startswith(query)]
+        found.sort(key=lambda product: (-popularity.get(product.id, 0), len(product.name)))
+        return found[:20]
+
+    report("Перебор каталога", timed(scan, queries[:50]))
+
+    # Через диспетчер: обработчик строит ответ Telegram
+    import bot as bot_module
+
+    session = FakeSession()
+    bot = Bot(token=os.environ["BOT_TOKEN"], session=session)
+    dp = bot_module.create_dispatcher(await bot_module.create_storage())
+    updates = [
+        Update.model_validate(inline_update(i, 1 + i % 1000, query), context={"bot": bot})
+        for i, query in enumerate(queries[:5000], 1)
+    ]
+    latencies = []
+    for update in updates:
+        started = time.perf_counter()
+        result = await dp.feed_update(bot, update)
+        await bot(result)
+        latencies.append((time.perf_counter() - started) * 1000)
+    report("Апдейт через Dispatcher", latencies)
+
+    # Перестроение во время запросов: читатели видят старый индекс, затем новый целиком
+    loop = asyncio.get_running_loop()
+    rebuild = loop.run_in_executor(None, product_index.load, products, popularity, "rebuilt")
+    latencies, empty, checked = [], 0, 0
+    while not rebuild.done() or not checked:
+        for query in rnd.sample(queries, 100):
+            started = time.perf_counter()
+            empty += not product_index.complete(query, 20)
+            latencies.append((time.perf_counter() - started) * 1000)
+        checked += 100
+        await asyncio.sleep(0.01)
+    await rebuild
+    report(f"Во время перестроения ({checked} запросов)", latencies)
+    print(f"Пустых ответов во время перестроения: {empty}, версия индекса: {product_index.version}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
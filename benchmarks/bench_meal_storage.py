@@ -0,0 +1,258 @@
+"""
+Размер базы и время запросов по meals до и после перехода на компактные записи
+
+Создаёт базу в старом формате (название продукта строкой и калории float
+в каждой записи) с --rows записями --users пользователей, меряет размер и
+запросы по сырым строкам meals, затем применяет миграцию m0004 и фоновый
+перенос (services.meal_backfill). Во время переноса пишет новые записи,
+как обработчики, и меряет их задержку. После переноса база сжимается
+VACUUM и те же запросы повторяются; суммы калорий и названия сверяются
+со старыми.
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_meal_storage --rows 2000000
+"""
+import argparse
+import asyncio
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+from datetime import date, timedelta
+
+from benchmarks.latency import percentile
+
+os.environ.setdefault("BOT_TOKEN", "42:benchmark")
+
+TMP = tempfile.mkdtemp(prefix="bench_meal_storage_")
+DB_PATH = os.path.join(TMP, "bench.db")
+# Путь к базе читается при импорте database.db
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{DB_PATH}"
+
+# Таблица meals до миграции m0004
+LEGACY_MEALS_DDL = (
+    "CREATE TABLE meals ("
+    " id INTEGER NOT NULL,"
+    " user_id INTEGER NOT NULL,"
+    " product_name VARCHAR NOT NULL,"
+    " grams INTEGER NOT NULL,"
+    " calories FLOAT NOT NULL,"
+    " date DATE NOT NULL,"
+    " PRIMARY KEY (id),"
+    " FOREIGN KEY(user_id) REFERENCES users (id)"
+    ")"
+)
+
+WORDS = (
+    "куриная грудка", "гречка отварная", "творог", "овсяная каша", "йогурт",
+    "сыр", "хлеб ржаной", "яблоко", "банан", "картофель", "говядина тушёная",
+    "рис", "макароны", "салат овощной", "омлет", "кефир", "суп куриный",
+)
+
+# (название, старый запрос, новый запрос)
+QUERIES = (
+    (
+        "продукты за день",
+        "SELECT product_name, grams, calories FROM meals WHERE user_id = :user AND date = :day ORDER BY id",
+        "SELECT coalesce(meals.product_name, (SELECT products.name FROM products "
+        "WHERE products.id = meals.product_id), '') AS name, grams, calories_x100 / 100.0 "
+        "FROM meals WHERE user_id = :user AND date = :day ORDER BY id",
+    ),
+    (
+        "калории по дням за 90 дней",
+        "SELECT date, sum(calories) FROM meals WHERE user_id = :user AND date >= :since GROUP BY date",
+        "SELECT date, sum(calories_x100) / 100.0 FROM meals WHERE user_id = :user AND date >= :since GROUP BY date",
+    ),
+    (
+        "сверка итогов (все строки)",
+        "SELECT user_id, date, sum(calories), count(id) FROM meals GROUP BY user_id, date",
+        "SELECT user_id, date, sum(calories_x100) / 100.0, count(id) FROM meals GROUP BY user_id, date",
+    ),
+)
+
+
+def create_legacy_db(args) -> int:
+    """Создать базу в старом формате; возвращает сумму калорий в сотых долях ккал"""
+    from sqlalchemy import create_engine
+    from database.models import Base
+
+    sync_engine = create_engine(f"sqlite:///{DB_PATH}")
+    Base.metadata.create_all(sync_engine, tables=[table for table in Base.metadata.sorted_tables if table.name != "meals"])
+    sync_engine.dispose()
+
+    rnd = random.Random(1)
+    today = date.today()
+    conn = sqlite3.connect(DB_PATH)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute(LEGACY_MEALS_DDL)
+    conn.execute("CREATE INDEX ix_meals_user_date ON meals (user_id, date)")
+    # База, на которой уже применены миграции до m0004
+    conn.execute(
+        "CREATE TABLE schema_version (version INTEGER PRIMARY KEY, name VARCHAR NOT NULL,"
+        " applied_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP)"
+    )
+    conn.executemany(
+        "INSERT INTO schema_version (version, name) VALUES (?, ?)",
+        [(1, "meals_user_date_index"), (2, "backfill_daily_summaries"), (3, "product_source")]
+    )
+
+    products = [(f"{rnd.choice(WORDS)} {i}", rnd.randint(20, 600)) for i in range(args.products)]
+    # Часть продуктов из истории уже удалена из каталога
+    removed = int(len(products) * args.removed_share)
+    conn.executemany("INSERT INTO products (name, kcal_per_100g, source) VALUES (?, ?, 'seed')", products[removed:])
+    conn.executemany(
+        "INSERT INTO users (id, telegram_id, daily_goal, created_at) VALUES (?, ?, 2000, ?)",
+        [(user_id, user_id, today.isoformat()) for user_id in range(1, args.users + 1)]
+    )
+
+    total = 0
+
+    def rows():
+        nonlocal total
+        for i in range(args.rows):
+            name, kcal = products[rnd.randrange(len(products))]
+            grams = rnd.randint(30, 400)
+            total += kcal * grams
+            # Записи идут по времени: id растёт вместе с датой
+            day = today - timedelta(days=args.days - 1 - i * args.days // args.rows)
+            yield rnd.randint(1, args.users), name, grams, kcal * grams / 100, day.isoformat()
+
+    conn.executemany("INSERT INTO meals (user_id, product_name, grams, calories, date) VALUES (?, ?, ?, ?, ?)", rows())
+    conn.execute(
+        # Таблицу итогов create_all создал уже в новом формате (m0006)
+        "INSERT INTO daily_summaries (user_id, date, calories_x100, items, goal) "
+        "SELECT user_id, date, sum(CAST(round(calories * 100) AS INTEGER)), count(*), 2000 "
+        "FROM meals GROUP BY user_id, date"
+    )
+    conn.commit()
+    conn.close()
+    return total
+
+
+def measure_db(title: str, new: bool, args):
+    conn = sqlite3.connect(DB_PATH)
+    page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+    pages = conn.execute("PRAGMA page_count").fetchone()[0]
+    free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    try:
+        tables = dict(conn.execute(
+            "SELECT name, sum(pgsize) FROM dbstat WHERE name IN ('meals', 'ix_meals_user_date') GROUP BY name"
+        ).fetchall())
+    except sqlite3.OperationalError:
+        # SQLite без dbstat
+        tables = {}
+    rows = conn.execute("SELECT count(*) FROM meals").fetchone()[0]
+
+    print(f"\n{title}")
+    print(
+        f"    файл {os.path.getsize(DB_PATH) / 2 ** 20:7.1f} МБ, занято {(pages - free) * page_size / 2 ** 20:7.1f} МБ, "
+        f"свободно {free * page_size / 2 ** 20:6.1f} МБ"
+    )
+    if tables:
+        print(
+            f"    meals {tables['meals'] / 2 ** 20:.1f} МБ ({tables['meals'] / rows:.1f} байт на запись), "
+            f"индекс ix_meals_user_date {tables['ix_meals_user_date'] / 2 ** 20:.1f} МБ"
+        )
+
+    rnd = random.Random(2)
+    today = date.today()
+    for name, old_sql, new_sql in QUERIES:
+        repeat = 3 if "все строки" in name else args.repeat
+        durations = []
+        for _ in range(repeat):
+            params = {"user": rnd.randint(1, args.users), "day": today.isoformat(), "since": (today - timedelta(days=90)).isoformat()}
+            started = time.perf_counter()
+            conn.execute(new_sql if new else old_sql, params).fetchall()
+            durations.append(time.perf_counter() - started)
+        print(f"    {name:30} {statistics.median(durations) * 1000:8.2f} мс")
+    conn.close()
+
+
+async def migrate(args, expected_total: int):
+    from database.db import init_db, close_db, engine, async_session_maker
+    from services.meal_backfill import BATCH_SIZE, backfill_meals
+    from services.meals import MealEntry, insert_meal
+
+    started = time.perf_counter()
+    await init_db()
+    print(f"\nМиграция при запуске (m0004): {time.perf_counter() - started:.2f} с")
+
+    latencies = []
+    probe_total = 0
+
+    async def add_meal():
+        async with async_session_maker() as session:
+            await insert_meal(session, MealEntry(1, 1, 100, 52.0, date.today(), 2000))
+            await session.commit()
+
+    async def probe(done: asyncio.Event):
+        # Запись новых приёмов пищи, как в обработчиках, пока идёт перенос
+        nonlocal probe_total
+        while not done.is_set():
+            started = time.perf_counter()
+            await add_meal()
+            latencies.append(time.perf_counter() - started)
+            probe_total += 5200
+            await asyncio.sleep(0.01)
+
+    # Первая запись прогревает соединение и компиляцию запросов
+    await add_meal()
+    probe_total += 5200
+
+    done = asyncio.Event()
+    probe_task = asyncio.create_task(probe(done))
+    started = time.perf_counter()
+    moved = await backfill_meals(engine, args.batch or BATCH_SIZE)
+    elapsed = time.perf_counter() - started
+    done.set()
+    await probe_task
+    await close_db()
+
+    print(
+        f"Фоновый перенос: {moved} записей за {elapsed:.1f} с ({moved / elapsed:,.0f} в секунду); "
+        f"запись во время переноса ({len(latencies)} шт.): p50 {statistics.median(latencies) * 1000:.1f} мс, "
+        f"p99 {percentile(latencies, 0.99) * 1000:.1f} мс, max {max(latencies) * 1000:.1f} мс"
+    )
+
+    conn = sqlite3.connect(DB_PATH)
+    total, snapshots, unlinked = conn.execute(
+        "SELECT sum(calories_x100), count(product_name), count(*) - count(product_id) FROM meals"
+    ).fetchone()
+    conn.close()
+    print(
+        f"Сумма калорий совпадает: {'да' if total == expected_total + probe_total else 'НЕТ'}; "
+        f"записей со снимком названия (продукт удалён из каталога): {snapshots}, без ссылки на продукт: {unlinked}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=2_000_000)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--days", type=int, default=3 * 365, help="за сколько дней история")
+    parser.add_argument("--products", type=int, default=5000)
+    parser.add_argument("--removed-share", type=float, default=0.02, help="доля продуктов, удалённых из каталога")
+    parser.add_argument("--batch", type=int, help="строк за транзакцию при переносе (по умолчанию как в боте)")
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    expected_total = create_legacy_db(args)
+    print(f"База в старом формате создана за {time.perf_counter() - started:.1f} с ({args.rows} записей)")
+    measure_db("До: название и калории (float) в каждой записи", False, args)
+
+    asyncio.run(migrate(args, expected_total))
+    measure_db("После переноса (до VACUUM)", True, args)
+
+    conn = sqlite3.connect(DB_PATH)
+    started = time.perf_counter()
+    conn.execute("VACUUM")
+    conn.close()
+    print(f"\nVACUUM: {time.perf_counter() - started:.1f} с")
+    measure_db("После: ссылка на продукт и калории в сотых долях ккал (после VACUUM)", True, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+Микробенчмарк разбора ввода: прежний parse_meal_input против текущего
+
+Прежняя версия передавала в re.match строку шаблона на каждом вызове
+(поиск в кэше модуля re), текущая использует шаблоны, скомпилированные
+при импорте. Отдельно замеряется разбор строки из нескольких продуктов.
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_parser --number 200000
+"""
+import argparse
+import re
+import timeit
+
+from services.parser import parse_meal_input, parse_meal_items
+
+SAMPLES = ["яблоко 150", "куриная грудка 200 г", "/add рис 200гр", "сметана 10% 50", "привет", "банан"]
+MULTI = "яблоко 150, банан 120г; рис 200, куриная грудка 180 гр, творог 5% 100"
+
+
+def parse_meal_input_before(text: str):
+    """parse_meal_input до перехода на скомпилированные шаблоны"""
+    text = text.strip()
+    if text.lower().startswith('/add'):
+        text = text[4:].strip()
+
+    pattern = r'^(.+?)\s+(\d+)\s*(?:г|гр|грамм|граммов)?\.?$'
+    match = re.match(pattern, text, re.IGNORECASE)
+
+    if match:
+        return {"product": match.group(1).strip().lower(), "grams": int(match.group(2))}
+    return None
+
+
+def measure(title: str, func, samples, number: int):
+    seconds = timeit.timeit(lambda: [func(sample) for sample in samples], number=number)
+    per_call = seconds / (number * len(samples)) * 1e9
+    print(f"{title:<40}{per_call:8.0f} нс/вызов")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--number", type=int, default=200_000)
+    args = parser.parse_args()
+
+    for sample in SAMPLES:
+        assert parse_meal_input(sample) == parse_meal_input_before(sample), sample
+
+    measure("parse_meal_input (до)", parse_meal_input_before, SAMPLES, args.number)
+    measure("parse_meal_input", parse_meal_input, SAMPLES, args.number)
+    measure("parse_meal_items, 1 продукт", parse_meal_items, SAMPLES, args.number)
+    measure("parse_meal_items, 5 продуктов", parse_meal_items, [MULTI], args.number)
+
+
+if __name__ == "__main__":
+    main()
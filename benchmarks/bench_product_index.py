@@ -0,0 +1,98 @@
+"""
+Бенчмарк нечёткого поиска по индексу продуктов
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_product_index --sizes 1000 100000 1000000
+"""
+import argparse
+import difflib
+import random
+import statistics
+import time
+from typing import List
+
+from benchmarks.latency import percentile
+from services.product_index import ProductIndex, IndexedProduct
+
+SYLLABLES = [
+    "ка", "ро", "ма", "ни", "ле", "бо", "ту", "ша", "гре", "чи", "ват", "ко",
+    "сыр", "мо", "ло", "ри", "са", "дки", "пе", "ль", "ов", "ин", "ая", "ый"
+]
+
+
+def make_names(count: int, seed: int = 1) -> List[str]:
+    """Синтетические уникальные названия из 1-3 слов"""
+    rnd = random.Random(seed)
+    names = set()
+    while len(names) < count:
+        words = [
+            "".join(rnd.choice(SYLLABLES) for _ in range(rnd.randint(2, 4)))
+            for _ in range(rnd.randint(1, 3))
+        ]
+        names.add(" ".join(words))
+    return list(names)
+
+
+def make_typo(name: str, rnd: random.Random) -> str:
+    """Название с одной опечаткой: пропуск, замена или перестановка буквы"""
+    if len(name) < 3:
+        return name + "а"
+    i = rnd.randrange(len(name) - 1)
+    kind = rnd.randrange(3)
+    if kind == 0:
+        return name[:i] + name[i + 1:]
+    if kind == 1:
+        return name[:i] + rnd.choice("аеиоуы") + name[i + 1:]
+    return name[:i] + name[i + 1] + name[i] + name[i + 2:]
+
+
+def run(size: int, queries: int, baseline: bool):
+    names = make_names(size)
+    index = ProductIndex()
+
+    started = time.perf_counter()
+    index.load(IndexedProduct(i, name, 100) for i, name in enumerate(names, 1))
+    build_time = time.perf_counter() - started
+
+    rnd = random.Random(2)
+    samples = [make_typo(rnd.choice(names), rnd) for _ in range(queries)]
+
+    latencies = []
+    for query in samples:
+        started = time.perf_counter()
+        index.similar(query)
+        latencies.append((time.perf_counter() - started) * 1000)
+
+    print(
+        f"{size:>9} продуктов | построение {build_time:6.2f} с | "
+        f"p50 {statistics.median(latencies):7.2f} мс | "
+        f"p99 {percentile(latencies, 0.99):7.2f} мс"
+    )
+
+    if baseline:
+        # Старый подход: difflib по всему каталогу на каждый промах
+        latencies = []
+        for query in samples[:max(1, min(queries, 20_000_000 // size // 100))]:
+            started = time.perf_counter()
+            difflib.get_close_matches(query, names, n=5, cutoff=0.6)
+            latencies.append((time.perf_counter() - started) * 1000)
+        print(
+            f"{'':>9} difflib    | {'':>13} | "
+            f"p50 {statistics.median(latencies):7.2f} мс | "
+            f"p99 {percentile(latencies, 0.99):7.2f} мс"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 100_000, 1_000_000])
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--baseline", action="store_true", help="сравнить с полным перебором difflib")
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        run(size, args.queries, args.baseline)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""
+Стоимость одной записи о приёме пищи: по шагам, одной строкой и из избранного
+
+Каждый из --users пользователей --meals раз добавляет один из своих
+привычных продуктов тремя способами через настоящий Dispatcher
+(FakeSession вместо Telegram): «➕ Добавить продукт» → название → граммы,
+текстом «яблоко 150» и нажатием кнопки «⭐ Избранное». Для каждого способа
+печатаются сообщения пользователя, поиски по каталогу, SQL-запросы и
+вызовы Bot API на одну запись, а также время обработки.
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_quick_add --users 200 --meals 20
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import tempfile
+import time
+from pathlib import Path
+
+os.environ.setdefault("BOT_TOKEN", "42:benchmark")
+# Путь к базе читается при импорте database.db
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+os.environ["FSM_STORAGE"] = "memory"
+
+from aiogram import Bot  # noqa: E402
+from aiogram.types import Update  # noqa: E402
+from sqlalchemy import event  # noqa: E402
+
+from benchmarks.fake_telegram import FakeSession, callback_update, message_update  # noqa: E402
+
+PRODUCTS_PATH = Path(__file__).parent.parent / "data" / "products.json"
+# Сколько продуктов у пользователя в привычном рационе
+HABITS = 6
+
+
+class Counters:
+    def __init__(self):
+        self.updates = self.statements = self.searches = 0
+        self.seconds = 0.0
+
+
+async def run(args, bot_module):
+    import services.product_search as product_search
+    from database.db import engine, read_engine
+
+    names = [item["name"] for item in json.loads(PRODUCTS_PATH.read_text(encoding="utf-8"))]
+    rnd = random.Random(1)
+    habits = {user_id: [(rnd.choice(names), rnd.choice((100, 150, 200, 250))) for _ in range(HABITS)]
+              for user_id in range(1, args.users + 1)}
+
+    session = FakeSession()
+    bot = Bot(token=os.environ["BOT_TOKEN"], session=session)
+    dp = bot_module.create_dispatcher(await bot_module.create_storage())
+    update_ids = itertools.count(1)
+    counters = {}
+    current = None
+
+    def count_statement(*_):
+        if current is not None:
+            current.statements += 1
+
+    for sync_engine in (engine.sync_engine, read_engine.sync_engine):
+        event.listen(sync_engine, "before_cursor_execute", count_statement)
+
+    # Поиски по каталогу: точный и похожие
+    for name in ("find_product", "find_products", "find_similar_products"):
+        original = getattr(product_search, name)
+
+        async def counted(*a, _original=original, **kw):
+            if current is not None:
+                current.searches += 1
+            return await _original(*a, **kw)
+
+        setattr(product_search, name, counted)
+    # Обработчики импортировали функции напрямую
+    import handlers.add_meal as add_meal
+    for name in ("find_product", "find_products", "find_similar_products"):
+        setattr(add_meal, name, getattr(product_search, name))
+
+    async def feed(raw):
+        current.updates += 1
+        started = time.perf_counter()
+        result = await dp.feed_update(bot, Update.model_validate(raw, context={"bot": bot}))
+        if result is not None and not isinstance(result, bool):
+            await bot(result)
+        current.seconds += time.perf_counter() - started
+
+    async def steps(user_id, name, grams):
+        await feed(message_update(next(update_ids), user_id, "➕ Добавить продукт"))
+        await feed(message_update(next(update_ids), user_id, name))
+        await feed(message_update(next(update_ids), user_id, str(grams)))
+
+    async def one_line(user_id, name, grams):
+        await feed(message_update(next(update_ids), user_id, f"{name} {grams}"))
+
+    opened = set()
+
+    async def quick(user_id, name, grams):
+        # Клавиатуру избранного пользователь открывает один раз, дальше нажимает кнопки под ней
+        if user_id not in opened:
+            opened.add(user_id)
+            await feed(message_update(next(update_ids), user_id, "⭐ Избранное"))
+        buttons = session.keyboards.get(user_id, [])
+        await feed(callback_update(next(update_ids), user_id, rnd.choice(buttons)))
+
+    for title, flow in (("По шагам", steps), ("Одной строкой", one_line), ("Из избранного", quick)):
+        session.calls.clear()
+        current = counters[title] = Counters()
+        for _ in range(args.meals):
+            for user_id, foods in habits.items():
+                await flow(user_id, *rnd.choice(foods))
+        current = None
+
+        meals = args.meals * args.users
+        print(
+            f"{title:15} на запись: сообщений {counters[title].updates / meals:4.2f}, "
+            f"поисков {counters[title].searches / meals:4.2f}, SQL {counters[title].statements / meals:5.2f}, "
+            f"вызовов API {sum(session.calls.values()) / meals:4.2f}, "
+            f"обработка {counters[title].seconds / meals * 1000:5.2f} мс"
+        )
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--meals", type=int, default=20, help="записей на пользователя каждым способом")
+    args = parser.parse_args()
+
+    import bot as bot_module
+
+    await (await bot_module.on_startup())
+    try:
+        await run(args, bot_module)
+    finally:
+        await bot_module.on_shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,188 @@
+"""
+Блюда пользователей: запись одной строкой и пересчёт при изменении каталога
+
+Сначала через настоящий Dispatcher (FakeSession вместо Telegram)
+пользователь сохраняет блюдо из --ingredients продуктов командой /recipe
+и --meals раз записывает порцию: названием блюда («блюдо 300») и, для
+сравнения, перечислением ингредиентов в пересчёте на порцию. Печатаются
+SQL-запросы, строки в meals и время обработки на одну порцию.
+
+Затем каталог дополняется до --catalog продуктов, в БД создаются
+--recipes блюд из случайных продуктов и у --changed продуктов меняется
+калорийность. Пересчёт через индекс зависимостей (refresh_recipes)
+сравнивается с полным пересчётом всех блюд, а сохранённая калорийность
+каждого блюда — с посчитанной заново по составу.
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_recipes --catalog 1000000 --recipes 100000 --changed 1000
+"""
+import argparse
+import asyncio
+import itertools
+import os
+import random
+import tempfile
+import time
+
+os.environ.setdefault("BOT_TOKEN", "42:benchmark")
+# Путь к базе читается при импорте database.db
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+os.environ["FSM_STORAGE"] = "memory"
+
+from aiogram import Bot  # noqa: E402
+from aiogram.types import Update  # noqa: E402
+from sqlalchemy import event, func, insert, select, update  # noqa: E402
+
+from benchmarks.bench_product_index import make_names  # noqa: E402
+from benchmarks.fake_telegram import FakeSession, message_update  # noqa: E402
+
+USER_ID = 1
+
+
+async def log_meals(args, bot_module, names):
+    from database.db import engine, read_engine, async_session_maker
+    from database.models import Meal
+
+    session = FakeSession()
+    bot = Bot(token=os.environ["BOT_TOKEN"], session=session)
+    dp = bot_module.create_dispatcher(await bot_module.create_storage())
+    update_ids = itertools.count(1)
+    statements = 0
+
+    def count_statement(*_):
+        nonlocal statements
+        statements += 1
+
+    for sync_engine in (engine.sync_engine, read_engine.sync_engine):
+        event.listen(sync_engine, "before_cursor_execute", count_statement)
+
+    async def feed(text):
+        result = await dp.feed_update(bot, Update.model_validate(
+            message_update(next(update_ids), USER_ID, text), context={"bot": bot}
+        ))
+        await bot(result)
+        return result.text
+
+    rnd = random.Random(1)
+    ingredients = [(name, rnd.randint(50, 400)) for name in rnd.sample(names, args.ingredients)]
+    weight = sum(grams for _, grams in ingredients)
+    await feed("/recipe блюдо дня")
+    await feed(", ".join(f"{name} {grams}" for name, grams in ingredients))
+    print((await feed("-")).splitlines()[3])
+
+    portion = 300
+    scaled = ", ".join(f"{name} {max(1, round(grams * portion / weight))}" for name, grams in ingredients)
+    for title, text in (("Блюдом", f"блюдо дня {portion}"), ("Ингредиентами", scaled)):
+        async with async_session_maker() as db:
+            rows_before = await db.scalar(select(func.count()).select_from(Meal))
+        statements = 0
+        started = time.perf_counter()
+        for _ in range(args.meals):
+            answer = await feed(text)
+        elapsed = time.perf_counter() - started
+        async with async_session_maker() as db:
+            rows = await db.scalar(select(func.count()).select_from(Meal)) - rows_before
+        print(
+            f"{title:14} на порцию: SQL {statements / args.meals:5.2f}, строк в meals {rows / args.meals:4.1f}, "
+            f"обработка {elapsed / args.meals * 1000:5.2f} мс | "
+            + next(line for line in answer.splitlines() if line.startswith(("🍽️ Блюдо", "🔥 Всего")))
+        )
+
+
+async def refresh(args):
+    from database.db import async_session_maker
+    from database.models import Product, Recipe, RecipeIngredient, User
+    from services.recipes import recipe_density, refresh_recipes
+
+    rnd = random.Random(2)
+    async with async_session_maker() as session:
+        # Синтетические продукты, как после импорта большого каталога
+        existing = await session.scalar(select(func.count()).select_from(Product))
+        await session.execute(
+            insert(Product),
+            [{"name": f"{name} бенч", "kcal_per_100g": rnd.randint(20, 600), "source": "bench"}
+             for name in make_names(max(0, args.catalog - existing))]
+        )
+        products = (await session.execute(select(Product.id, Product.kcal_per_100g))).all()
+        kcal = dict(products)
+        product_ids = list(kcal)
+
+        users = max(1, args.recipes // 10)
+        await session.execute(insert(User), [{"telegram_id": 10 ** 6 + i} for i in range(users)])
+        first_user = await session.scalar(select(func.min(User.id)).where(User.telegram_id > 10 ** 6))
+        recipes, ingredients = [], []
+        for recipe_id in range(1, args.recipes + 1):
+            parts = [(product_id, rnd.randint(20, 400)) for product_id in rnd.sample(product_ids, args.ingredients)]
+            cooked = rnd.choice((None, sum(grams for _, grams in parts) * 4 // 5))
+            recipes.append({
+                "id": 10 ** 6 + recipe_id, "user_id": first_user + recipe_id % users, "name": f"блюдо {recipe_id}",
+                "cooked_grams": cooked, "kcal_per_100g": recipe_density(((kcal[p], g) for p, g in parts), cooked)
+            })
+            ingredients += [
+                {"recipe_id": 10 ** 6 + recipe_id, "product_id": p, "grams": g, "kcal_per_100g": kcal[p]}
+                for p, g in parts
+            ]
+        await session.execute(insert(Recipe), recipes)
+        await session.execute(insert(RecipeIngredient), ingredients)
+        await session.commit()
+    print(f"{len(recipes)} блюд, {len(ingredients)} ингредиентов, в каталоге {len(product_ids)} продуктов")
+
+    changed = rnd.sample(product_ids, args.changed)
+    async with async_session_maker() as session:
+        for product_id in changed:
+            await session.execute(
+                update(Product).where(Product.id == product_id).values(kcal_per_100g=Product.kcal_per_100g + 7)
+            )
+        started = time.perf_counter()
+        refreshed = await refresh_recipes(session, changed)
+        await session.commit()
+    print(
+        f"Изменено продуктов {len(changed)}: через индекс зависимостей пересчитано {refreshed} блюд "
+        f"за {(time.perf_counter() - started) * 1000:.0f} мс"
+    )
+
+    # Полный пересчёт: все ингредиенты с текущей калорийностью продуктов
+    async with async_session_maker() as session:
+        started = time.perf_counter()
+        rows = await session.execute(
+            select(RecipeIngredient.recipe_id, Product.kcal_per_100g, RecipeIngredient.grams, Recipe.cooked_grams,
+                   Recipe.kcal_per_100g)
+            .join(Product, Product.id == RecipeIngredient.product_id)
+            .join(Recipe, Recipe.id == RecipeIngredient.recipe_id)
+            .order_by(RecipeIngredient.recipe_id)
+        )
+        mismatched = total = 0
+        for _, group in itertools.groupby(rows, key=lambda row: row.recipe_id):
+            group = list(group)
+            expected = recipe_density(((row[1], row.grams) for row in group), group[0].cooked_grams)
+            mismatched += abs(expected - group[0][4]) > 1e-6
+            total += 1
+        elapsed = time.perf_counter() - started
+    print(f"Полный перебор {total} блюд (без записи): {elapsed * 1000:.0f} мс; расходится с пересчитанными: {mismatched}")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--ingredients", type=int, default=8, help="продуктов в блюде")
+    parser.add_argument("--meals", type=int, default=200, help="записей порции каждым способом")
+    parser.add_argument("--catalog", type=int, default=1_000_000, help="продуктов в каталоге")
+    parser.add_argument("--recipes", type=int, default=100_000)
+    parser.add_argument("--changed", type=int, default=1000, help="продуктов с изменённой калорийностью")
+    args = parser.parse_args()
+
+    import bot as bot_module
+    from database.models import Product
+    from database.db import async_session_maker
+
+    await (await bot_module.on_startup())
+    try:
+        async with async_session_maker() as session:
+            names = list(await session.scalars(select(Product.name)))
+        await log_meals(args, bot_module, names)
+        await refresh(args)
+    finally:
+        await bot_module.on_shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,316 @@
+"""
+Воспроизведение синтетического потока апдейтов через настоящий Dispatcher
+
+Генерирует реалистичную смесь сценариев: добавление продуктов (в том
+числе с опечатками и отменой), статистика, удаление, смена нормы,
+очистка дня. Апдейты проходят через роутеры бота с временной базой
+и FakeSession вместо Telegram. Для каждого обработчика считаются
+задержки p50/p95/p99 и число SQL-запросов на апдейт.
+
+Результат сохраняется в JSON; с --compare выводится разница с прошлым
+прогоном.
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_replay --users 200 --flows 20
+    python -m benchmarks.bench_replay --stream updates.jsonl --compare benchmarks/results/old.json
+"""
+import argparse
+import asyncio
+import contextvars
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterator, List
+
+_tmp = tempfile.mkdtemp()
+os.environ.setdefault("BOT_TOKEN", "42:benchmark")
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{os.path.join(_tmp, 'bench.db')}"
+os.environ["FSM_STORAGE"] = "memory"
+
+import logging  # noqa: E402
+
+from aiogram import Bot  # noqa: E402
+from aiogram.fsm.storage.memory import MemoryStorage  # noqa: E402
+from aiogram.methods import TelegramMethod  # noqa: E402
+from sqlalchemy import event  # noqa: E402
+
+import bot as bot_module  # noqa: E402
+from benchmarks.latency import percentile  # noqa: E402
+from benchmarks.fake_telegram import FakeSession, callback_update, message_update  # noqa: E402
+from database.db import engine, read_engine  # noqa: E402
+
+RESULTS_DIR = Path(__file__).parent / "results"
+PRODUCTS_PATH = Path(__file__).parent.parent / "data" / "products.json"
+
+# Заглушка в потоке: при воспроизведении заменяется первой кнопкой удаления,
+# которую бот показал этому пользователю
+DELETE_PLACEHOLDER = "delete_*"
+
+# Сценарий и его доля в потоке
+FLOWS = {
+    "add": 0.38,
+    "add_typo": 0.15,
+    "add_cancel": 0.05,
+    "day_stats": 0.15,
+    "general_stats": 0.08,
+    "delete": 0.08,
+    "goal": 0.05,
+    "help": 0.04,
+    "reset": 0.02,
+}
+
+# Метрики текущего апдейта: обработчик и число SQL-запросов
+_current: contextvars.ContextVar[Dict[str, Any]] = contextvars.ContextVar("replay_current")
+
+
+def _typo(name: str, rng: random.Random) -> str:
+    """Название с одной опечаткой: пропущенная, лишняя или переставленная буква"""
+    if len(name) < 4:
+        return name + name[-1]
+    i = rng.randrange(1, len(name) - 1)
+    kind = rng.choice(("drop", "double", "swap"))
+    if kind == "drop":
+        return name[:i] + name[i + 1:]
+    if kind == "double":
+        return name[:i] + name[i] + name[i:]
+    return name[:i - 1] + name[i] + name[i - 1] + name[i + 1:]
+
+
+def _flow(kind: str, products: List[str], rng: random.Random) -> List[Any]:
+    """Шаги сценария: текст сообщения или ("callback", data)"""
+    name = rng.choice(products)
+    grams = str(rng.choice((50, 100, 150, 200, 250, 300)))
+    if kind == "add":
+        return ["➕ Добавить продукт", name, grams]
+    if kind == "add_typo":
+        return ["➕ Добавить продукт", _typo(name, rng), name, grams]
+    if kind == "add_cancel":
+        return ["➕ Добавить продукт", "❌ Отмена"]
+    if kind == "day_stats":
+        return ["📊 Статистика дня"]
+    if kind == "general_stats":
+        return ["📈 Общая статистика"]
+    if kind == "delete":
+        return ["🗑️ Удалить продукт", ("callback", DELETE_PLACEHOLDER)]
+    if kind == "goal":
+        return ["🎯 Моя норма", str(rng.randrange(1500, 3001, 50))]
+    if kind == "help":
+        return ["/help"]
+    if kind == "reset":
+        return ["❌ Очистить день"]
+    raise ValueError(kind)
+
+
+def generate(users: int, flows: int, seed: int = 1) -> Iterator[Dict[str, Any]]:
+    """
+    Сгенерировать поток апдейтов
+
+    Каждый пользователь начинает с /start и проходит flows сценариев.
+    Пользователи перемешаны, но порядок апдейтов одного пользователя сохранён.
+    """
+    rng = random.Random(seed)
+    with open(PRODUCTS_PATH, encoding="utf-8") as f:
+        products = [item["name"] for item in json.load(f)]
+    kinds, weights = zip(*FLOWS.items())
+
+    queues = {}
+    for user_id in range(1, users + 1):
+        steps = ["/start"]
+        for kind in rng.choices(kinds, weights, k=flows):
+            steps.extend(_flow(kind, products, rng))
+        queues[user_id] = steps[::-1]
+
+    update_id = 0
+    active = list(queues)
+    while active:
+        user_id = rng.choice(active)
+        step = queues[user_id].pop()
+        if not queues[user_id]:
+            active.remove(user_id)
+        update_id += 1
+        if isinstance(step, tuple):
+            yield callback_update(update_id, user_id, step[1])
+        else:
+            yield message_update(update_id, user_id, step)
+
+
+def _count_statement(*args):
+    current = _current.get(None)
+    if current is not None:
+        current["sql"] += 1
+
+
+async def _record_handler(handler, event, data):
+    """Inner middleware: запоминает, какой обработчик выбран для апдейта"""
+    current = _current.get(None)
+    if current is not None:
+        callback = data["handler"].callback
+        current["handler"] = f"{callback.__module__.rsplit('.', 1)[-1]}.{callback.__name__}"
+    return await handler(event, data)
+
+
+def _summary(latencies: List[float], sql: List[int]) -> Dict[str, Any]:
+    return {
+        "count": len(latencies),
+        "p50_ms": round(statistics.median(latencies), 3),
+        "p95_ms": round(percentile(latencies, 0.95), 3),
+        "p99_ms": round(percentile(latencies, 0.99), 3),
+        "mean_ms": round(statistics.fmean(latencies), 3),
+        "sql_per_update": round(statistics.fmean(sql), 2),
+    }
+
+
+async def replay(updates: List[Dict[str, Any]], concurrency: int) -> Dict[str, Any]:
+    """Прогнать апдейты через диспетчер и собрать метрики"""
+    session = FakeSession()
+    bot = Bot(token=os.environ["BOT_TOKEN"], session=session)
+    dp = bot_module.create_dispatcher(MemoryStorage())
+    for observer in (dp.message, dp.callback_query):
+        observer.middleware(_record_handler)
+
+    for sync_engine in {engine.sync_engine, read_engine.sync_engine}:
+        event.listen(sync_engine, "before_cursor_execute", _count_statement)
+
+    latencies = defaultdict(list)
+    statements = defaultdict(list)
+    user_locks = defaultdict(asyncio.Lock)
+    slots = asyncio.Semaphore(concurrency)
+
+    async def process(update: Dict[str, Any]):
+        user_id = next(iter(v for k, v in update.items() if k != "update_id"))["from"]["id"]
+        async with user_locks[user_id], slots:
+            callback = update.get("callback_query")
+            if callback and callback["data"] == DELETE_PLACEHOLDER:
+                buttons = [data for data in session.keyboards.get(user_id, []) if data.startswith("delete_")]
+                callback["data"] = buttons[0] if buttons else "cancel_delete"
+
+            current = {"handler": "unhandled", "sql": 0}
+            _current.set(current)
+            started = time.perf_counter()
+            result = await dp.feed_raw_update(bot, update)
+            # Как при polling: ответ, который вернул обработчик, отправляется отдельно
+            if isinstance(result, TelegramMethod):
+                await dp.silent_call_request(bot, result)
+            elapsed = (time.perf_counter() - started) * 1000
+
+            latencies[current["handler"]].append(elapsed)
+            statements[current["handler"]].append(current["sql"])
+
+    started = time.perf_counter()
+    await asyncio.gather(*(process(update) for update in updates))
+    elapsed = time.perf_counter() - started
+
+    for sync_engine in {engine.sync_engine, read_engine.sync_engine}:
+        event.remove(sync_engine, "before_cursor_execute", _count_statement)
+
+    all_latencies = [value for values in latencies.values() for value in values]
+    all_statements = [value for values in statements.values() for value in values]
+    return {
+        "updates": len(updates),
+        "seconds": round(elapsed, 3),
+        "updates_per_second": round(len(updates) / elapsed, 1),
+        "total": _summary(all_latencies, all_statements),
+        "handlers": {
+            name: _summary(latencies[name], statements[name])
+            for name in sorted(latencies, key=lambda name: -len(latencies[name]))
+        },
+        "bot_api_calls": dict(session.calls),
+    }
+
+
+def _git_revision() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True, cwd=Path(__file__).parent
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def print_report(report: Dict[str, Any], baseline: Dict[str, Any] = None):
+    def delta(new: float, old: float) -> str:
+        return f" ({(new - old) / old * 100:+.0f}%)" if old else ""
+
+    old_rate = baseline["updates_per_second"] if baseline else 0
+    print(f"\nАпдейтов: {report['updates']} за {report['seconds']} с — "
+          f"{report['updates_per_second']} апд/с{delta(report['updates_per_second'], old_rate)}")
+    print(f"{'обработчик':<34}{'кол-во':>8}{'p50 мс':>10}{'p95 мс':>10}{'p99 мс':>10}{'SQL/апд':>9}")
+
+    rows = [("ВСЕГО", report["total"])] + list(report["handlers"].items())
+    old_rows = {"ВСЕГО": baseline["total"], **baseline["handlers"]} if baseline else {}
+    for name, row in rows:
+        print(f"{name:<34}{row['count']:>8}{row['p50_ms']:>10.2f}{row['p95_ms']:>10.2f}"
+              f"{row['p99_ms']:>10.2f}{row['sql_per_update']:>9.1f}")
+        old = old_rows.get(name)
+        if old:
+            print(f"{'':<34}{'':>8}{delta(row['p50_ms'], old['p50_ms']):>10}"
+                  f"{delta(row['p95_ms'], old['p95_ms']):>10}{delta(row['p99_ms'], old['p99_ms']):>10}"
+                  f"{row['sql_per_update'] - old['sql_per_update']:>+9.1f}")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--flows", type=int, default=20, help="сценариев на пользователя")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--concurrency", type=int, default=1, help="пользователей в обработке одновременно")
+    parser.add_argument("--stream", help="воспроизвести апдейты из JSONL вместо генерации")
+    parser.add_argument("--save-stream", help="сохранить сгенерированный поток в JSONL")
+    parser.add_argument("--output", help="куда сохранить результат (по умолчанию benchmarks/results/)")
+    parser.add_argument("--compare", help="JSON прошлого прогона для сравнения")
+    args = parser.parse_args()
+
+    # Лог каждого апдейта от aiogram искажает замеры
+    logging.getLogger("aiogram.event").setLevel(logging.WARNING)
+
+    if args.stream:
+        with open(args.stream, encoding="utf-8") as f:
+            updates = [json.loads(line) for line in f if line.strip()]
+    else:
+        updates = list(generate(args.users, args.flows, args.seed))
+        if args.save_stream:
+            with open(args.save_stream, "w", encoding="utf-8") as f:
+                for update in updates:
+                    f.write(json.dumps(update, ensure_ascii=False) + "\n")
+
+    # Замеряем работу с прогретым каталогом
+    await (await bot_module.on_startup())
+    try:
+        report = await replay(updates, args.concurrency)
+    finally:
+        await bot_module.on_shutdown()
+
+    report = {
+        "meta": {
+            "date": datetime.now().isoformat(timespec="seconds"),
+            "revision": _git_revision(),
+            "python": platform.python_version(),
+            "args": vars(args),
+        },
+        **report,
+    }
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+
+    output = Path(args.output) if args.output else RESULTS_DIR / f"replay-{datetime.now():%Y%m%d-%H%M%S}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\nРезультат: {output}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
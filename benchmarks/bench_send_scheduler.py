@@ -0,0 +1,107 @@
+"""
+Проверка планировщика отправки на локальном Bot API с лимитами
+
+FakeTelegram отвечает 429 при превышении лимита на чат и общего лимита.
+Одновременно идут массовая рассылка (bulk_sending) и интерактивные ответы
+пользователям: по два сообщения сразу, как в delete_product. Сравниваются
+отправка напрямую, через SendScheduler и через SendScheduler со склейкой.
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_send_scheduler --broadcast 300 --users 20
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+
+os.environ.setdefault("BOT_TOKEN", "42:benchmark")
+
+from aiogram import Bot  # noqa: E402
+from aiogram.client.session.aiohttp import AiohttpSession  # noqa: E402
+from aiogram.client.telegram import TelegramAPIServer  # noqa: E402
+from aiogram.exceptions import TelegramRetryAfter  # noqa: E402
+
+from benchmarks.latency import percentile  # noqa: E402
+from benchmarks.fake_telegram import FakeTelegram  # noqa: E402
+from services.send_scheduler import SendScheduler, bulk_sending  # noqa: E402
+
+API_PORT = 18095
+
+
+async def run(title: str, fake: FakeTelegram, scheduler, args):
+    session = AiohttpSession(api=TelegramAPIServer.from_base(f"http://127.0.0.1:{API_PORT}"))
+    if scheduler is not None:
+        session.middleware(scheduler)
+    bot = Bot(token=os.environ["BOT_TOKEN"], session=session)
+    fake.calls.clear()
+    fake.flood_errors = 0
+
+    failed = 0
+    latencies = []
+
+    async def send(chat_id: int, text: str) -> bool:
+        nonlocal failed
+        try:
+            await bot.send_message(chat_id, text)
+            return True
+        except TelegramRetryAfter:
+            failed += 1
+            return False
+
+    async def broadcast():
+        with bulk_sending():
+            await asyncio.gather(*(send(1_000_000 + i, "📣 Новость") for i in range(args.broadcast)))
+
+    async def user(chat_id: int):
+        for _ in range(args.rounds):
+            started = time.perf_counter()
+            # Оба сообщения уходят, не дожидаясь друг друга: их можно склеить
+            await asyncio.gather(send(chat_id, "✅ Продукт успешно удалён!"), send(chat_id, "Что дальше?"))
+            latencies.append(time.perf_counter() - started)
+            await asyncio.sleep(args.pause)
+
+    started = time.perf_counter()
+    bulk = asyncio.create_task(broadcast())
+    await asyncio.gather(*(user(chat_id) for chat_id in range(1, args.users + 1)))
+    interactive_done = time.perf_counter() - started
+    await bulk
+    total = time.perf_counter() - started
+    await bot.session.close()
+
+    merged = f", склеено {scheduler.merged}" if scheduler is not None and scheduler.coalesce else ""
+    print(
+        f"{title}:\n"
+        f"    ответы пользователям: p50 {statistics.median(latencies) * 1000:6.0f} мс, "
+        f"p95 {percentile(latencies, 0.95) * 1000:6.0f} мс, все за {interactive_done:.1f} с\n"
+        f"    всё за {total:.1f} с, запросов {fake.calls['sendMessage']}, "
+        f"429 от API {fake.flood_errors}, потеряно сообщений {failed}{merged}"
+    )
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--broadcast", type=int, default=300)
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--pause", type=float, default=0.3, help="пауза пользователя между действиями, с")
+    parser.add_argument("--chat-limit", type=int, default=1, help="лимит API на чат в секунду")
+    parser.add_argument("--global-limit", type=int, default=30, help="общий лимит API в секунду")
+    args = parser.parse_args()
+
+    fake = FakeTelegram(latency=0.01, chat_limit=args.chat_limit, global_limit=args.global_limit)
+    runner = await fake.start(port=API_PORT)
+    try:
+        await run("Напрямую", fake, None, args)
+        await asyncio.sleep(1.1)
+        # Планировщику — лимиты с запасом 10% от лимитов API
+        limits = dict(global_rate=args.global_limit * 0.9, chat_rate=args.chat_limit * 0.9, chat_burst=1)
+        await run("SendScheduler", fake, SendScheduler(**limits), args)
+        await asyncio.sleep(1.1)
+        await run("SendScheduler со склейкой", fake, SendScheduler(coalesce=True, **limits), args)
+    finally:
+        await runner.cleanup()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,88 @@
+"""
+Бенчмарк шардирования: пропускная способность при разном числе воркеров
+
+Виртуальные пользователи отправляют апдейты прямо в WorkerPool (без
+Telegram): поиск с опечаткой, добавление продукта и статистика дня.
+Ответы бота уходят на локальный FakeTelegram. Для каждого числа воркеров
+печатается число апдейтов в секунду и ускорение относительно одного воркера.
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_sharding --users 200 --rounds 3 --workers 1 2 4
+"""
+import argparse
+import asyncio
+import itertools
+import os
+import tempfile
+import time
+
+# Модуль заново импортируется в каждом воркере (spawn), поэтому каталог
+# создаём один раз и передаём воркерам через окружение
+if "BENCH_SHARDING_DIR" not in os.environ:
+    os.environ["BENCH_SHARDING_DIR"] = tempfile.mkdtemp()
+_tmp = os.environ["BENCH_SHARDING_DIR"]
+os.environ.setdefault("BOT_TOKEN", "42:benchmark")
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{os.path.join(_tmp, 'bench.db')}"
+os.environ["FSM_STORAGE"] = "memory"
+os.environ["TELEGRAM_API_URL"] = "http://127.0.0.1:18091"
+
+import bot as bot_module  # noqa: E402
+from benchmarks.fake_telegram import FakeTelegram, message_update  # noqa: E402
+from database.db import close_db  # noqa: E402
+from server.sharding import WorkerPool  # noqa: E402
+
+SCENARIO = ["➕ Добавить продукт", "ябко", "куринная грудка", "яблоко", "150", "📊 Статистика дня"]
+
+API_PORT = 18091
+BASE_PORT = 18100
+
+
+async def run(workers: int, users: int, rounds: int) -> float:
+    pool = WorkerPool(workers, base_port=BASE_PORT)
+    await pool.start()
+    ids = itertools.count(1)
+
+    async def user(user_id: int):
+        for _ in range(rounds):
+            for text in SCENARIO:
+                await pool.dispatch(message_update(next(ids), user_id, text))
+
+    try:
+        started = time.perf_counter()
+        await asyncio.gather(*(user(user_id) for user_id in range(1, users + 1)))
+        return time.perf_counter() - started
+    finally:
+        await pool.stop()
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    args = parser.parse_args()
+
+    fake = FakeTelegram()
+    api_runner = await fake.start(port=API_PORT)
+    await bot_module.prepare_database()
+    await close_db()
+
+    print(f"Ядер CPU: {os.cpu_count()}")
+    total = args.users * args.rounds * len(SCENARIO)
+    baseline = None
+    try:
+        for workers in args.workers:
+            fake.calls.clear()
+            elapsed = await run(workers, args.users, args.rounds)
+            rate = total / elapsed
+            baseline = baseline or rate
+            print(
+                f"воркеров {workers:2d}: {rate:8.0f} апд/с | ускорение x{rate / baseline:4.2f} | "
+                f"ответов бота: {fake.calls['sendMessage']}"
+            )
+    finally:
+        await api_runner.cleanup()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
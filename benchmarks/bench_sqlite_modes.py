@@ -0,0 +1,125 @@
+"""
+Бенчмарк смешанной нагрузки чтение/запись на SQLite
+
+Сравнивает исходную конфигурацию (один движок, журнал по умолчанию,
+соединение на каждую сессию) с продакшен-режимом: WAL, настроенные
+PRAGMA, отдельный пул читателей и единственный писатель.
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_sqlite_modes --workers 32 --seconds 10 --write-share 0.2
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import date
+
+os.environ.setdefault("BOT_TOKEN", "0:benchmark")
+
+from sqlalchemy import select, func  # noqa: E402
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession  # noqa: E402
+
+from benchmarks.latency import percentile  # noqa: E402
+from database.db import create_engines  # noqa: E402
+from database.migrations import run_migrations  # noqa: E402
+from database.models import Base, User, Meal, DailySummary  # noqa: E402
+from services.daily_summary import add_meal_to_summary  # noqa: E402
+
+USERS = 1000
+
+
+async def prepare(engine):
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    await run_migrations(engine)
+
+    async with AsyncSession(engine) as session:
+        session.add_all(User(id=i, telegram_id=i, daily_goal=2000) for i in range(1, USERS + 1))
+        await session.commit()
+
+
+async def write_op(session: AsyncSession, user_id: int):
+    calories = random.randint(50, 500)
+    session.add(Meal(user_id=user_id, product_id=1, grams=100, calories_x100=calories * 100, date=date.today()))
+    await add_meal_to_summary(session, user_id, date.today(), calories * 100, 2000)
+    await session.commit()
+
+
+async def read_op(session: AsyncSession, user_id: int):
+    await session.get(DailySummary, (user_id, date.today()))
+    await session.execute(
+        select(Meal.name, Meal.grams, Meal.calories)
+        .where(Meal.user_id == user_id, Meal.date == date.today())
+        .order_by(Meal.id)
+    )
+    await session.execute(
+        select(func.count(), func.sum(DailySummary.calories_x100)).where(DailySummary.user_id == user_id)
+    )
+
+
+async def run_load(writer, reader, workers: int, seconds: float, write_share: float):
+    write_maker = async_sessionmaker(writer, expire_on_commit=False)
+    read_maker = async_sessionmaker(reader, expire_on_commit=False)
+    latencies = {"write": [], "read": []}
+    deadline = time.perf_counter() + seconds
+
+    async def worker():
+        while time.perf_counter() < deadline:
+            user_id = random.randint(1, USERS)
+            kind = "write" if random.random() < write_share else "read"
+            started = time.perf_counter()
+            if kind == "write":
+                async with write_maker() as session:
+                    await write_op(session, user_id)
+            else:
+                async with read_maker() as session:
+                    await read_op(session, user_id)
+            latencies[kind].append((time.perf_counter() - started) * 1000)
+
+    await asyncio.gather(*(worker() for _ in range(workers)))
+    return latencies
+
+
+def report(title: str, latencies: dict, seconds: float):
+    total = sum(len(values) for values in latencies.values())
+    print(f"{title}: {total / seconds:8.0f} оп/с")
+    for kind, values in latencies.items():
+        if not values:
+            continue
+        print(
+            f"    {kind:<5} {len(values):>7} оп | p50 {statistics.median(values):7.2f} мс | "
+            f"p99 {percentile(values, 0.99):7.2f} мс"
+        )
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=32)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--write-share", type=float, default=0.2)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # До: один движок, журнал по умолчанию, новое соединение на каждую сессию
+        url = f"sqlite+aiosqlite:///{os.path.join(tmp, 'before.db')}"
+        engine = create_async_engine(url)
+        await prepare(engine)
+        latencies = await run_load(engine, engine, args.workers, args.seconds, args.write_share)
+        await engine.dispose()
+        report("До (журнал по умолчанию, общий движок)", latencies, args.seconds)
+
+        # После: WAL, PRAGMA, пул читателей и единственный писатель
+        url = f"sqlite+aiosqlite:///{os.path.join(tmp, 'after.db')}"
+        writer, reader = create_engines(url, wal=True)
+        await prepare(writer)
+        latencies = await run_load(writer, reader, args.workers, args.seconds, args.write_share)
+        await writer.dispose()
+        await reader.dispose()
+        report("После (WAL, читатели отдельно от писателя)", latencies, args.seconds)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,128 @@
+"""
+Время от запуска бота до первого ответа
+
+Запускает bot.py отдельным процессом против FakeTelegram. До запуска
+в очереди уже лежат /start от одного пользователя и «яблоко 100» от
+другого: первому ответу каталог не нужен, второму — нужен. Первый запуск
+идёт на пустой базе (каталог загружается с нуля), следующие — на уже
+заполненной. С --catalog-rows в базу заранее импортируется большой
+каталог, индекс которого строится заметное время. Печатает время до
+каждого ответа и этапы запуска из лога бота; с --max-seconds завершается
+с ошибкой, если первый ответ медленнее.
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_startup --runs 3 --max-seconds 10
+    python -m benchmarks.bench_startup --catalog-rows 300000
+"""
+import argparse
+import asyncio
+import os
+import signal
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+from benchmarks.bench_catalog_import import generate
+from benchmarks.fake_telegram import FakeTelegram, message_update
+
+API_PORT = 18096
+START_USER = 1
+ADD_USER = 2
+
+
+async def run_once(env: Dict[str, str], timeout: float) -> Dict[str, float]:
+    """Секунды от запуска процесса до ответа каждому пользователю"""
+    # Свой сервер на каждый запуск: незавершённый getUpdates прошлого процесса забрал бы апдейты
+    fake = FakeTelegram()
+    runner = await fake.start(port=API_PORT)
+    fake.updates.put_nowait(message_update(1, START_USER, "/start"))
+    fake.updates.put_nowait(message_update(2, ADD_USER, "яблоко 100"))
+
+    replies: Dict[int, float] = {}
+    done = asyncio.Event()
+    started = time.perf_counter()
+
+    def on_call(method: str, params: Dict[str, str]):
+        if method != "sendMessage":
+            return
+        chat_id = int(params["chat_id"])
+        replies.setdefault(chat_id, time.perf_counter() - started)
+        if START_USER in replies and ADD_USER in replies:
+            done.set()
+
+    fake.on_call = on_call
+    process = await asyncio.create_subprocess_exec(
+        sys.executable, "bot.py", env=env, stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.PIPE
+    )
+    log: List[str] = []
+
+    async def read_log():
+        async for line in process.stderr:
+            log.append(line.decode(errors="replace").rstrip())
+
+    reader = asyncio.create_task(read_log())
+    try:
+        await asyncio.wait_for(done.wait(), timeout)
+    except asyncio.TimeoutError:
+        print("\n".join(log[-20:]))
+        raise
+    finally:
+        process.send_signal(signal.SIGINT)
+        await process.wait()
+        await reader
+        await runner.cleanup()
+
+    for line in log:
+        if "⏱️" in line or "🔥" in line:
+            print("    " + line.split(" - ")[-1])
+    return {"start": replies[START_USER], "add": replies[ADD_USER]}
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3, help="запусков, первый — на пустой базе")
+    parser.add_argument("--max-seconds", type=float, default=0, help="допустимое время до первого ответа")
+    parser.add_argument("--catalog-rows", type=int, default=0, help="импортировать каталог перед запусками")
+    parser.add_argument("--timeout", type=float, default=60)
+    args = parser.parse_args()
+
+    worst = 0.0
+    with tempfile.TemporaryDirectory() as tmp:
+        env = {
+            **os.environ,
+            "BOT_TOKEN": "42:startup",
+            "TELEGRAM_API_URL": f"http://127.0.0.1:{API_PORT}",
+            "DATABASE_URL": f"sqlite+aiosqlite:///{os.path.join(tmp, 'bot.db')}",
+            "FSM_DATABASE_URL": f"sqlite+aiosqlite:///{os.path.join(tmp, 'fsm.db')}",
+            "WEBHOOK_URL": "",
+            "SHARD_WORKERS": "0",
+            "METRICS_PORT": "0",
+        }
+        if args.catalog_rows:
+            path = os.path.join(tmp, "catalog.jsonl")
+            generate(path, args.catalog_rows, "jsonl")
+            process = await asyncio.create_subprocess_exec(
+                sys.executable, "-m", "services.catalog_import", path, "--source", "bench",
+                env=env, stderr=asyncio.subprocess.DEVNULL
+            )
+            await process.wait()
+            print(f"Импортирован каталог: {args.catalog_rows} строк")
+
+        for run in range(args.runs):
+            filled = run > 0 or args.catalog_rows
+            print(f"Запуск {run + 1} ({'база заполнена' if filled else 'пустая база'}):")
+            result = await run_once(env, args.timeout)
+            worst = max(worst, result["start"])
+            print(
+                f"    первый ответ (/start) через {result['start']:.2f} с, "
+                f"ответ с поиском продукта через {result['add']:.2f} с"
+            )
+
+    if args.max_seconds and worst > args.max_seconds:
+        print(f"❌ Первый ответ через {worst:.2f} с, допустимо {args.max_seconds:.2f} с")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,168 @@
+"""
+Время общей статистики в зависимости от длины истории
+
+Для каждой длины истории создаётся временная база: --users пользователей,
+у каждого по --meals записей в день. Сравнивается запрос статистики
+по итогам дней (daily_summaries, как в «📈 Общая статистика») с тем же
+расчётом по сырым строкам meals. Затем старые записи переносятся в архив
+и проверяется, что статистика по итогам совпадает с расчётом по строкам
+meals вместе с архивными файлами.
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_stats_history --days 30 365 1825 --users 20
+"""
+import argparse
+import asyncio
+import gzip
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+os.environ.setdefault("BOT_TOKEN", "42:benchmark")
+
+ROLLUP_STATS = (
+    "SELECT count(*), sum(items), sum(calories_x100) FROM daily_summaries WHERE user_id = ?"
+)
+RAW_STATS = (
+    "SELECT count(DISTINCT date), count(*), sum(calories_x100) FROM meals WHERE user_id = ?"
+)
+
+
+def timed(conn, sql, params, repeat):
+    durations = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = conn.exec_driver_sql(sql, params).one()
+        durations.append(time.perf_counter() - started)
+    return tuple(result), statistics.median(durations) * 1000
+
+
+def raw_with_archive(conn, archive_dir: str, user_id: int):
+    """Статистика по строкам meals и архивным файлам"""
+    days, items, calories_x100 = set(), 0, 0
+    for name in sorted(os.listdir(archive_dir)):
+        if not name.endswith(".jsonl.gz"):
+            continue
+        with gzip.open(os.path.join(archive_dir, name), "rt", encoding="utf-8") as f:
+            for line in f:
+                row = json.loads(line)
+                if row["user_id"] == user_id:
+                    days.add(row["date"])
+                    items += 1
+                    # В архиве калории в ккал с точностью до сотых
+                    calories_x100 += round(row["calories"] * 100)
+    for day, value in conn.exec_driver_sql(
+        "SELECT date, calories_x100 FROM meals WHERE user_id = ? ORDER BY id", (user_id,)
+    ):
+        days.add(day)
+        items += 1
+        calories_x100 += value
+    return len(days), items, calories_x100
+
+
+async def prepare(days: int, users: int, meals_per_day: int):
+    from database.db import engine, init_db
+
+    await init_db()
+    rnd = random.Random(days)
+    today = date.today()
+    async with engine.begin() as conn:
+        await conn.exec_driver_sql("DELETE FROM meals")
+        await conn.exec_driver_sql("DELETE FROM daily_summaries")
+        await conn.exec_driver_sql("DELETE FROM users")
+        await conn.exec_driver_sql(
+            "INSERT INTO users (id, telegram_id, daily_goal, created_at) VALUES (?, ?, 2000, ?)",
+            [(user_id, 1000 + user_id, today.isoformat()) for user_id in range(1, users + 1)]
+        )
+        rows = []
+        for user_id in range(1, users + 1):
+            for offset in range(days):
+                day = (today - timedelta(days=offset)).isoformat()
+                for _ in range(meals_per_day):
+                    grams = rnd.randint(50, 400)
+                    rows.append((user_id, "продукт", grams, round(grams * rnd.uniform(30, 300)), day))
+        await conn.exec_driver_sql(
+            "INSERT INTO meals (user_id, product_name, grams, calories_x100, date) VALUES (?, ?, ?, ?, ?)", rows
+        )
+        await conn.exec_driver_sql(
+            "INSERT INTO daily_summaries (user_id, date, calories_x100, items, goal) "
+            "SELECT user_id, date, sum(calories_x100), count(*), 2000 FROM meals GROUP BY user_id, date"
+        )
+
+
+async def run(args, days: int, tmp: str):
+    from database.db import engine, read_engine, close_db
+    from services.archive import archive_meals
+
+    await prepare(days, args.users, args.meals)
+    archive_dir = os.path.join(tmp, "archive")
+    user_id = 1
+
+    def measure(conn):
+        rollup, rollup_ms = timed(conn, ROLLUP_STATS, (user_id,), args.repeat)
+        raw, raw_ms = timed(conn, RAW_STATS, (user_id,), args.repeat)
+        meals = conn.exec_driver_sql("SELECT count(*) FROM meals").scalar()
+        return rollup, rollup_ms, raw, raw_ms, meals
+
+    async with read_engine.connect() as conn:
+        rollup, rollup_ms, raw, raw_ms, meals_before = await conn.run_sync(measure)
+
+    started = time.perf_counter()
+    stats = await archive_meals(engine, read_engine, archive_dir, after_days=args.after_days)
+    archive_seconds = time.perf_counter() - started
+
+    async with read_engine.connect() as conn:
+        rollup_after, rollup_after_ms, _, raw_after_ms, meals_after = await conn.run_sync(measure)
+        full = await conn.run_sync(lambda sync_conn: raw_with_archive(sync_conn, archive_dir, user_id))
+    await close_db()
+
+    # Калории в целых сотых, поэтому всё сравнивается точно
+    same = rollup == rollup_after == full
+    print(
+        f"{days:5d} дней, строк meals {meals_before:>8}: статистика по итогам {rollup_ms:6.2f} мс, "
+        f"по строкам {raw_ms:7.2f} мс\n"
+        f"      архивация {archive_seconds:5.1f} с ({stats.months} мес., {stats.archived} строк): "
+        f"строк meals {meals_after:>7}, по итогам {rollup_after_ms:6.2f} мс, по строкам {raw_after_ms:6.2f} мс\n"
+        f"      итоги = строки + архив: {'да' if same else 'НЕТ'} {rollup_after} {full}"
+    )
+    return same
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--days", type=int, nargs="+", default=[30, 365, 1825])
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--meals", type=int, default=4, help="записей в день у пользователя")
+    parser.add_argument("--after-days", type=int, default=90)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        tmp = os.environ["BENCH_HISTORY_DIR"]
+        sys.exit(0 if asyncio.run(run(args, args.days[0], tmp)) else 1)
+
+    ok = True
+    for days in args.days:
+        # Каждая длина истории — в своём процессе: путь к базе читается при импорте database.db
+        with tempfile.TemporaryDirectory() as tmp:
+            env = {
+                **os.environ,
+                "BENCH_HISTORY_DIR": tmp,
+                "DATABASE_URL": f"sqlite+aiosqlite:///{os.path.join(tmp, 'bench.db')}",
+            }
+            command = [sys.executable, "-m", "benchmarks.bench_stats_history", "--child", "--days", str(days)]
+            command += ["--users", str(args.users), "--meals", str(args.meals)]
+            command += ["--after-days", str(args.after_days), "--repeat", str(args.repeat)]
+            ok = subprocess.run(command, env=env).returncode == 0 and ok
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""
+Нагрузочный тест: вебхук против long polling на локальном Bot API
+
+Каждый виртуальный пользователь проходит сценарий добавления продукта и
+отправляет следующее сообщение только после ответа бота. Бот работает
+с временной базой и обращается к локальному FakeTelegram.
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_webhook --users 200 --rounds 3 --api-latency 0.02
+"""
+import argparse
+import asyncio
+import itertools
+import os
+import tempfile
+import time
+from collections import defaultdict
+
+_tmp = tempfile.mkdtemp()
+os.environ.setdefault("BOT_TOKEN", "42:benchmark")
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{os.path.join(_tmp, 'bench.db')}"
+os.environ["FSM_STORAGE"] = "memory"
+
+import aiohttp  # noqa: E402
+from aiogram import Bot  # noqa: E402
+from aiogram.client.session.aiohttp import AiohttpSession  # noqa: E402
+from aiogram.client.telegram import TelegramAPIServer  # noqa: E402
+from aiogram.fsm.storage.memory import MemoryStorage  # noqa: E402
+from aiohttp import web  # noqa: E402
+
+import bot as bot_module  # noqa: E402
+from benchmarks.fake_telegram import FakeTelegram, message_update  # noqa: E402
+from server.webhook import create_webhook_app  # noqa: E402
+
+SCENARIO = ["/help", "➕ Добавить продукт", "яблоко", "150", "📊 Статистика дня"]
+
+API_PORT = 18081
+WEBHOOK_PORT = 18082
+
+
+def make_bot() -> Bot:
+    session = AiohttpSession(api=TelegramAPIServer.from_base(f"http://127.0.0.1:{API_PORT}"))
+    return Bot(token=os.environ["BOT_TOKEN"], session=session)
+
+
+async def bench_webhook(dp, users: int, rounds: int) -> float:
+    bot = make_bot()
+    runner = web.AppRunner(create_webhook_app(dp, bot, max_concurrency=users))
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", WEBHOOK_PORT).start()
+
+    ids = itertools.count(1)
+    url = f"http://127.0.0.1:{WEBHOOK_PORT}/webhook"
+
+    async def user(http: aiohttp.ClientSession, user_id: int):
+        for _ in range(rounds):
+            for text in SCENARIO:
+                async with http.post(url, json=message_update(next(ids), user_id, text)) as response:
+                    await response.read()
+
+    started = time.perf_counter()
+    async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=users)) as http:
+        await asyncio.gather(*(user(http, user_id) for user_id in range(1, users + 1)))
+    elapsed = time.perf_counter() - started
+
+    await runner.cleanup()
+    await bot.session.close()
+    return elapsed
+
+
+async def bench_polling(dp, fake: FakeTelegram, users: int, rounds: int) -> float:
+    bot = make_bot()
+
+    ids = itertools.count(1_000_000)
+    remaining = {user_id: [text for _ in range(rounds) for text in SCENARIO] for user_id in range(1, users + 1)}
+    done = asyncio.Event()
+    pending = defaultdict(int)
+
+    def push(user_id: int):
+        if remaining[user_id]:
+            fake.updates.put_nowait(message_update(next(ids), user_id, remaining[user_id].pop(0)))
+            pending[user_id] += 1
+        elif not any(pending.values()) and not any(remaining.values()):
+            done.set()
+
+    def on_call(method, params):
+        # Ответ бота пользователю — сигнал отправить следующее сообщение
+        if method == "sendMessage":
+            user_id = int(params["chat_id"])
+            pending[user_id] -= 1
+            push(user_id)
+
+    fake.on_call = on_call
+    started = time.perf_counter()
+    for user_id in remaining:
+        push(user_id)
+
+    polling = asyncio.create_task(dp.start_polling(bot, handle_signals=False, polling_timeout=1))
+    await done.wait()
+    elapsed = time.perf_counter() - started
+
+    await dp.stop_polling()
+    await polling
+    fake.on_call = None
+    return elapsed
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--api-latency", type=float, default=0.02, help="задержка ответа Bot API, секунды")
+    args = parser.parse_args()
+
+    fake = FakeTelegram(latency=args.api_latency)
+    api_runner = await fake.start(port=API_PORT)
+    # Замеряем работу с прогретым каталогом
+    await (await bot_module.on_startup())
+    # Роутеры подключаются к диспетчеру один раз, поэтому он общий для обоих режимов
+    dp = bot_module.create_dispatcher(MemoryStorage())
+
+    total = args.users * args.rounds * len(SCENARIO)
+    try:
+        elapsed = await bench_polling(dp, fake, args.users, args.rounds)
+        print(f"polling: {total / elapsed:8.0f} апд/с, вызовов Bot API: {sum(fake.calls.values())} {dict(fake.calls)}")
+
+        fake.calls.clear()
+        elapsed = await bench_webhook(dp, args.users, args.rounds)
+        print(f"webhook: {total / elapsed:8.0f} апд/с, вызовов Bot API: {sum(fake.calls.values())} {dict(fake.calls)}")
+    finally:
+        await bot_module.on_shutdown()
+        await api_runner.cleanup()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
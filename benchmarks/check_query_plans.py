@@ -0,0 +1,70 @@
+"""
+Проверка планов горячих запросов через EXPLAIN QUERY PLAN
+
+Создаёт временную БД по моделям, применяет миграции и убеждается,
+что ни один запрос из обработчиков не делает полный проход по таблице.
+
+Запуск из корня проекта:
+    python -m benchmarks.check_query_plans
+"""
+import sys
+from datetime import date
+from sqlalchemy import create_engine, select, delete, func
+from database.models import Base, User, Product, Meal, DailySummary, Portion, Recipe, RecipeIngredient
+from database.migrations import _apply_pending
+
+TODAY = date(2024, 1, 1)
+
+HOT_QUERIES = {
+    "пользователь по telegram_id": select(User).where(User.telegram_id == 1),
+    "продукт по названию": select(Product).where(Product.name == "яблоко"),
+    "продукты за день (статистика, удаление)": select(Meal.name, Meal.grams, Meal.calories).where(
+        Meal.user_id == 1, Meal.date == TODAY
+    ).order_by(Meal.id),
+    "удаление записи": delete(Meal).where(Meal.id == 1),
+    "очистка дня": delete(Meal).where(Meal.user_id == 1, Meal.date == TODAY),
+    "итоги дня": select(DailySummary).where(DailySummary.user_id == 1, DailySummary.date == TODAY),
+    "итоги за всё время": select(
+        func.count(), func.sum(DailySummary.items), func.sum(DailySummary.calories_x100)
+    ).where(DailySummary.user_id == 1),
+    "избранное пользователя": select(Portion.product_id, Portion.grams, Portion.uses, Portion.last_used).where(
+        Portion.user_id == 1
+    ).order_by(Portion.last_used.desc()).limit(200),
+    "блюдо пользователя по названию": select(Recipe.id, Recipe.name, Recipe.kcal_per_100g).where(
+        Recipe.user_id == 1, Recipe.name == "борщ"
+    ),
+    "блюда с изменённым продуктом": select(RecipeIngredient.recipe_id).where(RecipeIngredient.product_id == 1),
+    "состав блюда": select(func.sum(RecipeIngredient.grams)).where(RecipeIngredient.recipe_id == 1),
+}
+
+
+def is_full_scan(detail: str) -> bool:
+    """SCAN в плане означает проход по всей таблице или всему индексу"""
+    return detail.startswith("SCAN") and "CONSTANT ROW" not in detail
+
+
+def main() -> int:
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+
+    failed = 0
+    with engine.begin() as conn:
+        _apply_pending(conn)
+
+        for title, query in HOT_QUERIES.items():
+            compiled = query.compile(conn)
+            plan = conn.exec_driver_sql(
+                f"EXPLAIN QUERY PLAN {compiled}", tuple(compiled.params.values())
+            ).all()
+            details = [row[-1] for row in plan]
+            scans = [detail for detail in details if is_full_scan(detail)]
+
+            status = "❌" if scans else "✅"
+            print(f"{status} {title}: {'; '.join(details)}")
+            failed += bool(scans)
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
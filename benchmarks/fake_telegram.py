@@ -0,0 +1,270 @@
+"""
+Локальная замена Telegram Bot API для нагрузочных тестов
+
+FakeTelegram — HTTP-сервер: отвечает на методы, которые использует бот,
+ведёт счётчики вызовов и отдаёт апдейты через getUpdates из очереди.
+Бот подключается к нему через TELEGRAM_API_URL (или AiohttpSession
+с TelegramAPIServer.from_base).
+
+FakeSession — то же без сети: сессия Bot, которая отвечает сразу
+в том же процессе.
+
+Запуск отдельно:
+    python -m benchmarks.fake_telegram --port 8081
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import time
+from collections import Counter, defaultdict, deque
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+from aiogram import Bot
+from aiogram.client.session.base import BaseSession
+from aiogram.methods import TelegramMethod
+from aiogram.types import InputFile, Message
+from aiohttp import web
+
+BOT_USER = {"id": 42, "is_bot": True, "first_name": "Calorie Bot", "username": "calorie_test_bot"}
+
+
+def message_update(update_id: int, user_id: int, text: str) -> Dict[str, Any]:
+    """Апдейт с текстовым сообщением от пользователя"""
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private"},
+            "from": {"id": user_id, "is_bot": False, "first_name": f"user{user_id}"},
+            "text": text,
+        },
+    }
+
+
+def callback_update(update_id: int, user_id: int, data: str) -> Dict[str, Any]:
+    """Апдейт с нажатием inline-кнопки"""
+    return {
+        "update_id": update_id,
+        "callback_query": {
+            "id": str(update_id),
+            "from": {"id": user_id, "is_bot": False, "first_name": f"user{user_id}"},
+            "chat_instance": str(user_id),
+            "data": data,
+            "message": {
+                "message_id": update_id,
+                "date": int(time.time()),
+                "chat": {"id": user_id, "type": "private"},
+                "from": BOT_USER,
+                "text": "...",
+            },
+        },
+    }
+
+
+def inline_update(update_id: int, user_id: int, query: str) -> Dict[str, Any]:
+    """Апдейт с inline-запросом: пользователь набирает «@бот запрос»"""
+    return {
+        "update_id": update_id,
+        "inline_query": {
+            "id": str(update_id),
+            "from": {"id": user_id, "is_bot": False, "first_name": f"user{user_id}"},
+            "query": query,
+            "offset": "",
+        },
+    }
+
+
+class FakeTelegram:
+    """Сервер, отвечающий как Bot API"""
+
+    def __init__(self, latency: float = 0.0, chat_limit: int = 0, global_limit: int = 0):
+        # Искусственная задержка ответа, чтобы приблизиться к настоящему API
+        self.latency = latency
+        # Лимиты отправки в секунду (0 — без лимита); превышение получает 429
+        self.chat_limit = chat_limit
+        self.global_limit = global_limit
+        self.flood_errors = 0
+        self._sent: Dict[Any, Deque[float]] = defaultdict(deque)
+        self._sent_total: Deque[float] = deque()
+        self.calls: Counter = Counter()
+        self.updates: "asyncio.Queue[Dict[str, Any]]" = asyncio.Queue()
+        # Вызывается на каждый метод: on_call(method, params)
+        self.on_call: Optional[Callable[[str, Dict[str, Any]], None]] = None
+        self._ids = itertools.count(1)
+
+    def app(self) -> web.Application:
+        app = web.Application(client_max_size=50 * 1024 * 1024)
+        app.router.add_route("*", "/bot{token}/{method}", self.handle)
+        return app
+
+    async def start(self, host: str = "127.0.0.1", port: int = 8081) -> web.AppRunner:
+        runner = web.AppRunner(self.app())
+        await runner.setup()
+        await web.TCPSite(runner, host, port).start()
+        return runner
+
+    def _message(self, params: Dict[str, Any], **extra) -> Dict[str, Any]:
+        chat_id = int(params.get("chat_id") or 0)
+        return {
+            "message_id": next(self._ids),
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "from": BOT_USER,
+            **extra,
+        }
+
+    async def _get_updates(self, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+        limit = int(params.get("limit") or 100)
+        timeout = float(params.get("timeout") or 0)
+        updates = []
+        try:
+            updates.append(await asyncio.wait_for(self.updates.get(), timeout or 0.01))
+        except asyncio.TimeoutError:
+            return []
+        while len(updates) < limit and not self.updates.empty():
+            updates.append(self.updates.get_nowait())
+        return updates
+
+    @staticmethod
+    def _over_limit(window: Deque[float], limit: int, now: float) -> bool:
+        while window and window[0] <= now - 1:
+            window.popleft()
+        if len(window) >= limit:
+            return True
+        window.append(now)
+        return False
+
+    def _flood_check(self, params: Dict[str, Any]) -> Optional[web.Response]:
+        """429, если отправка в чат или всего превысила лимит за последнюю секунду"""
+        chat_id = params.get("chat_id")
+        if chat_id is None:
+            return None
+        now = time.monotonic()
+        if (
+            (self.global_limit and self._over_limit(self._sent_total, self.global_limit, now))
+            or (self.chat_limit and self._over_limit(self._sent[chat_id], self.chat_limit, now))
+        ):
+            self.flood_errors += 1
+            return web.json_response(
+                {
+                    "ok": False,
+                    "error_code": 429,
+                    "description": "Too Many Requests: retry after 1",
+                    "parameters": {"retry_after": 1},
+                },
+                status=429
+            )
+        return None
+
+    async def respond(self, method: str, params: Dict[str, Any]) -> Any:
+        """Результат метода Bot API"""
+        if method == "getUpdates":
+            return await self._get_updates(params)
+        if method == "getMe":
+            return BOT_USER
+        if method in ("sendMessage", "editMessageText"):
+            return self._message(params, text=params.get("text", ""))
+        if method == "sendDocument":
+            return self._message(params, document={"file_id": f"doc{next(self._ids)}", "file_unique_id": "d"})
+        if method == "sendPhoto":
+            file_id = f"photo{next(self._ids)}"
+            return self._message(params, photo=[{"file_id": file_id, "file_unique_id": file_id, "width": 1, "height": 1}])
+        return True
+
+    async def handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        params = dict(await request.post()) if request.can_read_body else {}
+        params = {key: value if isinstance(value, str) else "<file>" for key, value in params.items()}
+
+        self.calls[method] += 1
+        if self.on_call is not None:
+            self.on_call(method, params)
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        flood = self._flood_check(params)
+        if flood is not None:
+            return flood
+
+        result = await self.respond(method, params)
+        return web.json_response({"ok": True, "result": result}, dumps=lambda obj: json.dumps(obj, ensure_ascii=False))
+
+
+class FakeSession(BaseSession):
+    """Сессия Bot без сети: считает вызовы и запоминает inline-клавиатуры"""
+
+    def __init__(self):
+        super().__init__()
+        self.calls: Counter = Counter()
+        # Последняя inline-клавиатура в каждом чате: chat_id -> список callback_data
+        self.keyboards: Dict[int, List[str]] = {}
+        # Содержимое последнего загруженного документа
+        self.last_document: Optional[bytes] = None
+        self._ids = itertools.count(1)
+
+    async def make_request(self, bot: Bot, method: TelegramMethod, timeout: Optional[int] = None) -> Any:
+        name = type(method).__name__
+        self.calls[name] += 1
+
+        chat_id = getattr(method, "chat_id", None)
+        markup = getattr(method, "reply_markup", None)
+        if chat_id is not None and markup is not None and hasattr(markup, "inline_keyboard"):
+            self.keyboards[int(chat_id)] = [
+                button.callback_data for row in markup.inline_keyboard for button in row if button.callback_data
+            ]
+
+        if name == "SendDocument" and isinstance(method.document, InputFile):
+            # Читаем файл, как при настоящей загрузке
+            self.last_document = b"".join([chunk async for chunk in method.document.read(bot)])
+
+        if name in ("SendMessage", "EditMessageText", "SendPhoto", "EditMessageMedia"):
+            if name == "SendPhoto":
+                extra = {"photo": [self._photo(method.photo)]}
+            elif name == "EditMessageMedia":
+                extra = {"photo": [self._photo(method.media.media)], "caption": method.media.caption}
+            else:
+                extra = {"text": method.text}
+            return Message.model_validate(
+                {
+                    "message_id": next(self._ids),
+                    "date": int(time.time()),
+                    "chat": {"id": int(chat_id or 0), "type": "private"},
+                    "from": BOT_USER,
+                    **extra,
+                },
+                context={"bot": bot}
+            )
+        return True
+
+    def _photo(self, photo: Any) -> Dict[str, Any]:
+        # Загруженному файлу выдаём новый file_id, отправленный по file_id возвращаем как есть
+        if isinstance(photo, str):
+            file_id = photo
+        else:
+            self.calls["upload"] += 1
+            file_id = f"photo{next(self._ids)}"
+        return {"file_id": file_id, "file_unique_id": file_id, "width": 1, "height": 1}
+
+    async def stream_content(self, url: str, headers=None, timeout: int = 30, chunk_size: int = 65536, raise_for_status: bool = True):
+        yield b""
+
+    async def close(self):
+        pass
+
+
+async def _serve(host: str, port: int, latency: float):
+    fake = FakeTelegram(latency=latency)
+    await fake.start(host, port)
+    print(f"Fake Bot API: http://{host}:{port}")
+    await asyncio.Event().wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency", type=float, default=0.0, help="задержка ответа, секунды")
+    args = parser.parse_args()
+    asyncio.run(_serve(args.host, args.port, args.latency))
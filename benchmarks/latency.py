@@ -0,0 +1,10 @@
+"""
+Общие расчёты задержек для бенчмарков
+"""
+from typing import List
+
+
+def percentile(values: List[float], p: float) -> float:
+    """Перцентиль p (от 0 до 1) по неотсортированным замерам"""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p))]
@@ -1,11 +1,37 @@
+import time
+
+# Время импорта модулей — первый этап в замерах запуска
+_import_started = time.perf_counter()
+
 import asyncio
 import logging
+from typing import Optional
 from aiogram import Bot, Dispatcher
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiogram.fsm.storage.base import BaseStorage
 from aiogram.fsm.storage.memory import MemoryStorage
-from config import BOT_TOKEN
-from database.db import init_db, async_session_maker
+from config import (
+    BOT_TOKEN, MEAL_WRITE_BEHIND, ARCHIVE_AFTER_DAYS, FSM_STORAGE, FSM_DATABASE_URL, FSM_TTL_HOURS, FSM_CACHE_SIZE,
+    TELEGRAM_API_URL, WEBHOOK_URL, SHARD_WORKERS, METRICS_PORT, SEND_SCHEDULER, DAILY_BROADCAST_AT
+)
+from database.db import init_db, close_db, engine, read_engine, async_session_maker, read_session_maker
+from database.lazy_session import LazySession, session_stats
+from database.fsm_storage import SQLiteStorage
 from services.init_data import load_products
-from handlers import start, add_meal, stats
+from services.product_search import catalog_ready
+from services.meals import meal_writer
+from services.archive import meal_archiver
+from services.meal_backfill import meal_backfill
+from services.broadcast import daily_broadcast
+from services.send_scheduler import SendScheduler
+from services.metrics import instrument_engine, metrics_middleware, handler_name_middleware
+from services.startup import startup_timings, warm_up_catalog, catalog_watcher
+from handlers import start, add_meal, stats, export, inline, recipes
+
+# Модули server.* тянут aiohttp.web и нужны не в каждом режиме,
+# поэтому импортируются там, где используются
+startup_timings.record("imports", time.perf_counter() - _import_started)
 
 # Настройка логирования
 logging.basicConfig(
@@ -15,8 +41,8 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
-async def on_startup():
-    """Действия при запуске бота"""
+async def prepare_database():
+    """Создать схему и синхронизировать каталог продуктов"""
     logger.info("🚀 Инициализация базы данных...")
     await init_db()
 
@@ -24,40 +50,212 @@ async def on_startup():
     async with async_session_maker() as session:
         await load_products(session)
 
+
+# Фоновый прогрев каталога, запущенный on_startup
+_warmup_task: Optional[asyncio.Task] = None
+
+
+async def on_startup(sync_catalog: bool = True) -> asyncio.Task:
+    """
+    Действия при запуске бота
+
+    Ждёт только создания схемы БД. Синхронизация каталога и индекс
+    продуктов готовятся в фоне, поиск продуктов дождётся синхронизации.
+
+    Args:
+        sync_catalog: подготовить базу и каталог; воркеры шардирования
+            пропускают этот шаг, его один раз делает фронт
+
+    Returns:
+        задача прогрева каталога (её можно дождаться, например в бенчмарках)
+    """
+    global _warmup_task
+
+    if sync_catalog:
+        logger.info("🚀 Инициализация базы данных...")
+        with startup_timings.phase("db_init"):
+            await init_db()
+        catalog_ready.close()
+        # Старые записи после миграции m0004 переносятся в фоне (если остались)
+        meal_backfill.start()
+
+    logger.info("📦 Прогрев каталога продуктов в фоне...")
+    _warmup_task = asyncio.create_task(warm_up_catalog(async_session_maker, read_session_maker, sync=sync_catalog))
+    # Индекс перестраивается, если каталог изменят (например, импортом)
+    catalog_watcher.start(_warmup_task)
+
+    if MEAL_WRITE_BEHIND:
+        logger.info("✍️ Включена групповая запись приёмов пищи")
+        meal_writer.start()
+
+    # Воркерам шардирования архивация не нужна: её запускают из cron
+    if ARCHIVE_AFTER_DAYS and sync_catalog:
+        logger.info("🗄️ Включена архивация записей старше %d дней", ARCHIVE_AFTER_DAYS)
+        meal_archiver.start()
+
     logger.info("✅ Бот запущен!")
+    return _warmup_task
 
 
 async def on_shutdown():
     """Действия при остановке бота"""
+    if _warmup_task is not None and not _warmup_task.done():
+        _warmup_task.cancel()
+    logger.info(
+        "📊 Апдейтов обработано: %d, открыто сессий БД: %d",
+        session_stats.updates,
+        session_stats.sessions_opened
+    )
+    # До закрытия БД: рассылка сохраняет прогресс при остановке
+    await daily_broadcast.stop()
+    await catalog_watcher.stop()
+    await meal_archiver.stop()
+    await meal_backfill.stop()
+    await meal_writer.stop()
+    await close_db()
     logger.info("👋 Бот остановлен")
 
 
-async def main():
-    """Главная функция запуска бота"""
-    # Создаём бот и диспетчер
-    bot = Bot(token=BOT_TOKEN)
-    storage = MemoryStorage()
+def create_bot() -> Bot:
+    """
+    Создать бота
+
+    TELEGRAM_API_URL позволяет направить запросы на локальный сервер,
+    SEND_SCHEDULER включает планировщик исходящих сообщений
+    """
+    if TELEGRAM_API_URL:
+        session = AiohttpSession(api=TelegramAPIServer.from_base(TELEGRAM_API_URL))
+    else:
+        session = AiohttpSession()
+    if SEND_SCHEDULER:
+        session.middleware(SendScheduler())
+    return Bot(token=BOT_TOKEN, session=session)
+
+
+async def create_storage() -> BaseStorage:
+    """Создать хранилище FSM"""
+    if FSM_STORAGE == "memory":
+        return MemoryStorage()
+
+    storage = SQLiteStorage(FSM_DATABASE_URL, ttl=FSM_TTL_HOURS * 3600, cache_size=FSM_CACHE_SIZE)
+    await storage.start()
+    return storage
+
+
+# Middleware для автоматической передачи сессий в хендлеры:
+# session — для записи, read_session — для обработчиков, которые только читают.
+# Сессии ленивые: открываются только при первом запросе к БД
+async def db_session_middleware(handler, event, data):
+    session = LazySession(async_session_maker)
+    read_session = LazySession(read_session_maker)
+    data["session"] = session
+    data["read_session"] = read_session
+    try:
+        return await handler(event, data)
+    finally:
+        await session.close()
+        await read_session.close()
+        session_stats.record(session, read_session)
+        logger.debug(
+            "Update id=%s: открыто сессий БД: %d",
+            event.update_id,
+            session.opened + read_session.opened
+        )
+
+
+def create_dispatcher(storage: BaseStorage, metrics: bool = bool(METRICS_PORT)) -> Dispatcher:
+    """
+    Создать диспетчер с роутерами и middleware
+
+    Args:
+        storage: хранилище FSM
+        metrics: собирать метрики обработчиков и SQL-запросов
+    """
     dp = Dispatcher(storage=storage)
 
     # Регистрируем роутеры
     dp.include_router(start.router)
+    dp.include_router(recipes.router)
     dp.include_router(add_meal.router)
     dp.include_router(stats.router)
+    dp.include_router(export.router)
+    dp.include_router(inline.router)
+
+    if metrics:
+        # Снаружи db_session_middleware, чтобы время включало закрытие сессий
+        dp.update.middleware(metrics_middleware)
+        dp.message.middleware(handler_name_middleware)
+        dp.callback_query.middleware(handler_name_middleware)
+        dp.inline_query.middleware(handler_name_middleware)
+        instrument_engine(engine)
+        instrument_engine(read_engine)
+
+    dp.update.middleware(db_session_middleware)
+
+    return dp
+
+
+async def main_sharded():
+    """Фронт шардирования: готовит базу и раздаёт апдейты процессам-воркерам"""
+    from server.sharding import run_sharded
+
+    await prepare_database()
+    # Фронт не работает с базой, соединения держат только воркеры
+    await close_db()
+
+    bot = create_bot()
+    # Диспетчер нужен только чтобы узнать, какие типы апдейтов запрашивать
+    allowed_updates = create_dispatcher(MemoryStorage()).resolve_used_update_types()
+    try:
+        await run_sharded(SHARD_WORKERS, bot, allowed_updates)
+    finally:
+        await bot.session.close()
+
+
+async def main():
+    """Главная функция запуска бота"""
+    if SHARD_WORKERS > 1:
+        await main_sharded()
+        return
+
+    started = time.perf_counter()
+
+    # Создаём бот и диспетчер
+    bot = create_bot()
+    storage = await create_storage()
+    dp = create_dispatcher(storage)
+
+    # Запуск: схема БД и запрос к Telegram идут одновременно
+    if WEBHOOK_URL:
+        await on_startup()
+    else:
+        # getUpdates не работает, пока у бота зарегистрирован вебхук
+        await asyncio.gather(on_startup(), bot.delete_webhook())
+
+    # В режиме шардирования рассылку запускают из cron (python -m services.broadcast)
+    if DAILY_BROADCAST_AT:
+        logger.info("🌙 Включена рассылка итогов дня в %s", DAILY_BROADCAST_AT)
+        daily_broadcast.start(bot)
 
-    # Middleware для автоматической передачи сессии в хендлеры
-    @dp.update.middleware()
-    async def db_session_middleware(handler, event, data):
-        async with async_session_maker() as session:
-            data["session"] = session
-            return await handler(event, data)
+    metrics_runner = None
+    if METRICS_PORT:
+        from server.metrics import start_metrics_server
+        metrics_runner = await start_metrics_server()
 
-    # Запуск
-    await on_startup()
+    startup_timings.record("startup", time.perf_counter() - started)
+    logger.info("⏱️ Готов принимать апдейты: %s", startup_timings.summary("imports", "db_init", "startup"))
 
     try:
-        await dp.start_polling(bot, allowed_updates=dp.resolve_used_update_types())
+        if WEBHOOK_URL:
+            from server.webhook import run_webhook
+            await run_webhook(dp, bot)
+        else:
+            await dp.start_polling(bot, allowed_updates=dp.resolve_used_update_types())
     finally:
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
         await on_shutdown()
+        await storage.close()
         await bot.session.close()
 
 
@@ -65,4 +263,4 @@ if __name__ == "__main__":
     try:
         asyncio.run(main())
     except KeyboardInterrupt:
-        logger.info("⚠️ Бот остановлен пользователем")
\ No newline at end of file
+        logger.info("⚠️ Бот остановлен пользователем")
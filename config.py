@@ -4,7 +4,82 @@ from dotenv import load_dotenv
 load_dotenv()
 
 BOT_TOKEN = os.getenv("BOT_TOKEN")
-DATABASE_URL = "sqlite+aiosqlite:///calorie_bot.db"
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite+aiosqlite:///calorie_bot.db")
+
+# Режим SQLite для продакшена: WAL и настроенные PRAGMA
+SQLITE_WAL = os.getenv("SQLITE_WAL", "1") == "1"
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", "65536"))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+# Сколько соединений держать для обработчиков, которые только читают
+DB_READ_POOL_SIZE = int(os.getenv("DB_READ_POOL_SIZE", "4"))
+
+# Сколько пользователей держать в кэше процесса
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "10000"))
+# Сколько графиков калорий (пользователь × период) держать в кэше
+CHART_CACHE_SIZE = int(os.getenv("CHART_CACHE_SIZE", "5000"))
+# Групповая запись приёмов пищи: окно накопления и размер очереди
+MEAL_WRITE_BEHIND = os.getenv("MEAL_WRITE_BEHIND", "0") == "1"
+MEAL_WRITE_WINDOW_MS = float(os.getenv("MEAL_WRITE_WINDOW_MS", "5"))
+MEAL_WRITE_QUEUE_SIZE = int(os.getenv("MEAL_WRITE_QUEUE_SIZE", "1024"))
+# Архивация: записи старше ARCHIVE_AFTER_DAYS дней (целыми месяцами) переносятся
+# из meals в сжатые файлы ARCHIVE_DIR; 0 — фоновая архивация выключена
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "0"))
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "archive")
+ARCHIVE_INTERVAL_HOURS = float(os.getenv("ARCHIVE_INTERVAL_HOURS", "24"))
+# Быстрое добавление: сколько продуктов на клавиатуре «⭐ Избранное» и для скольких пользователей держать их в кэше
+QUICK_ADD_SIZE = int(os.getenv("QUICK_ADD_SIZE", "8"))
+FAVORITES_CACHE_SIZE = int(os.getenv("FAVORITES_CACHE_SIZE", "10000"))
+# Inline-режим (@бот <начало названия>): подсказок в ответе и сколько секунд Telegram их кэширует
+INLINE_RESULTS = int(os.getenv("INLINE_RESULTS", "20"))
+INLINE_CACHE_TIME = int(os.getenv("INLINE_CACHE_TIME", "300"))
+# Как часто проверять, не изменился ли каталог (например, импортом), чтобы перестроить индекс; 0 — не проверять
+CATALOG_REFRESH_SECONDS = float(os.getenv("CATALOG_REFRESH_SECONDS", "60"))
+# Выгрузка истории (/export): одновременных выгрузок и размер файла в памяти до переноса на диск
+EXPORT_MAX_CONCURRENT = int(os.getenv("EXPORT_MAX_CONCURRENT", "2"))
+EXPORT_SPOOL_MAX_BYTES = int(os.getenv("EXPORT_SPOOL_MAX_BYTES", str(1024 * 1024)))
+# Хранилище FSM: sqlite (переживает перезапуск) или memory
+FSM_STORAGE = os.getenv("FSM_STORAGE", "sqlite")
+FSM_DATABASE_URL = os.getenv("FSM_DATABASE_URL", "sqlite+aiosqlite:///fsm_states.db")
+# Через сколько часов бездействия диалог считается брошенным
+FSM_TTL_HOURS = float(os.getenv("FSM_TTL_HOURS", "24"))
+FSM_CACHE_SIZE = int(os.getenv("FSM_CACHE_SIZE", "100000"))
+# Адрес Bot API; можно указать локальный сервер (например, для нагрузочных тестов)
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL")
+
+# Режим вебхука: если WEBHOOK_URL задан, бот принимает апдейты по HTTP вместо polling
+WEBHOOK_URL = os.getenv("WEBHOOK_URL")
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET")
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8080"))
+# Сколько апдейтов обрабатывать одновременно (и сколько соединений просить у Telegram)
+WEBHOOK_MAX_CONNECTIONS = int(os.getenv("WEBHOOK_MAX_CONNECTIONS", "40"))
+WEBHOOK_MAX_BODY_SIZE = int(os.getenv("WEBHOOK_MAX_BODY_SIZE", str(256 * 1024)))
+
+# Шардирование: при SHARD_WORKERS > 1 апдейты распределяются по процессам по id пользователя
+SHARD_WORKERS = int(os.getenv("SHARD_WORKERS", "0"))
+SHARD_BASE_PORT = int(os.getenv("SHARD_BASE_PORT", "9100"))
+SHARD_HEALTH_INTERVAL = float(os.getenv("SHARD_HEALTH_INTERVAL", "5"))
+# Сколько апдейтов фронт держит в обработке одновременно
+SHARD_MAX_IN_FLIGHT = int(os.getenv("SHARD_MAX_IN_FLIGHT", "256"))
+
+# Метрики Prometheus: при METRICS_PORT > 0 бот отдаёт их на http://METRICS_HOST:METRICS_PORT/metrics
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+
+# Исходящие запросы: общий лимит и лимит на чат (сообщений в секунду)
+SEND_SCHEDULER = os.getenv("SEND_SCHEDULER", "1") == "1"
+SEND_GLOBAL_RATE = float(os.getenv("SEND_GLOBAL_RATE", "30"))
+SEND_CHAT_RATE = float(os.getenv("SEND_CHAT_RATE", "1"))
+SEND_CHAT_BURST = float(os.getenv("SEND_CHAT_BURST", "3"))
+# Склеивать идущие подряд сообщения в один чат
+SEND_COALESCE = os.getenv("SEND_COALESCE", "0") == "1"
+SEND_MAX_RETRIES = int(os.getenv("SEND_MAX_RETRIES", "3"))
+# Вечерняя рассылка итогов дня: время ЧЧ:ММ (пусто — выключена),
+# сколько сообщений держать в отправке и как часто сохранять прогресс
+DAILY_BROADCAST_AT = os.getenv("DAILY_BROADCAST_AT", "")
+BROADCAST_CONCURRENCY = int(os.getenv("BROADCAST_CONCURRENCY", "100"))
+BROADCAST_CHECKPOINT_EVERY = int(os.getenv("BROADCAST_CHECKPOINT_EVERY", "100"))
 
 if not BOT_TOKEN:
-    raise ValueError("BOT_TOKEN не найден в .env файле")
\ No newline at end of file
+    raise ValueError("BOT_TOKEN не найден в .env файле")
@@ -1,18 +1,84 @@
-from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+from typing import Tuple
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession, AsyncEngine
 from database.models import Base
-from config import DATABASE_URL
+from database.migrations import run_migrations
+from config import DATABASE_URL, SQLITE_WAL, SQLITE_CACHE_SIZE_KB, SQLITE_MMAP_SIZE, DB_READ_POOL_SIZE
 
-engine = create_async_engine(DATABASE_URL, echo=False)
+
+def _sqlite_pragmas(wal: bool, read_only: bool):
+    """Обработчик события connect, настраивающий каждое новое соединение SQLite"""
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        if wal:
+            cursor.execute("PRAGMA journal_mode=WAL")
+            cursor.execute("PRAGMA synchronous=NORMAL")
+            cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+            cursor.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}")
+        cursor.execute("PRAGMA busy_timeout=5000")
+        if read_only:
+            cursor.execute("PRAGMA query_only=1")
+        cursor.close()
+
+    return on_connect
+
+
+def create_engines(
+    url: str = DATABASE_URL,
+    wal: bool = SQLITE_WAL,
+    read_pool_size: int = DB_READ_POOL_SIZE
+) -> Tuple[AsyncEngine, AsyncEngine]:
+    """
+    Создать движки для записи и для чтения
+
+    Для файловой SQLite запись идёт через единственное соединение (SQLite
+    всё равно допускает только одного писателя), а чтение — через отдельный
+    пул. В режиме WAL читатели не ждут писателя. Для остальных БД
+    (и SQLite в памяти) используется один общий движок.
+
+    Returns:
+        (движок для записи, движок для чтения)
+    """
+    database = make_url(url).database
+    if not url.startswith("sqlite") or not database or database == ":memory:":
+        engine = create_async_engine(url, echo=False)
+        return engine, engine
+
+    writer = create_async_engine(
+        url, echo=False, poolclass=AsyncAdaptedQueuePool, pool_size=1, max_overflow=0
+    )
+    reader = create_async_engine(
+        url, echo=False, poolclass=AsyncAdaptedQueuePool, pool_size=read_pool_size, max_overflow=0
+    )
+    event.listen(writer.sync_engine, "connect", _sqlite_pragmas(wal, read_only=False))
+    event.listen(reader.sync_engine, "connect", _sqlite_pragmas(wal, read_only=True))
+
+    return writer, reader
+
+
+engine, read_engine = create_engines()
 async_session_maker = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+read_session_maker = async_sessionmaker(read_engine, class_=AsyncSession, expire_on_commit=False)
 
 
 async def init_db():
-    """Инициализация базы данных"""
+    """Инициализация базы данных: создание таблиц и применение миграций"""
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
 
+    await run_migrations(engine)
+
+
+async def close_db():
+    """Закрыть все соединения"""
+    await engine.dispose()
+    if read_engine is not engine:
+        await read_engine.dispose()
+
 
 async def get_session() -> AsyncSession:
     """Получить сессию базы данных"""
     async with async_session_maker() as session:
-        yield session
\ No newline at end of file
+        yield session
@@ -0,0 +1,227 @@
+import asyncio
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StorageKey, StateType
+from sqlalchemy import MetaData, Table, Column, String, Float, select, delete, bindparam
+from sqlalchemy.dialects.sqlite import insert
+from database.db import create_engines
+
+logger = logging.getLogger(__name__)
+
+_metadata = MetaData()
+
+fsm_states = Table(
+    "fsm_states",
+    _metadata,
+    Column("key", String, primary_key=True),
+    Column("state", String),
+    Column("data", String),
+    Column("updated_at", Float, nullable=False, index=True),
+)
+
+
+class _Record:
+    """Запись горячего кэша: состояние, данные и время последнего изменения"""
+
+    __slots__ = ("state", "data", "updated_at")
+
+    def __init__(self, state: Optional[str], data: Dict[str, Any], updated_at: float):
+        self.state = state
+        self.data = data
+        self.updated_at = updated_at
+
+
+class SQLiteStorage(BaseStorage):
+    """
+    Хранилище FSM в отдельной базе SQLite с горячим кэшем в памяти
+
+    Изменения копятся в памяти и каждые flush_interval секунд пишутся в БД
+    одной транзакцией, поэтому диалоги переживают перезапуск, а set_state
+    не ждёт диска. При запуске живые диалоги загружаются в LRU-кэш, чтение
+    из кэша не ходит в БД. Диалоги, которые не менялись дольше ttl секунд,
+    считаются брошенными и периодически удаляются.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        ttl: float = 24 * 3600,
+        cache_size: int = 100_000,
+        flush_interval: float = 0.1
+    ):
+        self.engine, _ = create_engines(url, read_pool_size=1)
+        self.ttl = ttl
+        self.cache_size = cache_size
+        self.flush_interval = flush_interval
+        self._cache: "OrderedDict[str, _Record]" = OrderedDict()
+        # Ещё не записанные изменения: ключ -> (state, data в JSON, updated_at)
+        self._pending: Dict[str, Tuple[Optional[str], Optional[str], float]] = {}
+        # Кэш содержит все живые диалоги, промах кэша означает пустой диалог
+        self._complete = False
+        self._tasks = []
+
+    async def start(self):
+        """Создать таблицу, прогреть кэш и запустить фоновые запись и очистку"""
+        async with self.engine.begin() as conn:
+            await conn.run_sync(_metadata.create_all)
+        await self.sweep()
+
+        async with self.engine.connect() as conn:
+            result = await conn.execute(
+                select(fsm_states.c.key, fsm_states.c.state, fsm_states.c.data, fsm_states.c.updated_at)
+                .order_by(fsm_states.c.updated_at.desc())
+                .limit(self.cache_size + 1)
+            )
+            rows = result.all()
+
+        self._complete = len(rows) <= self.cache_size
+        for row in reversed(rows[:self.cache_size]):
+            self._cache[row.key] = _Record(row.state, json.loads(row.data) if row.data else {}, row.updated_at)
+
+        self._tasks = [
+            asyncio.create_task(self._flush_forever()),
+            asyncio.create_task(self._sweep_forever()),
+        ]
+
+    @staticmethod
+    def _key(key: StorageKey) -> str:
+        return f"{key.bot_id}:{key.chat_id}:{key.user_id}:{key.thread_id or ''}:{key.destiny}"
+
+    async def _load(self, key: str) -> _Record:
+        record = self._cache.get(key)
+        if record is not None:
+            self._cache.move_to_end(key)
+        else:
+            row = self._pending.get(key)
+            if row is None and not self._complete:
+                async with self.engine.connect() as conn:
+                    row = (await conn.execute(
+                        select(fsm_states.c.state, fsm_states.c.data, fsm_states.c.updated_at)
+                        .where(fsm_states.c.key == key)
+                    )).one_or_none()
+
+            if row is None:
+                record = _Record(None, {}, time.time())
+            else:
+                state, data, updated_at = row
+                record = _Record(state, json.loads(data) if data else {}, updated_at)
+            self._remember(key, record)
+
+        if record.updated_at < time.time() - self.ttl:
+            record.state, record.data = None, {}
+        return record
+
+    def _remember(self, key: str, record: _Record):
+        self._cache[key] = record
+        self._cache.move_to_end(key)
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+            self._complete = False
+
+    def _save(self, key: str, record: _Record):
+        record.updated_at = time.time()
+        self._remember(key, record)
+
+        data = json.dumps(record.data, ensure_ascii=False, separators=(",", ":")) if record.data else None
+        self._pending[key] = (record.state, data, record.updated_at)
+
+    async def flush(self):
+        """Записать накопленные изменения одной транзакцией"""
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, {}
+
+        # Пустой диалог не храним вовсе
+        upserts = [
+            {"key": key, "state": state, "data": data, "updated_at": updated_at}
+            for key, (state, data, updated_at) in pending.items()
+            if state is not None or data is not None
+        ]
+        deletes = [{"k": key} for key, (state, data, _) in pending.items() if state is None and data is None]
+
+        try:
+            async with self.engine.begin() as conn:
+                if upserts:
+                    stmt = insert(fsm_states)
+                    await conn.execute(
+                        stmt.on_conflict_do_update(
+                            index_elements=[fsm_states.c.key],
+                            set_={
+                                "state": stmt.excluded.state,
+                                "data": stmt.excluded.data,
+                                "updated_at": stmt.excluded.updated_at,
+                            }
+                        ),
+                        upserts
+                    )
+                if deletes:
+                    await conn.execute(delete(fsm_states).where(fsm_states.c.key == bindparam("k")), deletes)
+        except Exception:
+            # Возвращаем изменения в очередь, если их не перекрыли более новые
+            for key, value in pending.items():
+                self._pending.setdefault(key, value)
+            raise
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        storage_key = self._key(key)
+        record = await self._load(storage_key)
+        record.state = state.state if isinstance(state, State) else state
+        self._save(storage_key, record)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        return (await self._load(self._key(key))).state
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        storage_key = self._key(key)
+        record = await self._load(storage_key)
+        record.data = data.copy()
+        self._save(storage_key, record)
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        return (await self._load(self._key(key))).data.copy()
+
+    async def sweep(self) -> int:
+        """
+        Удалить брошенные диалоги
+
+        Returns:
+            количество удалённых записей
+        """
+        deadline = time.time() - self.ttl
+        async with self.engine.begin() as conn:
+            result = await conn.execute(delete(fsm_states).where(fsm_states.c.updated_at < deadline))
+
+        for key in [key for key, record in self._cache.items() if record.updated_at < deadline]:
+            del self._cache[key]
+
+        if result.rowcount:
+            logger.info("🧹 Удалено брошенных диалогов: %d", result.rowcount)
+        return result.rowcount
+
+    async def _flush_forever(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Не удалось записать состояния FSM")
+
+    async def _sweep_forever(self):
+        interval = min(self.ttl, 3600)
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.sweep()
+            except Exception:
+                logger.exception("Не удалось очистить брошенные диалоги")
+
+    async def close(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+        await self.flush()
+        await self.engine.dispose()
@@ -0,0 +1,46 @@
+from typing import Optional
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+
+class SessionStats:
+    """Счётчики: сколько апдейтов обработано и сколько сессий БД реально открыто"""
+
+    def __init__(self):
+        self.updates = 0
+        self.sessions_opened = 0
+
+    def record(self, *sessions: "LazySession"):
+        self.updates += 1
+        self.sessions_opened += sum(session.opened for session in sessions)
+
+
+session_stats = SessionStats()
+
+
+class LazySession:
+    """
+    Ленивый прокси AsyncSession
+
+    Настоящая сессия создаётся при первом обращении к любому её атрибуту
+    (execute, add, commit, ...). Обработчики, которые не ходят в БД,
+    не создают сессию вовсе.
+    """
+
+    def __init__(self, session_maker: async_sessionmaker):
+        self._session_maker = session_maker
+        self._session: Optional[AsyncSession] = None
+
+    @property
+    def opened(self) -> int:
+        """Сколько сессий реально открыто (0 или 1)"""
+        return int(self._session is not None)
+
+    def __getattr__(self, name):
+        if self._session is None:
+            self._session = self._session_maker()
+        return getattr(self._session, name)
+
+    async def close(self):
+        """Закрыть сессию, если она открывалась"""
+        if self._session is not None:
+            await self._session.close()
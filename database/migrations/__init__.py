@@ -0,0 +1,87 @@
+"""
+Версионированные миграции схемы
+
+Каждая миграция — модуль вида mNNNN_описание.py в этом пакете с функцией
+upgrade(connection). Номер берётся из имени модуля. Применённые версии
+записываются в таблицу schema_version. Миграции выполняются при запуске
+под блокировкой: asyncio.Lock внутри процесса и BEGIN IMMEDIATE в SQLite
+между процессами.
+"""
+import asyncio
+import importlib
+import logging
+import pkgutil
+import re
+from typing import Callable, List, NamedTuple
+from sqlalchemy import Connection, text
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+logger = logging.getLogger(__name__)
+
+_MODULE_RE = re.compile(r"^m(\d{4})_(\w+)$")
+
+_lock = asyncio.Lock()
+
+
+class Migration(NamedTuple):
+    version: int
+    name: str
+    upgrade: Callable[[Connection], None]
+
+
+def discover_migrations() -> List[Migration]:
+    """Найти все миграции пакета, упорядоченные по версии"""
+    migrations = []
+    for module_info in pkgutil.iter_modules(__path__):
+        match = _MODULE_RE.match(module_info.name)
+        if not match:
+            continue
+        module = importlib.import_module(f"{__name__}.{module_info.name}")
+        migrations.append(Migration(int(match.group(1)), match.group(2), module.upgrade))
+
+    migrations.sort(key=lambda migration: migration.version)
+    return migrations
+
+
+def _apply_pending(connection: Connection) -> List[Migration]:
+    connection.execute(text(
+        "CREATE TABLE IF NOT EXISTS schema_version ("
+        " version INTEGER PRIMARY KEY,"
+        " name VARCHAR NOT NULL,"
+        " applied_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP"
+        ")"
+    ))
+    applied = set(connection.execute(text("SELECT version FROM schema_version")).scalars())
+
+    pending = [migration for migration in discover_migrations() if migration.version not in applied]
+    for migration in pending:
+        logger.info("🛠 Миграция %04d: %s", migration.version, migration.name)
+        migration.upgrade(connection)
+        connection.execute(
+            text("INSERT INTO schema_version (version, name) VALUES (:version, :name)"),
+            {"version": migration.version, "name": migration.name}
+        )
+
+    return pending
+
+
+async def run_migrations(engine: AsyncEngine) -> List[Migration]:
+    """
+    Применить все неприменённые миграции одной транзакцией
+
+    Returns:
+        список применённых миграций
+    """
+    async with _lock:
+        async with engine.connect() as conn:
+            # Управляем транзакцией сами: BEGIN IMMEDIATE сразу берёт блокировку записи
+            conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+            await conn.exec_driver_sql("BEGIN IMMEDIATE")
+            try:
+                pending = await conn.run_sync(_apply_pending)
+            except Exception:
+                await conn.exec_driver_sql("ROLLBACK")
+                raise
+            await conn.exec_driver_sql("COMMIT")
+
+    return pending
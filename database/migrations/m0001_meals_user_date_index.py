@@ -0,0 +1,8 @@
+from sqlalchemy import Connection, text
+
+
+def upgrade(connection: Connection):
+    """Индекс для выборок по (user_id, date); порядок по id берётся из rowid индекса"""
+    connection.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_meals_user_date ON meals (user_id, date)"
+    ))
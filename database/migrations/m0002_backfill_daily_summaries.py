@@ -0,0 +1,22 @@
+from sqlalchemy import Connection, text
+
+
+def upgrade(connection: Connection):
+    """Заполнить daily_summaries по уже существующим записям meals"""
+    columns = {row.name for row in connection.execute(text("PRAGMA table_info(meals)"))}
+    # На новой базе meals сразу создана в компактном виде (m0004)
+    calories_x100 = (
+        "meals.calories_x100" if "calories_x100" in columns else "CAST(round(meals.calories * 100) AS INTEGER)"
+    )
+    # Таблицу итогов мог создать create_all уже с калориями в сотых (m0006)
+    summary_columns = {row.name for row in connection.execute(text("PRAGMA table_info(daily_summaries)"))}
+    if "calories_x100" in summary_columns:
+        column, total = "calories_x100", f"SUM({calories_x100})"
+    else:
+        column, total = "calories", f"SUM({calories_x100}) / 100.0"
+    connection.execute(text(
+        f"INSERT OR IGNORE INTO daily_summaries (user_id, date, {column}, items, goal) "
+        f"SELECT meals.user_id, meals.date, {total}, COUNT(meals.id), users.daily_goal "
+        "FROM meals JOIN users ON users.id = meals.user_id "
+        "GROUP BY meals.user_id, meals.date"
+    ))
@@ -0,0 +1,14 @@
+from sqlalchemy import Connection, text
+
+
+def upgrade(connection: Connection):
+    """Источник продукта: seed — data/products.json, иначе имя импорта"""
+    columns = {row.name for row in connection.execute(text("PRAGMA table_info(products)"))}
+    # На новой базе колонку уже создал create_all
+    if "source" not in columns:
+        connection.execute(text(
+            "ALTER TABLE products ADD COLUMN source VARCHAR NOT NULL DEFAULT 'seed'"
+        ))
+    connection.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_products_source ON products (source)"
+    ))
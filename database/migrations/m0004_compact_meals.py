@@ -0,0 +1,78 @@
+"""
+Компактные записи meals: ссылка на продукт и калории в сотых долях ккал
+
+Перестройка большой таблицы одной транзакцией надолго задержала бы запуск.
+Поэтому миграция только переименовывает старую таблицу в meals_legacy,
+создаёт новую meals и сразу переносит записи последних дней (их показывают
+и удаляют обработчики). Остальные строки переносит в фоне
+services.meal_backfill короткими транзакциями.
+"""
+from datetime import date, timedelta
+from typing import Any, Dict
+from sqlalchemy import Connection, text
+
+LEGACY_TABLE = "meals_legacy"
+
+# Записи за столько последних дней переносятся сразу
+RECENT_DAYS = 2
+
+
+def copy_legacy_meals(connection: Connection, condition: str, params: Dict[str, Any]) -> int:
+    """
+    Перенести строки meals_legacy, подходящие под условие, в meals
+
+    Продукт ищется по названию; название сохраняется в строке, только если
+    продукта уже нет в каталоге. Перенесённые строки удаляются из meals_legacy.
+
+    Returns:
+        число перенесённых строк
+    """
+    connection.execute(text(
+        "INSERT INTO meals (id, user_id, product_id, product_name, grams, calories_x100, date) "
+        "SELECT legacy.id, legacy.user_id, products.id, "
+        "CASE WHEN products.id IS NULL THEN legacy.product_name END, "
+        "legacy.grams, CAST(round(legacy.calories * 100) AS INTEGER), legacy.date "
+        f"FROM {LEGACY_TABLE} AS legacy LEFT JOIN products ON products.name = legacy.product_name "
+        f"WHERE {condition} ORDER BY legacy.id"
+    ), params)
+    return connection.execute(text(f"DELETE FROM {LEGACY_TABLE} AS legacy WHERE {condition}"), params).rowcount
+
+
+def upgrade(connection: Connection):
+    """Перевести meals на компактный формат, перенеся сразу только последние дни"""
+    columns = {row.name for row in connection.execute(text("PRAGMA table_info(meals)"))}
+    # На новой базе таблицу уже создал create_all
+    if "calories_x100" in columns:
+        return
+
+    connection.execute(text(f"ALTER TABLE meals RENAME TO {LEGACY_TABLE}"))
+    # Индекс переехал вместе с таблицей; перенос идёт по id, он больше не нужен
+    connection.execute(text("DROP INDEX IF EXISTS ix_meals_user_date"))
+    connection.execute(text(
+        "CREATE TABLE meals ("
+        " id INTEGER NOT NULL,"
+        " user_id INTEGER NOT NULL,"
+        " product_id INTEGER,"
+        " product_name VARCHAR,"
+        " grams INTEGER NOT NULL,"
+        " calories_x100 INTEGER NOT NULL,"
+        " date DATE NOT NULL,"
+        " PRIMARY KEY (id),"
+        " FOREIGN KEY(user_id) REFERENCES users (id),"
+        " FOREIGN KEY(product_id) REFERENCES products (id)"
+        ")"
+    ))
+    # Калории в индексе: суммы по дням и периодам считаются без чтения таблицы
+    connection.execute(text("CREATE INDEX ix_meals_user_date ON meals (user_id, date, calories_x100)"))
+
+    # Строка с наибольшим id переносится сразу: новые записи получат id больше
+    # всех старых, и фоновый перенос не столкнётся с ними
+    recent_from = date.today() - timedelta(days=RECENT_DAYS - 1)
+    copy_legacy_meals(
+        connection,
+        f"legacy.date >= :recent_from OR legacy.id = (SELECT max(id) FROM {LEGACY_TABLE})",
+        {"recent_from": recent_from.isoformat()}
+    )
+
+    if connection.execute(text(f"SELECT 1 FROM {LEGACY_TABLE} LIMIT 1")).first() is None:
+        connection.execute(text(f"DROP TABLE {LEGACY_TABLE}"))
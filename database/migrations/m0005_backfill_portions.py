@@ -0,0 +1,17 @@
+from datetime import date, timedelta
+from sqlalchemy import Connection, text
+
+# Привычки берём из записей за столько последних дней
+BACKFILL_DAYS = 60
+
+
+def upgrade(connection: Connection):
+    """Заполнить portions (быстрое добавление) по недавним записям meals"""
+    # Записи, которые ещё ждут переноса из meals_legacy (m0004), не учитываются:
+    # порции наберутся заново при следующих добавлениях
+    connection.execute(text(
+        "INSERT OR IGNORE INTO portions (user_id, product_id, grams, uses, last_used) "
+        "SELECT user_id, product_id, grams, COUNT(*), MAX(date) FROM meals "
+        "WHERE product_id IS NOT NULL AND date >= :since "
+        "GROUP BY user_id, product_id, grams"
+    ), {"since": (date.today() - timedelta(days=BACKFILL_DAYS)).isoformat()})
@@ -0,0 +1,25 @@
+"""
+Итоги дней в сотых долях ккал, как калории в meals
+
+Итоги хранились в float и после каждого изменения округлялись до сотых,
+но сумма float по многим дням всё равно могла отличаться от точной суммы
+записей. Целые сотые складываются без ошибок.
+"""
+from sqlalchemy import Connection, text
+
+
+def upgrade(connection: Connection):
+    """Перевести daily_summaries.calories в целые сотые (calories_x100)"""
+    columns = {row.name for row in connection.execute(text("PRAGMA table_info(daily_summaries)"))}
+    # На новой базе таблицу уже создал create_all
+    if "calories" not in columns:
+        return
+
+    connection.execute(text(
+        "ALTER TABLE daily_summaries ADD COLUMN calories_x100 INTEGER NOT NULL DEFAULT 0"
+    ))
+    # Итоги округлялись до сотых после каждого изменения, так что перевод точный
+    connection.execute(text(
+        "UPDATE daily_summaries SET calories_x100 = CAST(round(calories * 100) AS INTEGER)"
+    ))
+    connection.execute(text("ALTER TABLE daily_summaries DROP COLUMN calories"))
@@ -1,6 +1,11 @@
 from datetime import datetime
-from sqlalchemy import Integer, String, Float, DateTime, Date, ForeignKey
-from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
+from typing import Optional
+from sqlalchemy import Integer, String, Float, DateTime, Date, ForeignKey, Index, func, select, type_coerce
+from sqlalchemy.ext.hybrid import hybrid_property
+from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, column_property
+
+# Калории в meals и daily_summaries хранятся целым числом сотых долей ккал
+CALORIES_SCALE = 100
 
 
 class Base(DeclarativeBase):
@@ -22,14 +27,138 @@ class Product(Base):
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     name: Mapped[str] = mapped_column(String, unique=True, nullable=False)
     kcal_per_100g: Mapped[int] = mapped_column(Integer, nullable=False)
+    # seed — из data/products.json, иначе имя источника импорта
+    source: Mapped[str] = mapped_column(String, nullable=False, default="seed", server_default="seed")
+
+    __table_args__ = (
+        Index("ix_products_source", "source"),
+    )
 
 
 class Meal(Base):
+    """
+    Приём пищи: ссылка на продукт каталога и калории в сотых долях ккал
+
+    Название хранится в строке только как снимок, если продукт позже
+    переименовали или удалили из каталога (services.meals.snapshot_meal_names).
+    """
     __tablename__ = "meals"
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     user_id: Mapped[int] = mapped_column(Integer, ForeignKey("users.id"), nullable=False)
-    product_name: Mapped[str] = mapped_column(String, nullable=False)
+    product_id: Mapped[Optional[int]] = mapped_column(Integer, ForeignKey("products.id"), nullable=True)
+    product_name: Mapped[Optional[str]] = mapped_column(String, nullable=True)
+    grams: Mapped[int] = mapped_column(Integer, nullable=False)
+    calories_x100: Mapped[int] = mapped_column(Integer, nullable=False)
+    date: Mapped[datetime] = mapped_column(Date, nullable=False)
+
+    # Название для показа: снимок, иначе текущее название в каталоге
+    name: Mapped[str] = column_property(
+        func.coalesce(
+            product_name,
+            select(Product.name).where(Product.id == product_id).scalar_subquery(),
+            ""
+        ).label("name")
+    )
+
+    __table_args__ = (
+        # Калории в индексе: суммы по дням и периодам считаются без чтения таблицы
+        Index("ix_meals_user_date", "user_id", "date", "calories_x100"),
+    )
+
+    @hybrid_property
+    def calories(self) -> float:
+        return self.calories_x100 / CALORIES_SCALE
+
+    @calories.inplace.expression
+    @classmethod
+    def _calories_expression(cls):
+        return type_coerce(cls.calories_x100 / CALORIES_SCALE, Float).label("calories")
+
+    @classmethod
+    def calories_sum(cls):
+        """Сумма калорий в ккал для агрегирующих запросов: складываются целые, без ошибок округления"""
+        return type_coerce(func.sum(cls.calories_x100) / CALORIES_SCALE, Float)
+
+
+class DailySummary(Base):
+    """
+    Итоги пользователя за день, обновляются вместе с записями в meals
+
+    Калории — сумма calories_x100 записей дня, поэтому итоги и суммы по ним
+    точно совпадают с расчётом по строкам meals.
+    """
+    __tablename__ = "daily_summaries"
+
+    user_id: Mapped[int] = mapped_column(Integer, ForeignKey("users.id"), primary_key=True)
+    date: Mapped[datetime] = mapped_column(Date, primary_key=True)
+    calories_x100: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    items: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    goal: Mapped[int] = mapped_column(Integer, nullable=False)
+
+    @hybrid_property
+    def calories(self) -> float:
+        return self.calories_x100 / CALORIES_SCALE
+
+    @calories.inplace.expression
+    @classmethod
+    def _calories_expression(cls):
+        return type_coerce(cls.calories_x100 / CALORIES_SCALE, Float).label("calories")
+
+
+class Portion(Base):
+    """Как часто пользователь добавляет продукт в таком количестве; обновляется вместе с записями в meals"""
+    __tablename__ = "portions"
+
+    user_id: Mapped[int] = mapped_column(Integer, ForeignKey("users.id"), primary_key=True)
+    product_id: Mapped[int] = mapped_column(Integer, ForeignKey("products.id"), primary_key=True)
+    grams: Mapped[int] = mapped_column(Integer, primary_key=True)
+    uses: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    last_used: Mapped[datetime] = mapped_column(Date, nullable=False)
+
+
+class Recipe(Base):
+    """
+    Блюдо пользователя из продуктов каталога
+
+    Калорийность на 100 г посчитана заранее по составу и весу готового
+    блюда (services.recipes), поэтому запись блюда — одна строка в meals.
+    """
+    __tablename__ = "recipes"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    user_id: Mapped[int] = mapped_column(Integer, ForeignKey("users.id"), nullable=False)
+    name: Mapped[str] = mapped_column(String, nullable=False)
+    # Вес готового блюда; без него — сумма весов ингредиентов
+    cooked_grams: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    kcal_per_100g: Mapped[float] = mapped_column(Float, nullable=False)
+
+    __table_args__ = (
+        Index("ix_recipes_user_name", "user_id", "name", unique=True),
+    )
+
+
+class RecipeIngredient(Base):
+    """Ингредиент блюда с калорийностью продукта, по которой посчитано блюдо"""
+    __tablename__ = "recipe_ingredients"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    recipe_id: Mapped[int] = mapped_column(Integer, ForeignKey("recipes.id"), nullable=False)
+    # None — продукт удалён из каталога, калорийность остаётся последней известной
+    product_id: Mapped[Optional[int]] = mapped_column(Integer, ForeignKey("products.id"), nullable=True)
     grams: Mapped[int] = mapped_column(Integer, nullable=False)
-    calories: Mapped[float] = mapped_column(Float, nullable=False)
-    date: Mapped[datetime] = mapped_column(Date, nullable=False)
\ No newline at end of file
+    kcal_per_100g: Mapped[int] = mapped_column(Integer, nullable=False)
+
+    __table_args__ = (
+        Index("ix_recipe_ingredients_recipe", "recipe_id"),
+        # Какие блюда пересчитать при изменении продукта
+        Index("ix_recipe_ingredients_product", "product_id"),
+    )
+
+
+class Meta(Base):
+    """Служебные значения (например, хэш загруженного каталога)"""
+    __tablename__ = "meta"
+
+    key: Mapped[str] = mapped_column(String, primary_key=True)
+    value: Mapped[str] = mapped_column(String, nullable=False)
@@ -1,23 +1,40 @@
 from datetime import date
 from aiogram import Router, F
-from aiogram.filters import Command
+from aiogram.filters import Command, CommandObject, StateFilter
 from aiogram.types import Message, CallbackQuery
 from aiogram.fsm.context import FSMContext
-from sqlalchemy import select, func, delete
+from sqlalchemy import select, delete
 from sqlalchemy.ext.asyncio import AsyncSession
-from database.models import User, Meal
-from services.product_search import find_product, find_similar_products
+from database.models import Meal
+from services.parser import parse_meal_items
+from services.product_search import find_product, find_products, find_similar_products, get_product_by_id
+from services.daily_summary import remove_meal_from_summary, clear_day_summary
+from services.meals import MealEntry, insert_meals, save_meal
+from services.favorites import get_favorites, unrecord_portions
+from services.recipes import find_recipes, get_recipe
+from services.users import get_user
 from states.user_states import AddProductStates
-from keyboards.main_kb import get_main_keyboard, get_cancel_keyboard, get_delete_keyboard
+from keyboards.main_kb import get_main_keyboard, get_cancel_keyboard, get_delete_keyboard, get_quick_add_keyboard
 
 router = Router()
 
+MAX_GRAMS = 10000
+
+
+def _day_status(today_calories: float, goal: int) -> str:
+    """Строка с итогом дня относительно нормы"""
+    if today_calories > goal:
+        status = f"⚠️ Превышение на {int(today_calories - goal)} ккал"
+    else:
+        status = f"✅ Осталось: {int(goal - today_calories)} ккал"
+    return f"📊 Сегодня: {int(today_calories)} / {goal} ккал\n{status}"
+
 
 @router.message(F.text == "➕ Добавить продукт")
 async def start_add_product(message: Message, state: FSMContext):
     """Начало добавления продукта"""
     await state.set_state(AddProductStates.waiting_for_product)
-    await message.answer(
+    return message.answer(
         "📝 Введите название продукта:\n\n"
         "Например: яблоко, куриная грудка, рис",
         reply_markup=get_cancel_keyboard()
@@ -28,44 +45,52 @@ async def start_add_product(message: Message, state: FSMContext):
 async def cancel_add_product(message: Message, state: FSMContext):
     """Отмена добавления продукта"""
     await state.clear()
-    await message.answer("❌ Добавление отменено", reply_markup=get_main_keyboard())
+    return message.answer("❌ Добавление отменено", reply_markup=get_main_keyboard())
 
 
 @router.message(AddProductStates.waiting_for_product)
-async def process_product_name(message: Message, state: FSMContext, session: AsyncSession):
+async def process_product_name(message: Message, state: FSMContext, session: AsyncSession, read_session: AsyncSession):
     """Обработка названия продукта"""
     product_name = message.text.strip().lower()
 
-    # Ищем продукт
+    # Ищем продукт, затем блюдо пользователя
     product = await find_product(session, product_name)
-
+    recipe = None
     if not product:
+        # Блюда только читаем: соединение записи может понадобиться групповой записи
+        user = await get_user(read_session, message.from_user.id, create=False)
+        recipe = (await find_recipes(read_session, user.id, [product_name])).get(product_name) if user else None
+
+    if not product and not recipe:
         # Продукт не найден, ищем похожие
         similar = await find_similar_products(session, product_name)
 
         if similar:
             suggestions = "\n".join([f"• {p}" for p in similar[:5]])
-            await message.answer(
+            return message.answer(
                 f"❌ Продукт '{product_name}' не найден.\n\n"
                 f"Похожие продукты:\n{suggestions}\n\n"
                 "Попробуйте ещё раз или нажмите Отмена",
                 reply_markup=get_cancel_keyboard()
             )
-        else:
-            await message.answer(
-                f"❌ Продукт '{product_name}' не найден в базе.\n\n"
-                "Попробуйте другое название или нажмите Отмена",
-                reply_markup=get_cancel_keyboard()
-            )
-        return
 
-    # Сохраняем продукт в состояние
-    await state.update_data(product=product)
+        return message.answer(
+            f"❌ Продукт '{product_name}' не найден в базе.\n\n"
+            "Попробуйте другое название или нажмите Отмена",
+            reply_markup=get_cancel_keyboard()
+        )
+
+    # В состоянии храним только id продукта или блюда
+    if recipe:
+        await state.update_data(recipe_id=recipe.id)
+    else:
+        await state.update_data(product_id=product.id)
     await state.set_state(AddProductStates.waiting_for_grams)
 
-    await message.answer(
+    product = product or recipe
+    return message.answer(
         f"✅ {product.name.capitalize()}\n"
-        f"🔥 {product.kcal_per_100g} ккал на 100г\n\n"
+        f"🔥 {int(product.kcal_per_100g)} ккал на 100г\n\n"
         f"⚖️ Введите количество грамм:\n"
         f"Например: 150",
         reply_markup=get_cancel_keyboard()
@@ -76,108 +101,147 @@ async def process_product_name(message: Message, state: FSMContext, session: Asy
 async def cancel_add_grams(message: Message, state: FSMContext):
     """Отмена ввода граммов"""
     await state.clear()
-    await message.answer("❌ Добавление отменено", reply_markup=get_main_keyboard())
+    return message.answer("❌ Добавление отменено", reply_markup=get_main_keyboard())
 
 
 @router.message(AddProductStates.waiting_for_grams)
-async def process_grams(message: Message, state: FSMContext, session: AsyncSession):
+async def process_grams(message: Message, state: FSMContext, session: AsyncSession, read_session: AsyncSession):
     """Обработка количества грамм"""
     # Проверяем, что введено число
     if not message.text.isdigit():
-        await message.answer(
+        return message.answer(
             "❌ Пожалуйста, введите число (только цифры)\n"
             "Например: 150",
             reply_markup=get_cancel_keyboard()
         )
-        return
 
     grams = int(message.text)
 
-    if grams <= 0 or grams > 10000:
-        await message.answer(
-            "❌ Количество грамм должно быть от 1 до 10000\n"
+    if grams <= 0 or grams > MAX_GRAMS:
+        return message.answer(
+            f"❌ Количество грамм должно быть от 1 до {MAX_GRAMS}\n"
             "Попробуйте ещё раз:",
             reply_markup=get_cancel_keyboard()
         )
-        return
 
     # Получаем данные из состояния
     data = await state.get_data()
-    product = data.get("product")
+    product_id = data.get("product_id")
+    recipe_id = data.get("recipe_id")
+    if recipe_id:
+        product = await get_recipe(read_session, recipe_id)
+    else:
+        product = await get_product_by_id(session, product_id) if product_id else None
 
-    # Получаем пользователя
-    result = await session.execute(
-        select(User).where(User.telegram_id == message.from_user.id)
-    )
-    user = result.scalar_one_or_none()
+    if not product:
+        # Продукт успели удалить из каталога, пока пользователь вводил граммы
+        await state.clear()
+        return message.answer("❌ Продукт больше не найден в базе", reply_markup=get_main_keyboard())
 
-    if not user:
-        user = User(telegram_id=message.from_user.id, daily_goal=2000)
-        session.add(user)
-        await session.commit()
-        await session.refresh(user)
+    # Получаем пользователя
+    user = await get_user(session, message.from_user.id)
 
     # Считаем калории
     calories = product.kcal_per_100g * grams / 100
 
-    # Сохраняем в БД
-    meal = Meal(
+    # Сохраняем в БД вместе с итогами дня одной транзакцией
+    entry = MealEntry(
         user_id=user.id,
-        product_name=product.name,
+        product_id=None if recipe_id else product.id,
         grams=grams,
         calories=calories,
-        date=date.today()
+        date=date.today(),
+        goal=user.daily_goal,
+        # Блюдо — одна запись с его названием
+        product_name=product.name if recipe_id else None
     )
-    session.add(meal)
-    await session.commit()
-
-    # Получаем сумму калорий за сегодня
-    today_result = await session.execute(
-        select(func.sum(Meal.calories)).where(
-            Meal.user_id == user.id,
-            Meal.date == date.today()
-        )
-    )
-    today_calories = today_result.scalar() or 0
+    today_calories = await save_meal(session, entry)
 
     # Очищаем состояние
     await state.clear()
 
-    # Проверяем превышение нормы
-    if today_calories > user.daily_goal:
-        status = f"⚠️ Превышение на {int(today_calories - user.daily_goal)} ккал"
-    else:
-        remaining = user.daily_goal - today_calories
-        status = f"✅ Осталось: {int(remaining)} ккал"
-
     # Формируем ответ
     response = (
         f"✅ Продукт добавлен!\n\n"
         f"🍽️ {product.name.capitalize()}\n"
         f"⚖️ {grams} г\n"
         f"🔥 {int(calories)} ккал\n\n"
-        f"📊 Сегодня: {int(today_calories)} / {user.daily_goal} ккал\n"
-        f"{status}"
+        f"{_day_status(today_calories, user.daily_goal)}"
+    )
+
+    return message.answer(response, reply_markup=get_main_keyboard())
+
+
+async def _quick_add_keyboard(session: AsyncSession, user_id: int):
+    """Клавиатура избранного или None, если пользователь ещё ничего не добавлял"""
+    portions = []
+    for portion in await get_favorites(session, user_id):
+        product = await get_product_by_id(session, portion.product_id)
+        # Продукт могли удалить из каталога
+        if product:
+            portions.append((product.id, product.name, portion.grams))
+    return get_quick_add_keyboard(portions) if portions else None
+
+
+@router.message(F.text == "⭐ Избранное")
+async def show_favorites(message: Message, read_session: AsyncSession):
+    """Продукты, которые пользователь добавляет чаще всего"""
+    user = await get_user(read_session, message.from_user.id, create=False)
+    keyboard = await _quick_add_keyboard(read_session, user.id) if user else None
+
+    if keyboard is None:
+        return message.answer(
+            "⭐ Здесь появятся продукты, которые вы добавляете чаще всего",
+            reply_markup=get_main_keyboard()
+        )
+
+    return message.answer("⭐ Нажмите, чтобы добавить обычную порцию:", reply_markup=keyboard)
+
+
+@router.callback_query(F.data.startswith("quick_"))
+async def quick_add(callback: CallbackQuery, session: AsyncSession):
+    """Добавление порции из избранного одним нажатием"""
+    _, product_id, grams = callback.data.split("_")
+    grams = int(grams)
+    product = await get_product_by_id(session, int(product_id))
+
+    if not product or grams <= 0 or grams > MAX_GRAMS:
+        return callback.answer("❌ Продукт больше не найден в базе", show_alert=True)
+
+    user = await get_user(session, callback.from_user.id)
+    calories = product.kcal_per_100g * grams / 100
+    entry = MealEntry(
+        user_id=user.id,
+        product_id=product.id,
+        grams=grams,
+        calories=calories,
+        date=date.today(),
+        goal=user.daily_goal
     )
+    today_calories = await save_meal(session, entry)
 
-    await message.answer(response, reply_markup=get_main_keyboard())
+    await callback.answer(f"✅ {product.name.capitalize()} {grams} г")
+
+    # Та же клавиатура остаётся под сообщением: можно добавить ещё
+    return callback.message.edit_text(
+        f"✅ {product.name.capitalize()} — {grams} г, {int(calories)} ккал\n\n"
+        f"{_day_status(today_calories, user.daily_goal)}\n\n"
+        "⭐ Добавить ещё:",
+        reply_markup=await _quick_add_keyboard(session, user.id)
+    )
 
 
 @router.message(F.text == "🗑️ Удалить продукт")
-async def start_delete_product(message: Message, session: AsyncSession):
+async def start_delete_product(message: Message, read_session: AsyncSession):
     """Начало удаления продукта"""
     # Получаем пользователя
-    result = await session.execute(
-        select(User).where(User.telegram_id == message.from_user.id)
-    )
-    user = result.scalar_one_or_none()
+    user = await get_user(read_session, message.from_user.id, create=False)
 
     if not user:
-        await message.answer("❌ Сначала добавьте хотя бы один продукт", reply_markup=get_main_keyboard())
-        return
+        return message.answer("❌ Сначала добавьте хотя бы один продукт", reply_markup=get_main_keyboard())
 
     # Получаем продукты за сегодня
-    meals_result = await session.execute(
+    meals_result = await read_session.execute(
         select(Meal).where(
             Meal.user_id == user.id,
             Meal.date == date.today()
@@ -186,10 +250,9 @@ async def start_delete_product(message: Message, session: AsyncSession):
     meals = meals_result.scalars().all()
 
     if not meals:
-        await message.answer("📭 Сегодня ещё нет добавленных продуктов", reply_markup=get_main_keyboard())
-        return
+        return message.answer("📭 Сегодня ещё нет добавленных продуктов", reply_markup=get_main_keyboard())
 
-    await message.answer(
+    return message.answer(
         "🗑️ Выберите продукт для удаления:",
         reply_markup=get_delete_keyboard(meals)
     )
@@ -199,18 +262,31 @@ async def start_delete_product(message: Message, session: AsyncSession):
 async def delete_product(callback: CallbackQuery, session: AsyncSession):
     """Удаление выбранного продукта"""
     meal_id = int(callback.data.split("_")[1])
+    user = await get_user(session, callback.from_user.id, create=False)
+
+    # Удаляем продукт и вычитаем его из итогов дня; чужие записи не трогаем
+    deleted = None
+    if user:
+        result = await session.execute(
+            delete(Meal)
+            .where(Meal.id == meal_id, Meal.user_id == user.id)
+            .returning(Meal.user_id, Meal.date, Meal.calories_x100, Meal.product_id, Meal.grams)
+        )
+        deleted = result.one_or_none()
 
-    # Удаляем продукт
-    await session.execute(
-        delete(Meal).where(Meal.id == meal_id)
-    )
+    if not deleted:
+        return callback.answer("❌ Продукт уже удалён")
+
+    # Ошибочная запись не должна поднимать продукт в избранном
+    await remove_meal_from_summary(session, deleted.user_id, deleted.date, deleted.calories_x100)
+    await unrecord_portions(session, user.id, [(deleted.product_id, deleted.grams)])
     await session.commit()
 
     await callback.answer("✅ Продукт удалён")
     await callback.message.edit_text("✅ Продукт успешно удалён!")
 
     # Отправляем главное меню
-    await callback.message.answer(
+    return callback.message.answer(
         "Что дальше?",
         reply_markup=get_main_keyboard()
     )
@@ -221,7 +297,7 @@ async def cancel_delete(callback: CallbackQuery):
     """Отмена удаления"""
     await callback.answer()
     await callback.message.edit_text("❌ Удаление отменено")
-    await callback.message.answer(
+    return callback.message.answer(
         "Что дальше?",
         reply_markup=get_main_keyboard()
     )
@@ -230,39 +306,115 @@ async def cancel_delete(callback: CallbackQuery):
 @router.message(F.text == "❌ Очистить день")
 async def reset_day(message: Message, session: AsyncSession):
     """Очистить записи за сегодня"""
-    result = await session.execute(
-        select(User).where(User.telegram_id == message.from_user.id)
-    )
-    user = result.scalar_one_or_none()
+    user = await get_user(session, message.from_user.id, create=False)
 
     if not user:
-        await message.answer("❌ Пользователь не найден", reply_markup=get_main_keyboard())
-        return
+        return message.answer("❌ Пользователь не найден", reply_markup=get_main_keyboard())
 
-    # Проверяем, есть ли записи за сегодня
-    meals_result = await session.execute(
-        select(func.count(Meal.id)).where(
+    # Удаляем записи за сегодня вместе с итогами дня
+    today = date.today()
+    result = await session.execute(
+        delete(Meal).where(
             Meal.user_id == user.id,
-            Meal.date == date.today()
-        )
+            Meal.date == today
+        ).returning(Meal.product_id, Meal.grams)
     )
-    count = meals_result.scalar() or 0
+    deleted = result.all()
+    count = len(deleted)
 
     if count == 0:
-        await message.answer("📭 Сегодня нет записей для удаления", reply_markup=get_main_keyboard())
-        return
+        return message.answer("📭 Сегодня нет записей для удаления", reply_markup=get_main_keyboard())
 
-    # Удаляем записи за сегодня
-    await session.execute(
-        delete(Meal).where(
-            Meal.user_id == user.id,
-            Meal.date == date.today()
-        )
-    )
+    await clear_day_summary(session, user.id, today)
+    await unrecord_portions(session, user.id, deleted)
     await session.commit()
 
-    await message.answer(
+    return message.answer(
         f"🗑️ Удалено продуктов: {count}\n"
         f"День очищен!",
         reply_markup=get_main_keyboard()
-    )
\ No newline at end of file
+    )
+
+
+async def add_items(message: Message, session: AsyncSession, read_session: AsyncSession, items: list):
+    """Добавить один или несколько продуктов из одного сообщения"""
+    wrong_grams = [item for item in items if item["grams"] <= 0 or item["grams"] > MAX_GRAMS]
+    if wrong_grams:
+        return message.answer(
+            f"❌ Количество грамм должно быть от 1 до {MAX_GRAMS}: "
+            + ", ".join(f"{item['product']} {item['grams']}" for item in wrong_grams),
+            reply_markup=get_main_keyboard()
+        )
+
+    # Все названия ищем разом
+    products = await find_products(session, [item["product"] for item in items])
+    missing = [item["product"] for item in items if item["product"] not in products]
+
+    # Чего нет в каталоге, может быть блюдом пользователя
+    user = None
+    recipes = {}
+    if missing:
+        user = await get_user(read_session, message.from_user.id, create=False)
+        recipes = await find_recipes(read_session, user.id, missing) if user else {}
+        missing = [name for name in missing if name not in recipes]
+    found = [item for item in items if item["product"] in products or item["product"] in recipes]
+
+    lines = []
+    if found:
+        user = user or await get_user(session, message.from_user.id)
+        today = date.today()
+        entries = []
+        for item in found:
+            recipe = recipes.get(item["product"])
+            product = recipe or products[item["product"]]
+            calories = product.kcal_per_100g * item["grams"] / 100
+            entries.append(MealEntry(
+                user_id=user.id,
+                product_id=None if recipe else product.id,
+                grams=item["grams"],
+                calories=calories,
+                date=today,
+                goal=user.daily_goal,
+                product_name=recipe.name if recipe else None
+            ))
+            lines.append(f"🍽️ {product.name.capitalize()} — {item['grams']} г, {int(calories)} ккал")
+
+        # Один продукт можно отдать групповой записи, несколько пишем одной транзакцией сразу
+        if len(entries) == 1:
+            today_calories = await save_meal(session, entries[0])
+        else:
+            today_calories = await insert_meals(session, entries)
+            await session.commit()
+
+        title = "✅ Продукт добавлен!" if len(entries) == 1 else f"✅ Добавлено продуктов: {len(entries)}"
+        lines = [title, ""] + lines
+        if len(entries) > 1:
+            lines.append(f"🔥 Всего: {int(sum(entry.calories for entry in entries))} ккал")
+        lines += ["", _day_status(today_calories, user.daily_goal)]
+
+    for name in missing:
+        similar = await find_similar_products(session, name, limit=3)
+        hint = f" Похожие: {', '.join(similar)}" if similar else ""
+        lines.append(f"❌ '{name}' не найден.{hint}")
+
+    return message.answer("\n".join(lines).strip(), reply_markup=get_main_keyboard())
+
+
+@router.message(Command("add"))
+async def cmd_add(message: Message, command: CommandObject, session: AsyncSession, read_session: AsyncSession):
+    """Добавление одной командой: /add рис 200, банан 120"""
+    items = parse_meal_items(command.args or "")
+    if not items:
+        return message.answer(
+            "📝 Формат: /add <продукт> <граммы>\n"
+            "Например: /add рис 200 или /add яблоко 150, банан 120г",
+            reply_markup=get_main_keyboard()
+        )
+    return await add_items(message, session, read_session, items)
+
+
+# Команды сюда не попадают: «/export csv 30» иначе разобрался бы как продукт «/export csv» 30 г
+@router.message(StateFilter(None), ~F.text.startswith("/"), F.text.func(parse_meal_items).as_("items"))
+async def add_from_text(message: Message, session: AsyncSession, read_session: AsyncSession, items: list):
+    """Добавление текстом без команды: «яблоко 150, банан 120г»"""
+    return await add_items(message, session, read_session, items)
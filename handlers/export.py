@@ -0,0 +1,50 @@
+from aiogram import Router
+from aiogram.filters import Command, CommandObject
+from aiogram.types import Message
+from sqlalchemy.ext.asyncio import AsyncSession
+from services.export import EXPORT_FORMATS, ExportBusy, SpooledInputFile, export_filename, export_limiter, write_export
+from services.meal_backfill import legacy_meals_pending
+from services.users import get_user
+from keyboards.main_kb import get_main_keyboard
+
+router = Router()
+
+
+@router.message(Command("export"))
+async def cmd_export(message: Message, command: CommandObject, read_session: AsyncSession):
+    """Выгрузка всей истории: /export (CSV) или /export jsonl"""
+    file_format = (command.args or "csv").strip().lower()
+    if file_format == "json":
+        file_format = "jsonl"
+    if file_format not in EXPORT_FORMATS:
+        return message.answer("❌ Формат выгрузки: /export csv или /export jsonl", reply_markup=get_main_keyboard())
+
+    user = await get_user(read_session, message.from_user.id, create=False)
+    if not user:
+        return message.answer("❌ Пользователь не найден. Нажмите /start", reply_markup=get_main_keyboard())
+
+    if await legacy_meals_pending(read_session):
+        return message.answer(
+            "⏳ История сейчас переносится в новый формат, выгрузка будет доступна чуть позже",
+            reply_markup=get_main_keyboard()
+        )
+
+    try:
+        async with export_limiter.slot(user.id):
+            spool, count = await write_export(read_session, user.id, file_format)
+            # Сессия больше не нужна: не держим соединение чтения, пока файл загружается
+            await read_session.close()
+            with spool:
+                if not count:
+                    return message.answer("📭 Записей для выгрузки пока нет", reply_markup=get_main_keyboard())
+                # Отправку ждём здесь: файл должен быть прочитан до закрытия
+                await message.answer_document(
+                    SpooledInputFile(spool, export_filename(file_format)),
+                    caption=f"📦 Ваша история: {count} записей",
+                    reply_markup=get_main_keyboard()
+                )
+    except ExportBusy:
+        return message.answer(
+            "⏳ Сейчас готовится много выгрузок, попробуйте через минуту",
+            reply_markup=get_main_keyboard()
+        )
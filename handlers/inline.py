@@ -0,0 +1,28 @@
+from aiogram import Router
+from aiogram.types import InlineQuery, InlineQueryResultArticle, InputTextMessageContent
+from config import INLINE_RESULTS, INLINE_CACHE_TIME
+from services.product_index import product_index
+
+router = Router()
+
+
+@router.inline_query()
+async def inline_search(inline_query: InlineQuery):
+    """Подсказки продуктов по началу названия: @бот ри..."""
+    # Индекс строится при запуске; пустой ответ Telegram не должен кэшировать
+    if not product_index.ready:
+        return inline_query.answer([], cache_time=1, is_personal=False)
+
+    results = [
+        InlineQueryResultArticle(
+            id=str(product.id),
+            title=product.name.capitalize(),
+            description=f"🔥 {product.kcal_per_100g} ккал на 100г",
+            input_message_content=InputTextMessageContent(
+                message_text=f"🍽️ {product.name.capitalize()} — {product.kcal_per_100g} ккал/100 г"
+            )
+        )
+        for product in product_index.complete(inline_query.query, INLINE_RESULTS)
+    ]
+    # Подсказки одинаковы для всех пользователей: Telegram может отдавать их из своего кэша
+    return inline_query.answer(results, cache_time=INLINE_CACHE_TIME, is_personal=False)
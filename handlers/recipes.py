@@ -0,0 +1,186 @@
+import re
+from aiogram import Router, F
+from aiogram.filters import Command, CommandObject
+from aiogram.types import Message, CallbackQuery
+from aiogram.fsm.context import FSMContext
+from sqlalchemy.ext.asyncio import AsyncSession
+from services.parser import parse_meal_items
+from services.product_search import find_product, find_products, find_similar_products, get_product_by_id
+from services.recipes import (
+    MAX_RECIPES, MAX_NAME_LENGTH, save_recipe, find_recipes, list_recipes, count_recipes, delete_recipe
+)
+from services.users import get_user
+from states.user_states import RecipeStates
+from keyboards.main_kb import get_main_keyboard, get_cancel_keyboard, get_recipes_keyboard
+from handlers.add_meal import MAX_GRAMS
+
+router = Router()
+
+_SPACES_RE = re.compile(r"\s+")
+
+
+def _recipes_text(recipes: list) -> str:
+    lines = [f"• {recipe.name.capitalize()} — {int(recipe.kcal_per_100g)} ккал на 100г" for recipe in recipes]
+    return "🍲 Ваши блюда:\n\n" + "\n".join(lines)
+
+
+@router.message(Command("recipe"))
+async def cmd_recipe(message: Message, command: CommandObject, state: FSMContext, session: AsyncSession):
+    """Создание блюда: /recipe борщ; без названия — список блюд"""
+    name = _SPACES_RE.sub(" ", command.args or "").strip().lower()
+    user = await get_user(session, message.from_user.id)
+
+    if not name:
+        recipes = await list_recipes(session, user.id)
+        if not recipes:
+            return message.answer(
+                "🍲 Блюда из нескольких продуктов можно сохранить и добавлять одной строкой.\n\n"
+                "Создать: /recipe <название>, например /recipe борщ",
+                reply_markup=get_main_keyboard()
+            )
+        return message.answer(
+            _recipes_text(recipes) + "\n\n"
+            "Добавляйте как обычный продукт: «название 300»\n"
+            "Создать или заменить: /recipe <название>",
+            reply_markup=get_recipes_keyboard(recipes)
+        )
+
+    if len(name) > MAX_NAME_LENGTH or parse_meal_items(name):
+        return message.answer(
+            f"❌ Название должно быть не длиннее {MAX_NAME_LENGTH} символов и не заканчиваться числом",
+            reply_markup=get_main_keyboard()
+        )
+
+    # Продукт каталога находится раньше блюда, такое блюдо нельзя было бы добавить
+    if await find_product(session, name):
+        return message.answer(
+            f"❌ '{name}' уже есть в каталоге продуктов, назовите блюдо иначе",
+            reply_markup=get_main_keyboard()
+        )
+
+    # Блюдо с тем же названием заменяется и места не занимает
+    if await count_recipes(session, user.id) >= MAX_RECIPES and not await find_recipes(session, user.id, [name]):
+        return message.answer(
+            f"❌ Можно сохранить не больше {MAX_RECIPES} блюд, удалите ненужные: /recipe",
+            reply_markup=get_main_keyboard()
+        )
+
+    await state.set_state(RecipeStates.waiting_for_ingredients)
+    await state.update_data(name=name)
+    return message.answer(
+        f"🍲 {name.capitalize()}\n\n"
+        "📝 Перечислите продукты с граммами через запятую или с новой строки:\n"
+        "Например: свекла 300, капуста 200, картофель 300",
+        reply_markup=get_cancel_keyboard()
+    )
+
+
+@router.message(RecipeStates.waiting_for_ingredients, F.text == "❌ Отмена")
+@router.message(RecipeStates.waiting_for_weight, F.text == "❌ Отмена")
+async def cancel_recipe(message: Message, state: FSMContext):
+    """Отмена создания блюда"""
+    await state.clear()
+    return message.answer("❌ Создание блюда отменено", reply_markup=get_main_keyboard())
+
+
+@router.message(RecipeStates.waiting_for_ingredients)
+async def process_ingredients(message: Message, state: FSMContext, session: AsyncSession):
+    """Обработка состава блюда"""
+    items = parse_meal_items(message.text or "")
+    if not items:
+        return message.answer(
+            "❌ Не получилось разобрать состав.\n"
+            "Формат: продукт граммы, например: рис 200, морковь 100",
+            reply_markup=get_cancel_keyboard()
+        )
+
+    wrong_grams = [item for item in items if item["grams"] <= 0 or item["grams"] > MAX_GRAMS]
+    if wrong_grams:
+        return message.answer(
+            f"❌ Количество грамм должно быть от 1 до {MAX_GRAMS}: "
+            + ", ".join(f"{item['product']} {item['grams']}" for item in wrong_grams),
+            reply_markup=get_cancel_keyboard()
+        )
+
+    products = await find_products(session, [item["product"] for item in items])
+    missing = [item["product"] for item in items if item["product"] not in products]
+    if missing:
+        lines = []
+        for name in missing:
+            similar = await find_similar_products(session, name, limit=3)
+            hint = f" Похожие: {', '.join(similar)}" if similar else ""
+            lines.append(f"❌ '{name}' не найден.{hint}")
+        lines.append("\nОтправьте состав ещё раз или нажмите Отмена")
+        return message.answer("\n".join(lines), reply_markup=get_cancel_keyboard())
+
+    # В состоянии храним только id продуктов и граммы
+    await state.update_data(ingredients=[[products[item["product"]].id, item["grams"]] for item in items])
+    await state.set_state(RecipeStates.waiting_for_weight)
+
+    total = sum(item["grams"] for item in items)
+    return message.answer(
+        "⚖️ Сколько весит готовое блюдо в граммах?\n\n"
+        f"Если вес не менялся при готовке, отправьте «-» — возьмём сумму ингредиентов ({total} г)",
+        reply_markup=get_cancel_keyboard()
+    )
+
+
+@router.message(RecipeStates.waiting_for_weight)
+async def process_weight(message: Message, state: FSMContext, session: AsyncSession):
+    """Обработка веса готового блюда и сохранение"""
+    text = (message.text or "").strip()
+    if text != "-" and not text.isdigit():
+        return message.answer(
+            "❌ Введите вес в граммах (только цифры) или «-»",
+            reply_markup=get_cancel_keyboard()
+        )
+
+    cooked_grams = int(text) if text != "-" else None
+    if cooked_grams is not None and (cooked_grams <= 0 or cooked_grams > MAX_GRAMS):
+        return message.answer(
+            f"❌ Вес должен быть от 1 до {MAX_GRAMS} г\n"
+            "Попробуйте ещё раз:",
+            reply_markup=get_cancel_keyboard()
+        )
+
+    data = await state.get_data()
+    ingredients = []
+    for product_id, grams in data.get("ingredients", []):
+        product = await get_product_by_id(session, product_id)
+        if not product:
+            # Продукт успели удалить из каталога, пока пользователь вводил вес
+            await state.clear()
+            return message.answer("❌ Один из продуктов больше не найден в базе", reply_markup=get_main_keyboard())
+        ingredients.append((product, grams))
+
+    user = await get_user(session, message.from_user.id)
+    recipe = await save_recipe(session, user.id, data["name"], ingredients, cooked_grams)
+    await session.commit()
+    await state.clear()
+
+    return message.answer(
+        f"✅ Блюдо сохранено!\n\n"
+        f"🍲 {recipe.name.capitalize()}\n"
+        f"🔥 {int(recipe.kcal_per_100g)} ккал на 100г\n\n"
+        f"Добавляйте как обычный продукт: «{recipe.name} 300»",
+        reply_markup=get_main_keyboard()
+    )
+
+
+@router.callback_query(F.data.startswith("recipe_delete_"))
+async def remove_recipe(callback: CallbackQuery, session: AsyncSession):
+    """Удаление блюда"""
+    recipe_id = int(callback.data.rsplit("_", 1)[1])
+    user = await get_user(session, callback.from_user.id)
+    name = await delete_recipe(session, user.id, recipe_id)
+    await session.commit()
+
+    if name is None:
+        return callback.answer("❌ Блюдо уже удалено")
+
+    await callback.answer("✅ Блюдо удалено")
+    recipes = await list_recipes(session, user.id)
+    text = f"✅ Блюдо «{name.capitalize()}» удалено"
+    if recipes:
+        text += "\n\n" + _recipes_text(recipes)
+    return callback.message.edit_text(text, reply_markup=get_recipes_keyboard(recipes) if recipes else None)
@@ -2,28 +2,16 @@ from aiogram import Router, F
 from aiogram.filters import Command
 from aiogram.types import Message
 from aiogram.fsm.context import FSMContext
-from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
-from database.models import User
+from services.users import get_user, CachedUser
 from keyboards.main_kb import get_main_keyboard
 
 router = Router()
 
 
-async def get_or_create_user(session: AsyncSession, telegram_id: int) -> User:
+async def get_or_create_user(session: AsyncSession, telegram_id: int) -> CachedUser:
     """Получить или создать пользователя"""
-    result = await session.execute(
-        select(User).where(User.telegram_id == telegram_id)
-    )
-    user = result.scalar_one_or_none()
-
-    if not user:
-        user = User(telegram_id=telegram_id, daily_goal=2000)
-        session.add(user)
-        await session.commit()
-        await session.refresh(user)
-
-    return user
+    return await get_user(session, telegram_id)
 
 
 @router.message(Command("start"))
@@ -41,7 +29,7 @@ async def cmd_start(message: Message, session: AsyncSession, state: FSMContext):
         "💡 Используй кнопки ниже для управления"
     )
 
-    await message.answer(welcome_text, reply_markup=get_main_keyboard())
+    return message.answer(welcome_text, reply_markup=get_main_keyboard())
 
 
 @router.message(Command("help"))
@@ -53,9 +41,15 @@ async def cmd_help(message: Message):
         "📊 Статистика дня - все продукты за сегодня\n"
         "🎯 Моя норма - установить дневную норму калорий\n"
         "📈 Общая статистика - статистика за всё время\n"
+        "📉 График - калории по дням за неделю, месяц или 3 месяца\n"
+        "⭐ Избранное - частые продукты: добавить обычную порцию одним нажатием\n"
         "🗑️ Удалить продукт - удалить последний продукт\n"
         "❌ Очистить день - удалить все продукты за сегодня\n\n"
+        "📦 /export - выгрузить всю историю в CSV (/export jsonl - в JSONL)\n"
+        "🍲 /recipe борщ - сохранить блюдо из нескольких продуктов, /recipe - ваши блюда\n\n"
+        "⚡ Можно добавлять сразу текстом: «яблоко 150» или\n"
+        "несколько продуктов через запятую: «рис 200, банан 120г»\n\n"
         "💡 Используйте кнопки для удобной работы!"
     )
 
-    await message.answer(help_text, reply_markup=get_main_keyboard())
\ No newline at end of file
+    return message.answer(help_text, reply_markup=get_main_keyboard())
\ No newline at end of file
@@ -1,59 +1,61 @@
 from datetime import date
 from aiogram import Router, F
 from aiogram.filters import Command
-from aiogram.types import Message
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import Message, CallbackQuery, BufferedInputFile, InputMediaPhoto
 from aiogram.fsm.context import FSMContext
 from sqlalchemy import select, func
 from sqlalchemy.ext.asyncio import AsyncSession
-from database.models import User, Meal
+from database.models import CALORIES_SCALE, Meal, DailySummary
+from services.charts import CHART_RANGES, ChartData, get_chart_data, get_chart, render_chart_async, remember_file_id
+from services.daily_summary import get_day_summary
+from services.users import get_user, set_daily_goal
 from states.user_states import SetGoalStates
-from keyboards.main_kb import get_main_keyboard, get_cancel_keyboard
+from keyboards.main_kb import get_main_keyboard, get_cancel_keyboard, get_chart_keyboard
 
 router = Router()
 
 
 @router.message(F.text == "📊 Статистика дня")
-async def show_day_stats(message: Message, session: AsyncSession):
+async def show_day_stats(message: Message, read_session: AsyncSession):
     """Показать подробную статистику за сегодня"""
-    result = await session.execute(
-        select(User).where(User.telegram_id == message.from_user.id)
-    )
-    user = result.scalar_one_or_none()
+    user = await get_user(read_session, message.from_user.id, create=False)
 
     if not user:
-        await message.answer("❌ Пользователь не найден. Нажмите /start", reply_markup=get_main_keyboard())
-        return
+        return message.answer("❌ Пользователь не найден. Нажмите /start", reply_markup=get_main_keyboard())
 
-    # Получаем все продукты за сегодня
-    meals_result = await session.execute(
-        select(Meal).where(
-            Meal.user_id == user.id,
-            Meal.date == date.today()
-        ).order_by(Meal.id)
-    )
-    meals = meals_result.scalars().all()
+    # Итоги дня — одно чтение по первичному ключу
+    today = date.today()
+    summary = await get_day_summary(read_session, user.id, today)
 
-    if not meals:
-        await message.answer(
+    if not summary:
+        return message.answer(
             "📭 Сегодня ещё не добавлено ни одного продукта\n\n"
             "Нажмите '➕ Добавить продукт' чтобы начать",
             reply_markup=get_main_keyboard()
         )
-        return
+
+    # Список продуктов за сегодня
+    meals_result = await read_session.execute(
+        select(Meal.name, Meal.grams, Meal.calories).where(
+            Meal.user_id == user.id,
+            Meal.date == today
+        ).order_by(Meal.id)
+    )
+    meals = meals_result.all()
 
     # Формируем подробный список
     lines = ["📅 Статистика за сегодня:\n"]
-    total_calories = 0
+    total_calories = summary.calories
 
     for i, meal in enumerate(meals, 1):
         lines.append(
-            f"{i}. {meal.product_name.capitalize()}\n"
+            f"{i}. {meal.name.capitalize()}\n"
             f"   ⚖️ {meal.grams}г  |  🔥 {int(meal.calories)} ккал"
         )
-        total_calories += meal.calories
 
     lines.append(f"\n{'─' * 30}")
-    lines.append(f"📊 Всего продуктов: {len(meals)}")
+    lines.append(f"📊 Всего продуктов: {summary.items}")
     lines.append(f"🔥 Всего калорий: {int(total_calories)} / {user.daily_goal} ккал")
 
     if total_calories > user.daily_goal:
@@ -63,14 +65,14 @@ async def show_day_stats(message: Message, session: AsyncSession):
         percentage = (total_calories / user.daily_goal) * 100
         lines.append(f"✅ Осталось: {int(remaining)} ккал ({int(percentage)}%)")
 
-    await message.answer("\n".join(lines), reply_markup=get_main_keyboard())
+    return message.answer("\n".join(lines), reply_markup=get_main_keyboard())
 
 
 @router.message(F.text == "🎯 Моя норма")
 async def start_set_goal(message: Message, state: FSMContext):
     """Начало установки нормы калорий"""
     await state.set_state(SetGoalStates.waiting_for_goal)
-    await message.answer(
+    return message.answer(
         "🎯 Введите вашу дневную норму калорий:\n\n"
         "Например: 2000\n\n"
         "💡 Рекомендуемые нормы:\n"
@@ -84,46 +86,33 @@ async def start_set_goal(message: Message, state: FSMContext):
 async def cancel_set_goal(message: Message, state: FSMContext):
     """Отмена установки нормы"""
     await state.clear()
-    await message.answer("❌ Установка нормы отменена", reply_markup=get_main_keyboard())
+    return message.answer("❌ Установка нормы отменена", reply_markup=get_main_keyboard())
 
 
 @router.message(SetGoalStates.waiting_for_goal)
 async def process_goal(message: Message, state: FSMContext, session: AsyncSession):
     """Обработка ввода нормы калорий"""
     if not message.text.isdigit():
-        await message.answer(
+        return message.answer(
             "❌ Пожалуйста, введите число (только цифры)\n"
             "Например: 2000",
             reply_markup=get_cancel_keyboard()
         )
-        return
 
     new_goal = int(message.text)
 
     if new_goal < 500 or new_goal > 10000:
-        await message.answer(
+        return message.answer(
             "❌ Норма должна быть от 500 до 10000 ккал\n"
             "Попробуйте ещё раз:",
             reply_markup=get_cancel_keyboard()
         )
-        return
 
     # Обновляем пользователя
-    result = await session.execute(
-        select(User).where(User.telegram_id == message.from_user.id)
-    )
-    user = result.scalar_one_or_none()
-
-    if not user:
-        user = User(telegram_id=message.from_user.id, daily_goal=new_goal)
-        session.add(user)
-    else:
-        user.daily_goal = new_goal
-
-    await session.commit()
+    await set_daily_goal(session, message.from_user.id, new_goal)
     await state.clear()
 
-    await message.answer(
+    return message.answer(
         f"✅ Дневная норма установлена: {new_goal} ккал\n\n"
         f"Теперь вы можете добавлять продукты!",
         reply_markup=get_main_keyboard()
@@ -131,57 +120,33 @@ async def process_goal(message: Message, state: FSMContext, session: AsyncSessio
 
 
 @router.message(F.text == "📈 Общая статистика")
-async def show_general_stats(message: Message, session: AsyncSession):
+async def show_general_stats(message: Message, read_session: AsyncSession):
     """Показать общую статистику"""
-    result = await session.execute(
-        select(User).where(User.telegram_id == message.from_user.id)
-    )
-    user = result.scalar_one_or_none()
+    user = await get_user(read_session, message.from_user.id, create=False)
 
     if not user:
-        await message.answer("❌ Пользователь не найден. Нажмите /start", reply_markup=get_main_keyboard())
-        return
-
-    # Общее количество дней с записями
-    days_result = await session.execute(
-        select(func.count(func.distinct(Meal.date))).where(
-            Meal.user_id == user.id
-        )
-    )
-    total_days = days_result.scalar() or 0
-
-    # Общее количество записей
-    meals_result = await session.execute(
-        select(func.count(Meal.id)).where(
-            Meal.user_id == user.id
-        )
+        return message.answer("❌ Пользователь не найден. Нажмите /start", reply_markup=get_main_keyboard())
+
+    # Итоги по всем дням одним запросом к daily_summaries
+    totals_result = await read_session.execute(
+        select(
+            func.count(),
+            func.sum(DailySummary.items),
+            func.sum(DailySummary.calories_x100)
+        ).where(DailySummary.user_id == user.id)
     )
-    total_meals = meals_result.scalar() or 0
+    total_days, total_meals, total_calories_x100 = totals_result.one()
+    total_meals = total_meals or 0
+    # Сумма целых сотых точна; в ккал переводим только для показа
+    total_calories_x100 = total_calories_x100 or 0
+    total_calories = total_calories_x100 / CALORIES_SCALE
 
     # Средние калории на приём пищи
-    avg_meal_result = await session.execute(
-        select(func.avg(Meal.calories)).where(
-            Meal.user_id == user.id
-        )
-    )
-    avg_meal_calories = avg_meal_result.scalar() or 0
+    avg_meal_calories = total_calories / total_meals if total_meals > 0 else 0
 
     # Калории за сегодня
-    today_result = await session.execute(
-        select(func.sum(Meal.calories)).where(
-            Meal.user_id == user.id,
-            Meal.date == date.today()
-        )
-    )
-    today_calories = today_result.scalar() or 0
-
-    # Общая сумма калорий за всё время
-    total_calories_result = await session.execute(
-        select(func.sum(Meal.calories)).where(
-            Meal.user_id == user.id
-        )
-    )
-    total_calories = total_calories_result.scalar() or 0
+    today_summary = await get_day_summary(read_session, user.id, date.today())
+    today_calories = today_summary.calories if today_summary else 0
 
     # Средние калории в день
     avg_day_calories = total_calories / total_days if total_days > 0 else 0
@@ -194,8 +159,83 @@ async def show_general_stats(message: Message, session: AsyncSession):
         f"📊 Средние показатели:\n"
         f"• На приём пищи: {int(avg_meal_calories)} ккал\n"
         f"• В день: {int(avg_day_calories)} ккал\n\n"
-        f"🔥 Всего калорий за всё время: {int(total_calories)} ккал\n\n"
+        f"🔥 Всего калорий за всё время: {total_calories_x100 // CALORIES_SCALE} ккал\n\n"
         f"📆 Сегодня: {int(today_calories)} / {user.daily_goal} ккал"
     )
 
-    await message.answer(stats_text, reply_markup=get_main_keyboard())
\ No newline at end of file
+    return message.answer(stats_text, reply_markup=get_main_keyboard())
+
+
+def _chart_caption(data: ChartData) -> str:
+    logged = data.logged
+    if not logged:
+        return f"📉 За последние {data.days} дней записей нет\n🎯 Норма: {data.goal} ккал"
+
+    within_goal = sum(1 for calories in logged if calories <= data.goal)
+    return (
+        f"📉 Калории за последние {data.days} дней\n"
+        f"🎯 Норма: {data.goal} ккал\n"
+        f"📊 В среднем: {int(sum(logged) / len(logged))} ккал в день (дней с записями: {len(logged)})\n"
+        f"✅ В пределах нормы: {within_goal} из {len(logged)}"
+    )
+
+
+async def send_chart(message: Message, telegram_id: int, read_session: AsyncSession, days: int, edit: bool = False):
+    """
+    Отправить график калорий за период
+
+    Отправка ожидается здесь же, а не возвращается из обработчика:
+    нужен file_id загруженной картинки, чтобы не загружать её повторно.
+
+    Args:
+        edit: заменить график в message (переключение периода), а не отправлять новый
+    """
+    user = await get_user(read_session, telegram_id, create=False)
+    data = await get_chart_data(read_session, user.id, user.daily_goal, days) if user else None
+    # Сессия больше не нужна: не держим соединение чтения, пока картинка загружается
+    await read_session.close()
+
+    if not user:
+        return await message.answer("❌ Пользователь не найден. Нажмите /start", reply_markup=get_main_keyboard())
+
+    chart = await get_chart(user.id, days, data)
+    caption = _chart_caption(data)
+    keyboard = get_chart_keyboard(days, CHART_RANGES)
+
+    async def deliver(photo):
+        if edit:
+            return await message.edit_media(InputMediaPhoto(media=photo, caption=caption), reply_markup=keyboard)
+        return await message.answer_photo(photo, caption=caption, reply_markup=keyboard)
+
+    if chart.file_id is not None:
+        try:
+            return await deliver(chart.file_id)
+        except TelegramBadRequest as e:
+            # Нажали период, который уже показан
+            if "message is not modified" in e.message:
+                return None
+            # file_id больше не принимается (например, сменился токен бота) — загрузим заново
+            chart = chart._replace(png=await render_chart_async(data), file_id=None)
+
+    photo = BufferedInputFile(chart.png, filename=f"calories_{days}d.png")
+    sent = await deliver(photo)
+    remember_file_id(user.id, days, chart.version, sent.photo[-1].file_id)
+    return sent
+
+
+@router.message(F.text == "📉 График")
+async def show_chart(message: Message, read_session: AsyncSession):
+    """График калорий за неделю с выбором периода"""
+    await send_chart(message, message.from_user.id, read_session, CHART_RANGES[0])
+
+
+@router.callback_query(F.data.startswith("chart_"))
+async def switch_chart_range(callback: CallbackQuery, read_session: AsyncSession):
+    """Переключение периода графика"""
+    value = callback.data.partition("_")[2]
+    days = int(value) if value.isdigit() else 0
+    if days not in CHART_RANGES:
+        return callback.answer("❌ Неизвестный период")
+
+    await callback.answer()
+    await send_chart(callback.message, callback.from_user.id, read_session, days, edit=True)
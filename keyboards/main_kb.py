@@ -16,6 +16,10 @@ def get_main_keyboard() -> ReplyKeyboardMarkup:
             [
                 KeyboardButton(text="🗑️ Удалить продукт"),
                 KeyboardButton(text="❌ Очистить день")
+            ],
+            [
+                KeyboardButton(text="⭐ Избранное"),
+                KeyboardButton(text="📉 График")
             ]
         ],
         resize_keyboard=True,
@@ -41,7 +45,7 @@ def get_delete_keyboard(meals: list) -> InlineKeyboardMarkup:
 
     for meal in meals:
         button = InlineKeyboardButton(
-            text=f"🗑️ {meal.product_name.capitalize()} ({meal.grams}г)",
+            text=f"🗑️ {meal.name.capitalize()} ({meal.grams}г)",
             callback_data=f"delete_{meal.id}"
         )
         buttons.append([button])
@@ -49,4 +53,34 @@ def get_delete_keyboard(meals: list) -> InlineKeyboardMarkup:
     buttons.append([InlineKeyboardButton(text="❌ Отмена", callback_data="cancel_delete")])
 
     keyboard = InlineKeyboardMarkup(inline_keyboard=buttons)
-    return keyboard
\ No newline at end of file
+    return keyboard
+
+
+def get_quick_add_keyboard(portions: list) -> InlineKeyboardMarkup:
+    """Быстрое добавление: (id продукта, название, граммы) — одно нажатие добавляет порцию"""
+    buttons = [
+        InlineKeyboardButton(text=f"{name.capitalize()} {grams}г", callback_data=f"quick_{product_id}_{grams}")
+        for product_id, name, grams in portions
+    ]
+    return InlineKeyboardMarkup(inline_keyboard=[buttons[i:i + 2] for i in range(0, len(buttons), 2)])
+
+
+def get_recipes_keyboard(recipes: list) -> InlineKeyboardMarkup:
+    """Удаление блюд пользователя"""
+    buttons = [
+        [InlineKeyboardButton(text=f"🗑️ {recipe.name.capitalize()}", callback_data=f"recipe_delete_{recipe.id}")]
+        for recipe in recipes
+    ]
+    return InlineKeyboardMarkup(inline_keyboard=buttons)
+
+
+def get_chart_keyboard(days: int, ranges: tuple) -> InlineKeyboardMarkup:
+    """Переключение периода графика; текущий период отмечен"""
+    buttons = [
+        InlineKeyboardButton(
+            text=f"{'• ' if value == days else ''}{value} дней",
+            callback_data=f"chart_{value}"
+        )
+        for value in ranges
+    ]
+    return InlineKeyboardMarkup(inline_keyboard=[buttons])
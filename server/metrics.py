@@ -0,0 +1,28 @@
+import logging
+from aiohttp import web
+from config import METRICS_HOST, METRICS_PORT
+from services.metrics import Registry, registry as default_registry
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def add_metrics_route(app: web.Application, registry: Registry = default_registry, path: str = "/metrics"):
+    """Добавить в приложение страницу с метриками"""
+
+    async def handle(request: web.Request) -> web.Response:
+        return web.Response(body=registry.render().encode(), headers={"Content-Type": CONTENT_TYPE})
+
+    app.router.add_get(path, handle)
+
+
+async def start_metrics_server(host: str = METRICS_HOST, port: int = METRICS_PORT) -> web.AppRunner:
+    """Запустить HTTP-сервер с /metrics; остановить через runner.cleanup()"""
+    app = web.Application()
+    add_metrics_route(app)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logger.info("📈 Метрики: http://%s:%d/metrics", host, port)
+    return runner
@@ -0,0 +1,329 @@
+import asyncio
+import logging
+import multiprocessing
+import signal
+import time
+import weakref
+from typing import Any, Dict, List, Optional
+import aiohttp
+from aiohttp import web
+from aiogram import Bot
+from aiogram.methods import TelegramMethod
+from config import (
+    WEBHOOK_URL, WEBHOOK_PATH, WEBHOOK_SECRET, WEBHOOK_MAX_BODY_SIZE,
+    SHARD_BASE_PORT, SHARD_HEALTH_INTERVAL, SHARD_MAX_IN_FLIGHT, METRICS_PORT
+)
+from server.metrics import add_metrics_route
+from server.webhook import serve_webhook
+
+logger = logging.getLogger(__name__)
+
+WORKER_HOST = "127.0.0.1"
+
+
+def shard_key(update: Dict[str, Any]) -> int:
+    """
+    Ключ шардирования апдейта: id пользователя, иначе id чата
+
+    Args:
+        update: апдейт в виде словаря Bot API
+
+    Returns:
+        ключ; 0, если в апдейте нет ни пользователя, ни чата
+    """
+    for value in update.values():
+        if not isinstance(value, dict):
+            continue
+        user = value.get("from") or value.get("user")
+        if user:
+            return user["id"]
+        chat = value.get("chat")
+        if chat:
+            return chat["id"]
+    return 0
+
+
+# ---------- Воркер ----------
+
+def _worker_main(index: int, port: int):
+    """Точка входа процесса-воркера"""
+    # Ctrl+C получает вся группа процессов, а останавливать воркеры должен фронт
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    asyncio.run(_serve_worker(index, port))
+
+
+async def _serve_worker(index: int, port: int):
+    # Импорт здесь, а не наверху: bot сам импортирует этот модуль
+    import bot as app
+    from database.lazy_session import session_stats
+
+    await app.on_startup(sync_catalog=False)
+    bot = app.create_bot()
+    storage = await app.create_storage()
+    dp = app.create_dispatcher(storage)
+
+    async def handle_update(request: web.Request) -> web.Response:
+        update = await request.json()
+        try:
+            result = await dp.feed_raw_update(bot, update)
+            if isinstance(result, TelegramMethod):
+                await dp.silent_call_request(bot, result)
+        except Exception:
+            # Апдейт считаем обработанным: повтор от фронта выполнил бы его дважды
+            logger.exception("Ошибка обработки апдейта id=%s в воркере %d", update.get("update_id"), index)
+        return web.Response()
+
+    async def handle_health(request: web.Request) -> web.Response:
+        return web.json_response({"worker": index, "updates": session_stats.updates})
+
+    web_app = web.Application(client_max_size=WEBHOOK_MAX_BODY_SIZE)
+    web_app.router.add_post("/update", handle_update)
+    web_app.router.add_get("/health", handle_health)
+    if METRICS_PORT:
+        # У каждого воркера свои метрики, их отдаёт его же сервер
+        add_metrics_route(web_app)
+    runner = web.AppRunner(web_app)
+    await runner.setup()
+    await web.TCPSite(runner, WORKER_HOST, port).start()
+    logger.info("🧩 Воркер %d слушает %s:%d", index, WORKER_HOST, port)
+
+    stop = asyncio.Event()
+    asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, stop.set)
+    try:
+        await stop.wait()
+    finally:
+        await runner.cleanup()
+        await app.on_shutdown()
+        await storage.close()
+        await bot.session.close()
+
+
+# ---------- Фронт ----------
+
+class _Worker:
+    """Процесс-воркер с точки зрения фронта"""
+
+    def __init__(self, index: int, port: int):
+        self.index = index
+        self.port = port
+        self.url = f"http://{WORKER_HOST}:{port}"
+        self.process: Optional[multiprocessing.Process] = None
+        # Сброшено, пока воркер запускается или перезапускается
+        self.ready = asyncio.Event()
+        self.restart_lock = asyncio.Lock()
+        self.failures = 0
+        self.restarts = 0
+
+    @property
+    def alive(self) -> bool:
+        return self.process is not None and self.process.is_alive()
+
+
+class WorkerPool:
+    """
+    Пул процессов-воркеров с маршрутизацией апдейтов по id пользователя
+
+    Все апдейты одного пользователя попадают в один воркер и передаются
+    ему строго по очереди, поэтому порядок сообщений, состояние FSM и кэш
+    пользователей остаются локальными для процесса. Каждые health_interval
+    секунд фронт проверяет воркеры; упавший или зависший воркер
+    перезапускается, апдейты его пользователей ждут окончания перезапуска.
+    """
+
+    def __init__(
+        self,
+        workers: int,
+        base_port: int = SHARD_BASE_PORT,
+        health_interval: float = SHARD_HEALTH_INTERVAL,
+        max_failures: int = 3,
+        startup_timeout: float = 120
+    ):
+        self.workers = [_Worker(index, base_port + index) for index in range(workers)]
+        self.health_interval = health_interval
+        self.max_failures = max_failures
+        self.startup_timeout = startup_timeout
+        self._context = multiprocessing.get_context("spawn")
+        self._http: Optional[aiohttp.ClientSession] = None
+        self._monitor_task: Optional[asyncio.Task] = None
+        # Блокировки по пользователю живут, пока у пользователя есть апдейты в обработке
+        self._locks: "weakref.WeakValueDictionary[int, asyncio.Lock]" = weakref.WeakValueDictionary()
+
+    async def start(self):
+        """Запустить воркеры и дождаться их готовности"""
+        self._http = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=0))
+        for worker in self.workers:
+            self._spawn(worker)
+        try:
+            await asyncio.gather(*(self._wait_ready(worker) for worker in self.workers))
+        except Exception:
+            await self.stop()
+            raise
+        self._monitor_task = asyncio.create_task(self._monitor())
+        logger.info("🧩 Запущено воркеров: %d", len(self.workers))
+
+    async def dispatch(self, update: Dict[str, Any]):
+        """Передать апдейт воркеру его пользователя и дождаться обработки"""
+        key = shard_key(update)
+        worker = self.workers[key % len(self.workers)]
+        lock = self._locks.get(key)
+        if lock is None:
+            lock = self._locks[key] = asyncio.Lock()
+
+        async with lock:
+            for attempt in range(2):
+                try:
+                    await asyncio.wait_for(worker.ready.wait(), self.startup_timeout)
+                    async with self._http.post(f"{worker.url}/update", json=update) as response:
+                        await response.read()
+                    return
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    logger.warning("Воркер %d не принял апдейт: %s", worker.index, e)
+                    await self._ensure_alive(worker)
+
+        logger.error("Апдейт id=%s потерян: воркер %d недоступен", update.get("update_id"), worker.index)
+
+    async def stop(self):
+        """Остановить воркеры, дав им дописать данные"""
+        if self._monitor_task is not None:
+            self._monitor_task.cancel()
+            self._monitor_task = None
+        await asyncio.gather(*(self._terminate(worker) for worker in self.workers))
+        if self._http is not None:
+            await self._http.close()
+            self._http = None
+
+    def _spawn(self, worker: _Worker):
+        worker.ready.clear()
+        worker.failures = 0
+        worker.process = self._context.Process(
+            target=_worker_main,
+            args=(worker.index, worker.port),
+            name=f"shard-{worker.index}",
+            daemon=True
+        )
+        worker.process.start()
+
+    async def _healthy(self, worker: _Worker) -> bool:
+        try:
+            async with self._http.get(f"{worker.url}/health", timeout=aiohttp.ClientTimeout(total=2)) as response:
+                return response.status == 200
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            return False
+
+    async def _wait_ready(self, worker: _Worker):
+        deadline = time.monotonic() + self.startup_timeout
+        while time.monotonic() < deadline:
+            if not worker.alive:
+                raise RuntimeError(f"Воркер {worker.index} завершился при запуске, код {worker.process.exitcode}")
+            if await self._healthy(worker):
+                worker.ready.set()
+                return
+            await asyncio.sleep(0.1)
+        raise RuntimeError(f"Воркер {worker.index} не запустился за {self.startup_timeout:.0f} с")
+
+    async def _terminate(self, worker: _Worker, timeout: float = 10):
+        if worker.process is None:
+            return
+        loop = asyncio.get_running_loop()
+        if worker.alive:
+            worker.process.terminate()
+            await loop.run_in_executor(None, worker.process.join, timeout)
+        if worker.alive:
+            logger.warning("Воркер %d не остановился за %.0f с, завершаем принудительно", worker.index, timeout)
+            worker.process.kill()
+            await loop.run_in_executor(None, worker.process.join)
+
+    async def _ensure_alive(self, worker: _Worker):
+        """Проверить воркер и перезапустить его, если он упал или не отвечает"""
+        async with worker.restart_lock:
+            if not worker.ready.is_set():
+                return
+            if worker.alive and await self._healthy(worker):
+                worker.failures = 0
+                return
+
+            worker.failures += 1
+            if worker.alive and worker.failures < self.max_failures:
+                return
+
+            worker.restarts += 1
+            logger.warning(
+                "🔁 Перезапуск воркера %d (код выхода %s, перезапусков: %d)",
+                worker.index, worker.process.exitcode, worker.restarts
+            )
+            await self._terminate(worker, timeout=2)
+            while True:
+                self._spawn(worker)
+                try:
+                    await self._wait_ready(worker)
+                    return
+                except RuntimeError as e:
+                    logger.error("%s, повтор через секунду", e)
+                    await self._terminate(worker, timeout=2)
+                    await asyncio.sleep(1)
+
+    async def _monitor(self):
+        while True:
+            await asyncio.sleep(self.health_interval)
+            await asyncio.gather(*(self._ensure_alive(worker) for worker in self.workers))
+
+
+def create_front_app(
+    pool: WorkerPool,
+    path: str = WEBHOOK_PATH,
+    secret_token: Optional[str] = WEBHOOK_SECRET,
+    max_body_size: int = WEBHOOK_MAX_BODY_SIZE
+) -> web.Application:
+    """Приложение вебхука, которое передаёт апдейты воркерам"""
+
+    async def handle(request: web.Request) -> web.Response:
+        if secret_token and request.headers.get("X-Telegram-Bot-Api-Secret-Token") != secret_token:
+            return web.Response(status=401)
+        await pool.dispatch(await request.json())
+        return web.Response()
+
+    app = web.Application(client_max_size=max_body_size)
+    app.router.add_post(path, handle)
+    return app
+
+
+async def poll(pool: WorkerPool, bot: Bot, allowed_updates: List[str], max_in_flight: int = SHARD_MAX_IN_FLIGHT):
+    """Получать апдейты через getUpdates и раздавать их воркерам"""
+    in_flight = asyncio.Semaphore(max_in_flight)
+    tasks = set()
+    offset = None
+
+    def done(task: asyncio.Task):
+        tasks.discard(task)
+        in_flight.release()
+
+    while True:
+        try:
+            updates = await bot.get_updates(offset=offset, timeout=30, allowed_updates=allowed_updates)
+        except Exception as e:
+            logger.error("Ошибка getUpdates: %s", e)
+            await asyncio.sleep(1)
+            continue
+
+        for update in updates:
+            offset = update.update_id + 1
+            await in_flight.acquire()
+            task = asyncio.create_task(
+                pool.dispatch(update.model_dump(mode="json", by_alias=True, exclude_unset=True))
+            )
+            tasks.add(task)
+            task.add_done_callback(done)
+
+
+async def run_sharded(workers: int, bot: Bot, allowed_updates: List[str]):
+    """Запустить фронт и воркеры; база и каталог уже должны быть подготовлены"""
+    pool = WorkerPool(workers)
+    await pool.start()
+    try:
+        if WEBHOOK_URL:
+            await serve_webhook(create_front_app(pool), bot, allowed_updates)
+        else:
+            await bot.delete_webhook()
+            await poll(pool, bot, allowed_updates)
+    finally:
+        await pool.stop()
@@ -0,0 +1,79 @@
+import asyncio
+import logging
+from typing import List, Optional
+from aiohttp import web
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler
+from config import (
+    WEBHOOK_URL, WEBHOOK_PATH, WEBHOOK_SECRET, WEBHOOK_HOST, WEBHOOK_PORT,
+    WEBHOOK_MAX_CONNECTIONS, WEBHOOK_MAX_BODY_SIZE
+)
+
+logger = logging.getLogger(__name__)
+
+
+class LimitedRequestHandler(SimpleRequestHandler):
+    """
+    Обработчик вебхука с ограничением числа одновременно обрабатываемых апдейтов
+
+    Апдейт обрабатывается прямо в запросе, а последний вызов Bot API,
+    который вернул хендлер, уходит в теле ответа Telegram — без отдельного
+    HTTP-запроса от бота.
+    """
+
+    def __init__(self, dispatcher: Dispatcher, bot: Bot, max_concurrency: int, **kwargs):
+        super().__init__(dispatcher=dispatcher, bot=bot, handle_in_background=False, **kwargs)
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def handle(self, request: web.Request) -> web.Response:
+        async with self._semaphore:
+            return await super().handle(request)
+
+    __call__ = handle
+
+
+def create_webhook_app(
+    dp: Dispatcher,
+    bot: Bot,
+    path: str = WEBHOOK_PATH,
+    secret_token: Optional[str] = WEBHOOK_SECRET,
+    max_concurrency: int = WEBHOOK_MAX_CONNECTIONS,
+    max_body_size: int = WEBHOOK_MAX_BODY_SIZE
+) -> web.Application:
+    """Создать aiohttp-приложение, которое передаёт апдейты в диспетчер"""
+    # Тело больше max_body_size отклоняется с 413 ещё до разбора JSON
+    app = web.Application(client_max_size=max_body_size)
+    handler = LimitedRequestHandler(
+        dispatcher=dp,
+        bot=bot,
+        max_concurrency=max_concurrency,
+        secret_token=secret_token
+    )
+    handler.register(app, path=path)
+    return app
+
+
+async def serve_webhook(app: web.Application, bot: Bot, allowed_updates: List[str]):
+    """Поднять HTTP-сервер с приложением app и зарегистрировать вебхук в Telegram"""
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, WEBHOOK_HOST, WEBHOOK_PORT)
+    await site.start()
+
+    await bot.set_webhook(
+        url=WEBHOOK_URL.rstrip("/") + WEBHOOK_PATH,
+        secret_token=WEBHOOK_SECRET,
+        allowed_updates=allowed_updates,
+        max_connections=WEBHOOK_MAX_CONNECTIONS
+    )
+    logger.info("🌐 Вебхук слушает %s:%d%s", WEBHOOK_HOST, WEBHOOK_PORT, WEBHOOK_PATH)
+
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+
+
+async def run_webhook(dp: Dispatcher, bot: Bot):
+    """Запустить HTTP-сервер вебхука и зарегистрировать его в Telegram"""
+    await serve_webhook(create_webhook_app(dp, bot), bot, dp.resolve_used_update_types())
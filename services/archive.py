@@ -0,0 +1,343 @@
+"""
+Архивация старых записей о приёмах пищи
+
+Статистика и графики читают итоги дней из daily_summaries, поэтому
+старые строки meals нужны только как история. Раз в ARCHIVE_INTERVAL_HOURS
+целые месяцы старше ARCHIVE_AFTER_DAYS дней выгружаются в сжатые файлы
+ARCHIVE_DIR/meals-ГГГГ-ММ.jsonl.gz и удаляются из meals.
+
+Строки в файле идут по user_id и сжаты блоками по ARCHIVE_BLOCK_SIZE байт
+(каждый блок — отдельный член gzip, весь файл читается как обычный gzip).
+Оглавление meals-ГГГГ-ММ.index.json хранит для каждого блока диапазон
+user_id и смещение, поэтому выгрузка истории одного пользователя
+(services.export) распаковывает только его блоки, а не весь месяц.
+
+Порядок шагов делает процесс безопасным при обрыве на любом шаге:
+1. месяц и оглавление выгружаются во временные файлы, которые после fsync
+   переименовываются в итоговые (повторная выгрузка их перезаписывает);
+2. одной транзакцией итоги дней месяца пересчитываются из строк meals,
+   а отметка «архивировано по» (meta) сдвигается на конец месяца;
+3. строки не позже отметки удаляются небольшими пачками.
+Проверка итогов (services.daily_summary) дни до отметки не сверяет.
+
+Запуск вручную (например, из cron в режиме шардирования):
+    python -m services.archive --after-days 180
+"""
+import argparse
+import asyncio
+import gzip
+import json
+import logging
+import os
+from datetime import date, timedelta
+from bisect import bisect_left, bisect_right
+from typing import BinaryIO, List, NamedTuple, Optional
+from sqlalchemy import select, delete, func, exists
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+from config import ARCHIVE_DIR, ARCHIVE_AFTER_DAYS, ARCHIVE_INTERVAL_HOURS
+from database.db import engine, read_engine
+from database.models import DailySummary, Meal, Meta, User
+from services.daily_summary import ARCHIVE_WATERMARK_KEY
+from services.meal_backfill import legacy_meals_pending
+
+logger = logging.getLogger(__name__)
+
+# Строк за одно чтение при выгрузке и за одну транзакцию при удалении
+READ_BATCH_SIZE = 5000
+DELETE_BATCH_SIZE = 2000
+
+# Сколько байт строк сжимать одним блоком архивного файла
+ARCHIVE_BLOCK_SIZE = 64 * 1024
+
+
+class ArchiveStats(NamedTuple):
+    months: int
+    archived: int
+    deleted: int
+
+
+async def get_archive_watermark(conn: AsyncConnection) -> Optional[date]:
+    """Последний день, записи которого перенесены в архив"""
+    value = await conn.scalar(select(Meta.value).where(Meta.key == ARCHIVE_WATERMARK_KEY))
+    return date.fromisoformat(value) if value else None
+
+
+def archive_path(archive_dir: str, month: date) -> str:
+    return os.path.join(archive_dir, f"meals-{month:%Y-%m}.jsonl.gz")
+
+
+def index_path(path: str) -> str:
+    """Оглавление архивного файла"""
+    return path[:-len(".jsonl.gz")] + ".index.json"
+
+
+def read_user_rows(path: str, user_id: int) -> List[dict]:
+    """Строки пользователя из архивного файла: по оглавлению читаются только блоки с ним"""
+    with open(index_path(path), encoding="utf-8") as f:
+        blocks = json.load(f)["blocks"]
+    # Блоки идут по user_id: [первый user_id, последний user_id, смещение, длина]
+    start = bisect_left([block[1] for block in blocks], user_id)
+    stop = bisect_right([block[0] for block in blocks], user_id)
+    if start >= stop:
+        return []
+    offset = blocks[start][2]
+    with open(path, "rb") as f:
+        f.seek(offset)
+        data = f.read(blocks[stop - 1][2] + blocks[stop - 1][3] - offset)
+
+    rows = []
+    for line in gzip.decompress(data).decode().splitlines():
+        row = json.loads(line)
+        if row["user_id"] == user_id:
+            rows.append(row)
+    return rows
+
+
+def _month_end(day: date) -> date:
+    next_month = (day.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return next_month - timedelta(days=1)
+
+
+async def _export_month(read_engine: AsyncEngine, path: str, first: date, last: date) -> int:
+    """Выгрузить строки meals за период в файл с оглавлением; возвращает число строк"""
+    loop = asyncio.get_running_loop()
+    tmp_path, tmp_index_path = path + ".tmp", index_path(path) + ".tmp"
+    count = 0
+    blocks = []
+    block: List[bytes] = []
+    block_size = 0
+    first_user = last_user = None
+
+    async def flush_block():
+        nonlocal block, block_size, first_user
+        # Сжатие — в пуле потоков, чтобы не задерживать обработчики
+        data = await loop.run_in_executor(None, gzip.compress, b"".join(block))
+        offset = f.tell()
+        await loop.run_in_executor(None, f.write, data)
+        blocks.append([first_user, last_user, offset, len(data)])
+        block, block_size, first_user = [], 0, None
+
+    f = await loop.run_in_executor(None, open, tmp_path, "wb")
+    try:
+        async with read_engine.connect() as conn:
+            result = await conn.stream(
+                select(Meal.id, Meal.user_id, Meal.name, Meal.grams, Meal.calories, Meal.date)
+                .where(Meal.date.between(first, last))
+                .order_by(Meal.user_id, Meal.date, Meal.id)
+            )
+            async for rows in result.partitions(READ_BATCH_SIZE):
+                for row in rows:
+                    line = json.dumps({
+                        "id": row.id,
+                        "user_id": row.user_id,
+                        "product_name": row.name,
+                        "grams": row.grams,
+                        "calories": row.calories,
+                        "date": row.date.isoformat(),
+                    }, ensure_ascii=False).encode() + b"\n"
+                    if first_user is None:
+                        first_user = row.user_id
+                    last_user = row.user_id
+                    block.append(line)
+                    block_size += len(line)
+                    if block_size >= ARCHIVE_BLOCK_SIZE:
+                        await flush_block()
+                count += len(rows)
+        if block:
+            await flush_block()
+        await loop.run_in_executor(None, _close_durably, f)
+        await loop.run_in_executor(None, _write_index, tmp_index_path, blocks)
+    except BaseException:
+        f.close()
+        for name in (tmp_path, tmp_index_path):
+            if os.path.exists(name):
+                os.unlink(name)
+        raise
+
+    # Файл месяца без отметки в meta не читается, поэтому порядок переименований не важен
+    os.replace(tmp_index_path, index_path(path))
+    os.replace(tmp_path, path)
+    return count
+
+
+def _close_durably(f: BinaryIO):
+    f.flush()
+    os.fsync(f.fileno())
+    f.close()
+
+
+def _write_index(path: str, blocks: List[list]):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"blocks": blocks}, f)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+async def _roll_up_month(conn: AsyncConnection, first: date, last: date):
+    """Пересчитать итоги дней периода из строк meals, чтобы они точно совпадали с архивом"""
+    sums = (
+        select(
+            Meal.user_id,
+            Meal.date,
+            func.sum(Meal.calories_x100),
+            func.count(Meal.id),
+            User.daily_goal
+        )
+        .join(User, User.id == Meal.user_id)
+        .where(Meal.date.between(first, last))
+        .group_by(Meal.user_id, Meal.date)
+    )
+    stmt = insert(DailySummary).from_select(["user_id", "date", "calories_x100", "items", "goal"], sums)
+    await conn.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[DailySummary.user_id, DailySummary.date],
+            set_={"calories_x100": stmt.excluded.calories_x100, "items": stmt.excluded["items"]}
+        )
+    )
+    await conn.execute(
+        delete(DailySummary).where(
+            DailySummary.date.between(first, last),
+            ~exists().where(Meal.user_id == DailySummary.user_id, Meal.date == DailySummary.date)
+        )
+    )
+
+
+async def _delete_archived(engine: AsyncEngine, through: date) -> int:
+    """Удалить строки не позже отметки короткими транзакциями"""
+    deleted = 0
+    while True:
+        async with engine.begin() as conn:
+            ids = select(Meal.id).where(Meal.date <= through).limit(DELETE_BATCH_SIZE)
+            result = await conn.execute(delete(Meal).where(Meal.id.in_(ids)))
+        deleted += result.rowcount
+        if result.rowcount < DELETE_BATCH_SIZE:
+            return deleted
+        # Даём обработчикам взять соединение записи между пачками
+        await asyncio.sleep(0)
+
+
+async def archive_meals(
+    engine: AsyncEngine,
+    read_engine: AsyncEngine,
+    archive_dir: str = ARCHIVE_DIR,
+    after_days: int = ARCHIVE_AFTER_DAYS,
+    today: Optional[date] = None
+) -> ArchiveStats:
+    """
+    Перенести в архив все целые месяцы старше after_days дней
+
+    Args:
+        engine: движок для записи
+        read_engine: движок для чтения, через него идёт выгрузка
+        archive_dir: каталог архивных файлов
+        after_days: сколько последних дней хранить в meals
+        today: текущая дата (по умолчанию сегодня)
+
+    Returns:
+        ArchiveStats: сколько месяцев и строк выгружено и удалено
+    """
+    today = today or date.today()
+    # Архивируем только месяцы, которые целиком старше горизонта
+    through = (today - timedelta(days=after_days)).replace(day=1) - timedelta(days=1)
+    os.makedirs(archive_dir, exist_ok=True)
+
+    months = archived = 0
+    async with engine.connect() as conn:
+        if await legacy_meals_pending(conn):
+            logger.info("⏳ Записи ещё переносятся в компактный формат, архивация отложена")
+            return ArchiveStats(0, 0, 0)
+        watermark = await get_archive_watermark(conn)
+    # Строки, оставшиеся после прерванного удаления
+    deleted = await _delete_archived(engine, watermark) if watermark else 0
+
+    while True:
+        async with read_engine.connect() as conn:
+            first_day = await conn.scalar(
+                select(func.min(Meal.date)).where(Meal.date > (watermark or date.min))
+            )
+        if first_day is None or first_day > through:
+            break
+
+        first, last = first_day.replace(day=1), _month_end(first_day)
+        path = archive_path(archive_dir, first)
+        count = await _export_month(read_engine, path, first, last)
+
+        async with engine.begin() as conn:
+            # Старые дни не меняются, но проверяем, что в файл попало всё
+            current = await conn.scalar(select(func.count(Meal.id)).where(Meal.date.between(first, last)))
+            if current != count:
+                raise RuntimeError(f"За {first:%Y-%m} выгружено {count} строк, а в meals {current}")
+            await _roll_up_month(conn, first, last)
+            stmt = insert(Meta).values(key=ARCHIVE_WATERMARK_KEY, value=last.isoformat())
+            await conn.execute(
+                stmt.on_conflict_do_update(index_elements=[Meta.key], set_={"value": stmt.excluded.value})
+            )
+
+        watermark = last
+        deleted += await _delete_archived(engine, watermark)
+        months += 1
+        archived += count
+        logger.info("🗄️ Месяц %s перенесён в архив: %d записей, %s", f"{first:%Y-%m}", count, path)
+
+    return ArchiveStats(months, archived, deleted)
+
+
+class MealArchiver:
+    """Периодический запуск archive_meals в фоне"""
+
+    def __init__(self, engine: AsyncEngine, read_engine: AsyncEngine, interval: float):
+        self.engine = engine
+        self.read_engine = read_engine
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        if not self.running:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if not self.running:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                stats = await archive_meals(self.engine, self.read_engine)
+                if stats.months or stats.deleted:
+                    logger.info("🗄️ Архивация: месяцев %d, удалено записей %d", stats.months, stats.deleted)
+            except Exception:
+                logger.exception("❌ Архивация записей не удалась")
+            await asyncio.sleep(self.interval)
+
+
+# Запускается при старте бота, если задан ARCHIVE_AFTER_DAYS
+meal_archiver = MealArchiver(engine, read_engine, interval=ARCHIVE_INTERVAL_HOURS * 3600)
+
+
+async def _main(after_days: int):
+    from database.db import init_db, close_db
+
+    await init_db()
+    try:
+        stats = await archive_meals(engine, read_engine, after_days=after_days)
+    finally:
+        await close_db()
+    print(f"Месяцев в архиве: {stats.months}, записей выгружено: {stats.archived}, удалено: {stats.deleted}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--after-days", type=int, default=ARCHIVE_AFTER_DAYS or 180)
+    asyncio.run(_main(parser.parse_args().after_days))
@@ -0,0 +1,323 @@
+"""
+Вечерняя рассылка итогов дня
+
+Итоги всех, кто сегодня что-то записал, считаются одним запросом
+с группировкой по meals и users (калории берутся из покрывающего индекса
+ix_meals_user_date). Сообщения уходят по порядку id пользователей через
+SendScheduler с пометкой bulk_sending, поэтому ответы в диалогах не ждут
+рассылку; в отправке одновременно не больше BROADCAST_CONCURRENCY сообщений.
+
+Прогресс хранится в meta (ключ daily_broadcast:<день>): id, до которого
+включительно разосланы все, и id отправленных после него. Он сохраняется
+каждые BROADCAST_CHECKPOINT_EVERY отправок и при остановке бота, поэтому
+после перезапуска рассылка продолжается с того же места: никто не
+пропущен, а после штатной остановки (она ждёт сообщения, уже переданные
+на отправку, до STOP_GRACE секунд) никто не получит сообщение дважды.
+При аварийном завершении повторно могут получить сообщение только те,
+кому оно ушло после последнего сохранения.
+
+Если в назначенное время бот не работал, рассылка начнётся при запуске
+(в тот же день).
+
+Запуск вручную (например, из cron в режиме шардирования):
+    python -m services.broadcast
+"""
+import argparse
+import asyncio
+import json
+import logging
+import time
+from datetime import date, datetime, timedelta
+from datetime import time as day_time
+from typing import Iterable, List, NamedTuple, Optional, Set
+from aiogram import Bot
+from aiogram.exceptions import TelegramAPIError, TelegramForbiddenError, TelegramRetryAfter
+from sqlalchemy import delete, select
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker
+from config import DAILY_BROADCAST_AT, BROADCAST_CONCURRENCY, BROADCAST_CHECKPOINT_EVERY, SEND_MAX_RETRIES
+from database.db import engine, read_session_maker
+from database.models import Meal, Meta, User
+from services.send_scheduler import bulk_sending
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_KEY = "daily_broadcast:{day}"
+
+# Через сколько секунд повторить рассылку, если она прервалась с ошибкой
+RETRY_DELAY = 60
+
+# Сколько секунд при остановке ждать сообщения, уже переданные на отправку
+STOP_GRACE = 10
+
+
+class DayTotal(NamedTuple):
+    """Итог дня одного пользователя"""
+    user_id: int
+    telegram_id: int
+    calories: float
+    goal: int
+
+
+class BroadcastStats(NamedTuple):
+    sent: int
+    blocked: int
+    failed: int
+    # Получили сообщение до перезапуска
+    skipped: int
+
+
+async def day_totals(session: AsyncSession, day: date, after_user_id: int = 0) -> List[DayTotal]:
+    """
+    Итоги дня всех пользователей с записями за этот день, одним запросом
+
+    Args:
+        session: сессия БД
+        day: день
+        after_user_id: только пользователи с id больше этого
+
+    Returns:
+        итоги по возрастанию id пользователя
+    """
+    result = await session.execute(
+        select(User.id, User.telegram_id, Meal.calories_sum(), User.daily_goal)
+        .join(Meal, Meal.user_id == User.id)
+        .where(Meal.date == day, User.id > after_user_id)
+        .group_by(User.id)
+        .order_by(User.id)
+    )
+    return [DayTotal(*row) for row in result]
+
+
+def format_day_total(total: DayTotal) -> str:
+    text = f"🌙 Итоги дня\n\nСегодня: {int(total.calories)} / {total.goal} ккал"
+    remaining = total.goal - total.calories
+    if remaining < 0:
+        return f"{text}\n⚠️ Превышение на {int(-remaining)} ккал"
+    return f"{text}\n✅ Осталось: {int(remaining)} ккал"
+
+
+class _Progress:
+    """Кто уже получил сообщение: все до after включительно и sent после него"""
+
+    def __init__(self, after: int = 0, sent: Iterable[int] = (), done: bool = False):
+        self.after = after
+        self.sent: Set[int] = set(sent)
+        self.done = done
+
+    def is_sent(self, user_id: int) -> bool:
+        return user_id <= self.after or user_id in self.sent
+
+    def advance(self, totals: List[DayTotal], position: int) -> int:
+        """Сдвинуть after по отправленным подряд; возвращает новую позицию в totals"""
+        while position < len(totals) and self.is_sent(totals[position].user_id):
+            self.after = max(self.after, totals[position].user_id)
+            self.sent.discard(totals[position].user_id)
+            position += 1
+        return position
+
+    def dumps(self) -> str:
+        return json.dumps({"after": self.after, "sent": sorted(self.sent), "done": self.done})
+
+
+async def _load_progress(engine: AsyncEngine, day: date) -> _Progress:
+    key = CHECKPOINT_KEY.format(day=day.isoformat())
+    async with engine.begin() as conn:
+        # Прогресс прошлых дней больше не нужен
+        await conn.execute(
+            delete(Meta).where(Meta.key.like(CHECKPOINT_KEY.format(day="%")), Meta.key != key)
+        )
+        value = await conn.scalar(select(Meta.value).where(Meta.key == key))
+    return _Progress(**json.loads(value)) if value else _Progress()
+
+
+async def _save_progress(engine: AsyncEngine, day: date, progress: _Progress):
+    async with engine.begin() as conn:
+        stmt = insert(Meta).values(key=CHECKPOINT_KEY.format(day=day.isoformat()), value=progress.dumps())
+        await conn.execute(
+            stmt.on_conflict_do_update(index_elements=[Meta.key], set_={"value": stmt.excluded.value})
+        )
+
+
+async def _send(bot: Bot, total: DayTotal):
+    # Без SendScheduler лимит Telegram соблюдаем здесь
+    for attempt in range(SEND_MAX_RETRIES + 1):
+        try:
+            await bot.send_message(total.telegram_id, format_day_total(total))
+            return
+        except TelegramRetryAfter as e:
+            if attempt == SEND_MAX_RETRIES:
+                raise
+            await asyncio.sleep(e.retry_after)
+
+
+async def run_broadcast(
+    bot: Bot,
+    day: Optional[date] = None,
+    engine: AsyncEngine = engine,
+    session_maker: async_sessionmaker = read_session_maker,
+    concurrency: int = BROADCAST_CONCURRENCY,
+    checkpoint_every: int = BROADCAST_CHECKPOINT_EVERY
+) -> BroadcastStats:
+    """
+    Разослать итоги дня, продолжив с сохранённого места
+
+    Args:
+        bot: бот для отправки
+        day: день (по умолчанию сегодня)
+        engine: движок для записи прогресса
+        session_maker: сессии для чтения итогов
+        concurrency: сколько сообщений держать в отправке одновременно
+        checkpoint_every: сохранять прогресс каждые столько отправок
+
+    Returns:
+        статистика рассылки (нули, если за этот день она уже закончена)
+    """
+    day = day or date.today()
+    progress = await _load_progress(engine, day)
+    if progress.done:
+        return BroadcastStats(0, 0, 0, 0)
+
+    async with session_maker() as session:
+        totals = await day_totals(session, day, progress.after)
+
+    sent = blocked = failed = skipped = 0
+    slots = asyncio.Semaphore(concurrency)
+    tasks: Set[asyncio.Task] = set()
+
+    async def deliver(total: DayTotal):
+        nonlocal sent, blocked, failed
+        try:
+            await _send(bot, total)
+            sent += 1
+        except TelegramForbiddenError:
+            # Пользователь заблокировал бота
+            blocked += 1
+        except TelegramAPIError as e:
+            # Повторять не будем, иначе одна ошибка остановит всю рассылку
+            logger.warning("⚠️ Итоги дня не отправлены пользователю %d: %s", total.user_id, e)
+            failed += 1
+        finally:
+            slots.release()
+        progress.sent.add(total.user_id)
+
+    position = saved = 0
+    try:
+        with bulk_sending():
+            for total in totals:
+                if progress.is_sent(total.user_id):
+                    skipped += 1
+                    continue
+                await slots.acquire()
+                task = asyncio.create_task(deliver(total))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+
+                if sent + blocked + failed - saved >= checkpoint_every:
+                    saved = sent + blocked + failed
+                    position = progress.advance(totals, position)
+                    await _save_progress(engine, day, progress)
+
+            if tasks:
+                # Не gather: при отмене он отменил бы и сообщения в отправке,
+                # а их при остановке дожидаемся ниже
+                done, _ = await asyncio.wait(tasks)
+                for task in done:
+                    task.result()
+        progress.advance(totals, position)
+        progress.done = True
+    finally:
+        if tasks:
+            # Остановка: сообщения в отправке дожидаемся (запрос мог уже дойти
+            # до Telegram), остальные уйдут после перезапуска
+            await asyncio.wait(tasks, timeout=STOP_GRACE)
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+        progress.advance(totals, position)
+        await _save_progress(engine, day, progress)
+
+    return BroadcastStats(sent, blocked, failed, skipped)
+
+
+class DailyBroadcast:
+    """Запуск run_broadcast каждый день в заданное время"""
+
+    def __init__(self, at: Optional[day_time]):
+        self.at = at
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self, bot: Bot):
+        if self.at is not None and not self.running:
+            self._task = asyncio.create_task(self._run(bot))
+
+    async def stop(self):
+        if not self.running:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self, bot: Bot):
+        while True:
+            now = datetime.now()
+            run_at = datetime.combine(now.date(), self.at)
+            if now < run_at:
+                await asyncio.sleep((run_at - now).total_seconds())
+                continue
+
+            try:
+                started = time.perf_counter()
+                stats = await run_broadcast(bot, now.date())
+                if stats.sent or stats.blocked or stats.failed:
+                    logger.info(
+                        "🌙 Итоги дня разосланы: %d, заблокировали бота %d, ошибок %d (%.0f с)",
+                        stats.sent, stats.blocked, stats.failed, time.perf_counter() - started
+                    )
+            except Exception:
+                logger.exception("❌ Рассылка итогов дня прервалась, продолжится через %d с", RETRY_DELAY)
+                await asyncio.sleep(RETRY_DELAY)
+                continue
+
+            tomorrow = datetime.combine(now.date() + timedelta(days=1), self.at)
+            await asyncio.sleep((tomorrow - datetime.now()).total_seconds())
+
+
+def parse_time(value: str) -> Optional[day_time]:
+    """ЧЧ:ММ; пустая строка — рассылка выключена"""
+    return datetime.strptime(value, "%H:%M").time() if value else None
+
+
+# Запускается вместе с ботом, если задан DAILY_BROADCAST_AT
+daily_broadcast = DailyBroadcast(parse_time(DAILY_BROADCAST_AT))
+
+
+async def _main(day: Optional[date]):
+    from bot import create_bot
+    from database.db import init_db, close_db
+
+    await init_db()
+    bot = create_bot()
+    try:
+        stats = await run_broadcast(bot, day)
+    finally:
+        await bot.session.close()
+        await close_db()
+    print(
+        f"Отправлено: {stats.sent}, заблокировали бота: {stats.blocked}, "
+        f"ошибок: {stats.failed}, получили раньше: {stats.skipped}"
+    )
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--date", type=date.fromisoformat, help="день (по умолчанию сегодня)")
+    asyncio.run(_main(parser.parse_args().date))
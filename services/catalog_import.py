@@ -0,0 +1,324 @@
+"""
+Потоковый импорт каталога продуктов из JSONL или CSV (можно .gz)
+
+Файл читается построчно, в памяти держится только текущая пачка.
+Названия нормализуются (регистр, пробелы), калорийность проверяется,
+повторы внутри пачки схлопываются — как и в load_products, побеждает
+последнее вхождение. Каждая пачка пишется одной транзакцией вместе
+с контрольной точкой (смещение в файле), поэтому прерванный импорт
+продолжается с --resume без потерь и повторов.
+
+Импорт не трогает продукты других источников: совпавшее название из
+data/products.json или другого импорта остаётся как есть.
+
+Запуск из корня проекта:
+    python -m services.catalog_import dump.jsonl --source off
+    python -m services.catalog_import dump.csv.gz --source off --resume
+"""
+import argparse
+import asyncio
+import csv
+import gzip
+import json
+import logging
+import math
+import os
+import re
+import time
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Tuple
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.ext.asyncio import AsyncEngine
+from database.models import Product, Meta
+from services.product_search import bump_catalog_version
+from services.recipes import refresh_recipes
+
+logger = logging.getLogger(__name__)
+
+# Поля с названием и калорийностью, по убыванию приоритета
+NAME_FIELDS = ("name", "product_name_ru", "product_name")
+KCAL_FIELDS = ("kcal_per_100g", "energy-kcal_100g", "energy_kcal_100g")
+
+# Калорийность выше, чем у чистого жира, считаем ошибкой в данных
+MAX_KCAL = 900
+MAX_NAME_LENGTH = 100
+DEFAULT_BATCH_SIZE = 50_000
+CHECKPOINT_KEY = "import_checkpoint:{source}"
+
+_SPACES_RE = re.compile(r"\s+")
+
+
+class ImportStats:
+    """Счётчики импорта"""
+
+    def __init__(self, read: int = 0, written: int = 0, skipped: int = 0, duplicates: int = 0):
+        self.read = read
+        self.written = written
+        self.skipped = skipped
+        self.duplicates = duplicates
+
+    def as_dict(self) -> Dict[str, int]:
+        return {"read": self.read, "written": self.written, "skipped": self.skipped, "duplicates": self.duplicates}
+
+
+def normalize_name(raw: Any) -> Optional[str]:
+    """Название в нижнем регистре с одиночными пробелами или None, если оно непригодно"""
+    if not raw or not isinstance(raw, str):
+        return None
+    name = _SPACES_RE.sub(" ", raw).strip(" \"'").lower()
+    if len(name) < 2 or len(name) > MAX_NAME_LENGTH:
+        return None
+    return name
+
+
+def parse_kcal(raw: Any) -> Optional[int]:
+    """Калорийность на 100 г целым числом или None, если значение некорректно"""
+    if raw is None or raw == "":
+        return None
+    try:
+        value = float(raw.replace(",", ".")) if isinstance(raw, str) else float(raw)
+    except (TypeError, ValueError):
+        return None
+    if not math.isfinite(value) or value < 0 or value > MAX_KCAL:
+        return None
+    return round(value)
+
+
+def _pick(record: Dict[str, Any], fields: Tuple[str, ...]) -> Any:
+    for field in fields:
+        value = record.get(field)
+        if value not in (None, ""):
+            return value
+    return None
+
+
+def _read_jsonl(f: BinaryIO) -> Iterator[Tuple[Optional[Dict[str, Any]], int]]:
+    """Записи JSONL и смещение сразу после каждой из них"""
+    for line in iter(f.readline, b""):
+        offset = f.tell()
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            record = None
+        yield (record if isinstance(record, dict) else None), offset
+
+
+def _read_csv(f: BinaryIO, header: List[str], delimiter: str) -> Iterator[Tuple[Optional[Dict[str, Any]], int]]:
+    """Записи CSV и смещение сразу после каждой из них (запись может занимать несколько строк)"""
+    position = [f.tell()]
+
+    def lines():
+        for line in iter(f.readline, b""):
+            position[0] = f.tell()
+            yield line.decode("utf-8", errors="replace")
+
+    # Открытые дампы содержат очень длинные поля
+    csv.field_size_limit(1 << 24)
+    for row in csv.DictReader(lines(), fieldnames=header, delimiter=delimiter):
+        yield row, position[0]
+
+
+def _read_header(f: BinaryIO, delimiter: Optional[str]) -> Tuple[List[str], str]:
+    line = f.readline().decode("utf-8-sig", errors="replace")
+    if delimiter is None:
+        # Дампы Open Food Facts разделены табуляцией, несмотря на расширение .csv
+        delimiter = "\t" if line.count("\t") > line.count(",") else ","
+    return next(csv.reader([line], delimiter=delimiter)), delimiter
+
+
+class _Source:
+    """Файл импорта: распакованный поток и позиция в исходном файле для прогресса"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.size = os.path.getsize(path)
+        self.raw = open(path, "rb")
+        self.stream: BinaryIO = gzip.GzipFile(fileobj=self.raw) if path.endswith(".gz") else self.raw
+
+    @property
+    def progress(self) -> float:
+        return self.raw.tell() / self.size if self.size else 1.0
+
+    def close(self):
+        self.stream.close()
+        self.raw.close()
+
+
+async def _load_checkpoint(engine: AsyncEngine, source: str) -> Optional[Dict[str, Any]]:
+    async with engine.connect() as conn:
+        value = await conn.scalar(
+            Meta.__table__.select().with_only_columns(Meta.value).where(Meta.key == CHECKPOINT_KEY.format(source=source))
+        )
+    return json.loads(value) if value else None
+
+
+async def _write_batch(
+    engine: AsyncEngine,
+    source: str,
+    batch: Dict[str, int],
+    stats: ImportStats,
+    checkpoint: Dict[str, Any]
+):
+    """Записать пачку и контрольную точку одной транзакцией"""
+    async with engine.begin() as conn:
+        if batch:
+            stmt = insert(Product.__table__)
+            result = await conn.execute(
+                stmt.on_conflict_do_update(
+                    index_elements=[Product.name],
+                    set_={"kcal_per_100g": stmt.excluded.kcal_per_100g},
+                    # Обновляем только свои продукты
+                    where=(Product.source == stmt.excluded.source)
+                ).returning(Product.id),
+                [{"name": name, "kcal_per_100g": kcal, "source": source} for name, kcal in batch.items()]
+            )
+            written = result.scalars().all()
+            stats.written += len(written)
+            # Блюда пользователей с изменёнными продуктами
+            await refresh_recipes(conn, written)
+
+        stmt = insert(Meta.__table__).values(
+            key=CHECKPOINT_KEY.format(source=source),
+            value=json.dumps({**checkpoint, "stats": stats.as_dict()})
+        )
+        await conn.execute(
+            stmt.on_conflict_do_update(index_elements=[Meta.key], set_={"value": stmt.excluded.value})
+        )
+        # Работающий бот перестроит индекс продуктов, когда импорт закончится
+        if checkpoint.get("done"):
+            await bump_catalog_version(conn)
+
+
+async def import_catalog(
+    engine: AsyncEngine,
+    path: str,
+    source: str,
+    file_format: Optional[str] = None,
+    delimiter: Optional[str] = None,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    resume: bool = False
+) -> ImportStats:
+    """
+    Импортировать каталог из файла
+
+    Args:
+        engine: движок БД для записи
+        path: путь к JSONL или CSV (можно .gz)
+        source: имя источника, записывается в products.source
+        file_format: jsonl или csv; по умолчанию по расширению
+        delimiter: разделитель CSV; по умолчанию определяется по заголовку
+        batch_size: продуктов в одной транзакции
+        resume: продолжить с контрольной точки прошлого запуска
+
+    Returns:
+        счётчики импорта
+    """
+    if source == "seed":
+        raise ValueError("Источник seed зарезервирован за data/products.json")
+    if file_format is None:
+        stem = path[:-3] if path.endswith(".gz") else path
+        file_format = "jsonl" if stem.endswith((".jsonl", ".ndjson")) else "csv"
+
+    stat = os.stat(path)
+    file_id = {"path": os.path.abspath(path), "size": stat.st_size, "mtime": stat.st_mtime}
+
+    stats = ImportStats()
+    offset = 0
+    checkpoint = await _load_checkpoint(engine, source) if resume else None
+    if checkpoint and all(checkpoint.get(key) == value for key, value in file_id.items()):
+        if checkpoint.get("done"):
+            logger.info("⏭️ Файл уже импортирован полностью")
+            return ImportStats(**checkpoint["stats"])
+        offset = checkpoint["offset"]
+        stats = ImportStats(**checkpoint["stats"])
+        logger.info("↩️ Продолжаем с позиции %d (прочитано строк: %d)", offset, stats.read)
+    elif checkpoint:
+        logger.warning("⚠️ Файл изменился после прошлого импорта, начинаем сначала")
+
+    started = time.perf_counter()
+    read_before = stats.read
+    source_file = _Source(path)
+    try:
+        f = source_file.stream
+        if file_format == "jsonl":
+            if offset:
+                f.seek(offset)
+            records = _read_jsonl(f)
+        else:
+            header, delimiter = _read_header(f, delimiter)
+            if offset:
+                f.seek(offset)
+            records = _read_csv(f, header, delimiter)
+
+        batch: Dict[str, int] = {}
+        offset = f.tell()
+        for record, offset in records:
+            stats.read += 1
+            name = normalize_name(_pick(record, NAME_FIELDS)) if record else None
+            kcal = parse_kcal(_pick(record, KCAL_FIELDS)) if name else None
+            if kcal is None:
+                stats.skipped += 1
+                continue
+
+            if name in batch:
+                stats.duplicates += 1
+            batch[name] = kcal
+
+            if len(batch) >= batch_size:
+                await _write_batch(engine, source, batch, stats, {**file_id, "offset": offset})
+                batch = {}
+                elapsed = time.perf_counter() - started
+                logger.info(
+                    "📥 %.0f%%: прочитано %d, записано %d, пропущено %d (%.0f строк/с)",
+                    source_file.progress * 100,
+                    stats.read,
+                    stats.written,
+                    stats.skipped,
+                    (stats.read - read_before) / elapsed
+                )
+
+        await _write_batch(engine, source, batch, stats, {**file_id, "offset": offset, "done": True})
+    finally:
+        source_file.close()
+
+    logger.info(
+        "✅ Импорт завершён за %.1f с: прочитано %d, записано %d, пропущено %d, повторов %d",
+        time.perf_counter() - started,
+        stats.read,
+        stats.written,
+        stats.skipped,
+        stats.duplicates
+    )
+    return stats
+
+
+async def _main(args):
+    from database.db import engine, init_db, close_db
+
+    await init_db()
+    try:
+        await import_catalog(
+            engine,
+            args.path,
+            args.source,
+            file_format=args.format,
+            delimiter=args.delimiter,
+            batch_size=args.batch_size,
+            resume=args.resume
+        )
+    finally:
+        await close_db()
+    logger.info("ℹ️ Запущенный бот перестроит индекс поиска сам (CATALOG_REFRESH_SECONDS), перезапуск не нужен")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path")
+    parser.add_argument("--source", required=True, help="имя источника, например off")
+    parser.add_argument("--format", choices=("jsonl", "csv"))
+    parser.add_argument("--delimiter")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--resume", action="store_true", help="продолжить прерванный импорт")
+    asyncio.run(_main(parser.parse_args()))
@@ -0,0 +1,269 @@
+"""
+Графики калорий по дням
+
+Данные за период берутся одним запросом к daily_summaries. Картинка
+рисуется встроенным рендером PNG (без внешних библиотек) в пуле потоков,
+чтобы не блокировать event loop. Готовый график кэшируется по
+(пользователь, период) вместе с версией данных: пока данные не изменились,
+повторно отправляется file_id, полученный от Telegram при первой отправке.
+"""
+import asyncio
+import hashlib
+import struct
+import zlib
+from collections import OrderedDict
+from datetime import date, timedelta
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from config import CHART_CACHE_SIZE
+from database.models import DailySummary
+
+# Доступные периоды, дней
+CHART_RANGES = (7, 30, 90)
+
+WIDTH = 800
+HEIGHT = 400
+MARGIN_LEFT = 64
+MARGIN_RIGHT = 16
+MARGIN_TOP = 20
+MARGIN_BOTTOM = 36
+
+Color = Tuple[int, int, int]
+BACKGROUND: Color = (255, 255, 255)
+GRID: Color = (232, 232, 232)
+AXIS: Color = (120, 120, 120)
+TEXT: Color = (70, 70, 70)
+UNDER_GOAL: Color = (76, 175, 80)
+OVER_GOAL: Color = (229, 57, 53)
+GOAL_LINE: Color = (30, 136, 229)
+
+# Цифры 3x5 пикселей: строки сверху вниз, биты слева направо
+_GLYPHS = {
+    "0": (7, 5, 5, 5, 7), "1": (2, 6, 2, 2, 7), "2": (7, 1, 7, 4, 7), "3": (7, 1, 7, 1, 7),
+    "4": (5, 5, 7, 1, 1), "5": (7, 4, 7, 1, 7), "6": (7, 4, 7, 5, 7), "7": (7, 1, 1, 1, 1),
+    "8": (7, 5, 7, 5, 7), "9": (7, 5, 7, 1, 7), ".": (0, 0, 0, 0, 2),
+}
+FONT_SCALE = 2
+
+# Шаги делений оси калорий, из которых выбирается подходящий
+_TICK_STEPS = (100, 200, 250, 500, 1000, 2000, 2500, 5000, 10000)
+
+
+class ChartData(NamedTuple):
+    """Калории по дням периода (None — записей нет) и норма"""
+    days: int
+    start: date
+    calories: Tuple[Optional[float], ...]
+    goal: int
+
+    @property
+    def version(self) -> str:
+        """Версия данных: меняется при любом изменении итогов, нормы или начала периода"""
+        return hashlib.sha1(repr(self).encode()).hexdigest()[:16]
+
+    @property
+    def logged(self) -> List[float]:
+        return [value for value in self.calories if value is not None]
+
+
+async def get_chart_data(session: AsyncSession, user_id: int, goal: int, days: int, today: Optional[date] = None) -> ChartData:
+    """
+    Калории пользователя по дням за последние days дней
+
+    Args:
+        session: сессия БД
+        user_id: ID пользователя в БД
+        goal: дневная норма пользователя
+        days: длина периода, включая сегодня
+        today: последний день периода (по умолчанию сегодня)
+
+    Returns:
+        ChartData
+    """
+    today = today or date.today()
+    start = today - timedelta(days=days - 1)
+    result = await session.execute(
+        select(DailySummary.date, DailySummary.calories).where(
+            DailySummary.user_id == user_id,
+            DailySummary.date >= start,
+            DailySummary.date <= today
+        )
+    )
+    by_day: Dict[date, float] = dict(result.all())
+    calories = tuple(by_day.get(start + timedelta(days=i)) for i in range(days))
+    return ChartData(days, start, calories, goal)
+
+
+class _Canvas:
+    """Растровое изображение RGB, которое умеет прямоугольники, цифры и PNG"""
+
+    def __init__(self, width: int, height: int, background: Color):
+        self.width = width
+        self.height = height
+        row = bytes(background) * width
+        self.rows = [bytearray(row) for _ in range(height)]
+
+    def rect(self, x0: int, y0: int, x1: int, y1: int, color: Color):
+        x0, x1 = max(0, x0), min(self.width, x1)
+        y0, y1 = max(0, y0), min(self.height, y1)
+        if x0 >= x1 or y0 >= y1:
+            return
+        fill = bytes(color) * (x1 - x0)
+        for y in range(y0, y1):
+            self.rows[y][x0 * 3:x1 * 3] = fill
+
+    def text(self, x: int, y: int, text: str, color: Color):
+        """Цифры с левым верхним углом в (x, y)"""
+        for char in text:
+            for row, bits in enumerate(_GLYPHS.get(char, ())):
+                for col in range(3):
+                    if bits & (4 >> col):
+                        px, py = x + col * FONT_SCALE, y + row * FONT_SCALE
+                        self.rect(px, py, px + FONT_SCALE, py + FONT_SCALE, color)
+            x += 4 * FONT_SCALE
+
+    @staticmethod
+    def text_width(text: str) -> int:
+        return len(text) * 4 * FONT_SCALE - FONT_SCALE
+
+    def png(self) -> bytes:
+        def chunk(kind: bytes, data: bytes) -> bytes:
+            return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+        # Каждая строка с фильтром 0 (без предсказания)
+        raw = b"".join(b"\x00" + bytes(row) for row in self.rows)
+        return (
+            b"\x89PNG\r\n\x1a\n"
+            + chunk(b"IHDR", struct.pack(">IIBBBBB", self.width, self.height, 8, 2, 0, 0, 0))
+            + chunk(b"IDAT", zlib.compress(raw, 6))
+            + chunk(b"IEND", b"")
+        )
+
+
+def _tick_step(top: float) -> int:
+    for step in _TICK_STEPS:
+        if top / step <= 6:
+            return step
+    return _TICK_STEPS[-1]
+
+
+def render_chart(data: ChartData) -> bytes:
+    """
+    Нарисовать столбцы калорий по дням и линию нормы
+
+    Столбцы в пределах нормы зелёные, выше нормы — красные.
+    Под осью подписаны числа месяца.
+
+    Returns:
+        PNG
+    """
+    canvas = _Canvas(WIDTH, HEIGHT, BACKGROUND)
+    left, right = MARGIN_LEFT, WIDTH - MARGIN_RIGHT
+    top, bottom = MARGIN_TOP, HEIGHT - MARGIN_BOTTOM
+    plot_height = bottom - top
+
+    step = _tick_step(max(data.logged + [data.goal]) * 1.1)
+    y_max = step * (int(max(data.logged + [data.goal]) * 1.1 // step) + 1)
+
+    def y_of(value: float) -> int:
+        return bottom - round(value / y_max * plot_height)
+
+    # Сетка и подписи оси калорий
+    for value in range(0, y_max + 1, step):
+        y = y_of(value)
+        canvas.rect(left, y, right, y + 1, GRID)
+        label = str(value)
+        canvas.text(left - 8 - canvas.text_width(label), y - 5, label, TEXT)
+
+    # Столбцы и подписи дней
+    slot = (right - left) / data.days
+    bar_width = max(1, int(slot * 0.7))
+    label_every = 1 if data.days <= 7 else 5 if data.days <= 30 else 10
+    for i, calories in enumerate(data.calories):
+        x = left + round(i * slot + (slot - bar_width) / 2)
+        if calories:
+            color = OVER_GOAL if calories > data.goal else UNDER_GOAL
+            canvas.rect(x, y_of(calories), x + bar_width, bottom, color)
+        # Подписываем последний день и каждый label_every-й, считая от него
+        if (data.days - 1 - i) % label_every == 0:
+            label = str((data.start + timedelta(days=i)).day)
+            canvas.rect(x + bar_width // 2, bottom, x + bar_width // 2 + 1, bottom + 4, AXIS)
+            canvas.text(x + (bar_width - canvas.text_width(label)) // 2, bottom + 10, label, TEXT)
+
+    # Ось и пунктир нормы поверх столбцов
+    canvas.rect(left, bottom, right, bottom + 1, AXIS)
+    canvas.rect(left - 1, top, left, bottom + 1, AXIS)
+    goal_y = y_of(data.goal)
+    for x in range(left, right, 12):
+        canvas.rect(x, goal_y - 1, x + 8, goal_y + 1, GOAL_LINE)
+
+    return canvas.png()
+
+
+async def render_chart_async(data: ChartData) -> bytes:
+    """render_chart в пуле потоков"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, render_chart, data)
+
+
+class CachedChart(NamedTuple):
+    """График одной версии данных: PNG до первой отправки, потом file_id"""
+    version: str
+    png: Optional[bytes] = None
+    file_id: Optional[str] = None
+
+
+class ChartCache:
+    """LRU-кэш графиков по (user_id, дней); хранится только последняя версия"""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._items: "OrderedDict[Tuple[int, int], CachedChart]" = OrderedDict()
+        # Для логов и бенчмарков
+        self.renders = 0
+
+    def get(self, user_id: int, days: int, version: str) -> Optional[CachedChart]:
+        """График, если он построен по той же версии данных"""
+        key = (user_id, days)
+        chart = self._items.get(key)
+        if chart is None or chart.version != version:
+            return None
+        self._items.move_to_end(key)
+        return chart
+
+    def put(self, user_id: int, days: int, chart: CachedChart):
+        key = (user_id, days)
+        self._items[key] = chart
+        self._items.move_to_end(key)
+        if len(self._items) > self.maxsize:
+            self._items.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+
+chart_cache = ChartCache(CHART_CACHE_SIZE)
+
+
+async def get_chart(user_id: int, days: int, data: ChartData) -> CachedChart:
+    """
+    График из кэша или свежеотрисованный
+
+    Returns:
+        CachedChart с file_id (можно отправить без загрузки) или с PNG
+    """
+    version = data.version
+    chart = chart_cache.get(user_id, days, version)
+    if chart is not None:
+        return chart
+
+    chart = CachedChart(version, png=await render_chart_async(data))
+    chart_cache.renders += 1
+    chart_cache.put(user_id, days, chart)
+    return chart
+
+
+def remember_file_id(user_id: int, days: int, version: str, file_id: str):
+    """Запомнить file_id отправленного графика; PNG больше не нужен"""
+    chart_cache.put(user_id, days, CachedChart(version, file_id=file_id))
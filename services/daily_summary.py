@@ -0,0 +1,194 @@
+import asyncio
+import logging
+import sys
+from datetime import date
+from typing import List, NamedTuple, Optional
+from sqlalchemy import select, update, delete, func
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from database.models import DailySummary, Meal, Meta, User
+from services.meal_backfill import legacy_meals_pending
+
+logger = logging.getLogger(__name__)
+
+# Ключ в meta: записи до этого дня включительно перенесены в архив (services.archive)
+ARCHIVE_WATERMARK_KEY = "meals_archived_through"
+
+
+class SummaryDrift(NamedTuple):
+    """Расхождение итогов дня с записями в meals"""
+    user_id: int
+    date: date
+    expected_calories_x100: int
+    expected_items: int
+    actual_calories_x100: Optional[int]
+    actual_items: Optional[int]
+
+
+async def add_meal_to_summary(
+    session: AsyncSession,
+    user_id: int,
+    day: date,
+    calories_x100: int,
+    goal: int,
+    items: int = 1
+) -> DailySummary:
+    """
+    Учесть новую запись в итогах дня (в текущей транзакции)
+
+    Args:
+        calories_x100: калории записей в сотых долях ккал, как в meals
+
+    Returns:
+        обновлённые итоги дня
+    """
+    stmt = insert(DailySummary).values(
+        user_id=user_id, date=day, calories_x100=calories_x100, items=items, goal=goal
+    )
+    result = await session.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[DailySummary.user_id, DailySummary.date],
+            set_={
+                "calories_x100": DailySummary.calories_x100 + stmt.excluded.calories_x100,
+                "items": DailySummary.items + stmt.excluded["items"],
+                "goal": stmt.excluded.goal,
+            }
+        ).returning(DailySummary),
+        execution_options={"populate_existing": True}
+    )
+    return result.scalar_one()
+
+
+async def remove_meal_from_summary(
+    session: AsyncSession,
+    user_id: int,
+    day: date,
+    calories_x100: int,
+    items: int = 1
+):
+    """Вычесть удалённую запись из итогов дня (в текущей транзакции)"""
+    key = (DailySummary.user_id == user_id, DailySummary.date == day)
+
+    await session.execute(
+        update(DailySummary).where(*key).values(
+            calories_x100=DailySummary.calories_x100 - calories_x100,
+            items=DailySummary.items - items
+        )
+    )
+    await session.execute(
+        delete(DailySummary).where(*key, DailySummary.items <= 0)
+    )
+
+
+async def clear_day_summary(session: AsyncSession, user_id: int, day: date):
+    """Удалить итоги дня (в текущей транзакции)"""
+    await session.execute(
+        delete(DailySummary).where(DailySummary.user_id == user_id, DailySummary.date == day)
+    )
+
+
+async def get_day_summary(session: AsyncSession, user_id: int, day: date) -> Optional[DailySummary]:
+    """Итоги дня по первичному ключу"""
+    return await session.get(DailySummary, (user_id, day))
+
+
+async def check_daily_summaries(session: AsyncSession, repair: bool = False) -> List[SummaryDrift]:
+    """
+    Пересчитать итоги дней из meals и сравнить с daily_summaries
+
+    Дни, записи которых перенесены в архив, не сверяются: их итоги
+    пересчитаны при архивации, а строк в meals уже нет.
+
+    Args:
+        session: сессия БД
+        repair: перезаписать расходящиеся итоги значениями из meals
+
+    Returns:
+        список найденных расхождений
+    """
+    if await legacy_meals_pending(session):
+        # Часть записей ещё в meals_legacy: сверка нашла бы ложные расхождения
+        logger.warning("⏳ Записи ещё переносятся в компактный формат, проверка итогов пропущена")
+        return []
+
+    watermark = await session.scalar(select(Meta.value).where(Meta.key == ARCHIVE_WATERMARK_KEY))
+    archived_through = date.fromisoformat(watermark) if watermark else date.min
+
+    expected_result = await session.execute(
+        select(
+            Meal.user_id,
+            Meal.date,
+            func.sum(Meal.calories_x100),
+            func.count(Meal.id),
+            User.daily_goal
+        )
+        .join(User, User.id == Meal.user_id)
+        .where(Meal.date > archived_through)
+        .group_by(Meal.user_id, Meal.date)
+    )
+    expected = {(row[0], row[1]): row[2:] for row in expected_result.all()}
+
+    actual_result = await session.execute(
+        select(DailySummary.user_id, DailySummary.date, DailySummary.calories_x100, DailySummary.items)
+        .where(DailySummary.date > archived_through)
+    )
+    actual = {(row[0], row[1]): row[2:] for row in actual_result.all()}
+
+    drifts = []
+    for key in expected.keys() | actual.keys():
+        expected_calories_x100, expected_items, goal = expected.get(key, (0, 0, None))
+        actual_calories_x100, actual_items = actual.get(key, (None, None))
+
+        # Суммы целые, сравниваются точно
+        if actual_items == expected_items and actual_calories_x100 == expected_calories_x100:
+            continue
+
+        drifts.append(
+            SummaryDrift(*key, expected_calories_x100, expected_items, actual_calories_x100, actual_items)
+        )
+
+        if not repair:
+            continue
+
+        user_id, day = key
+        if not expected_items:
+            await clear_day_summary(session, user_id, day)
+            continue
+
+        stmt = insert(DailySummary).values(
+            user_id=user_id, date=day, calories_x100=expected_calories_x100, items=expected_items, goal=goal
+        )
+        await session.execute(
+            stmt.on_conflict_do_update(
+                index_elements=[DailySummary.user_id, DailySummary.date],
+                set_={"calories_x100": stmt.excluded.calories_x100, "items": stmt.excluded["items"]}
+            )
+        )
+
+    if repair and drifts:
+        await session.commit()
+
+    for drift in drifts[:20]:
+        logger.warning("⚠️ Расхождение итогов дня: %s", drift)
+    if len(drifts) > 20:
+        logger.warning("⚠️ ... и ещё %d расхождений", len(drifts) - 20)
+
+    return drifts
+
+
+async def _main(repair: bool):
+    from database.db import async_session_maker
+
+    async with async_session_maker() as session:
+        drifts = await check_daily_summaries(session, repair=repair)
+
+    action = "исправлено" if repair else "найдено"
+    print(f"Расхождений в итогах дня {action}: {len(drifts)}")
+    return drifts
+
+
+if __name__ == "__main__":
+    # python -m services.daily_summary [--repair]
+    logging.basicConfig(level=logging.INFO)
+    found = asyncio.run(_main("--repair" in sys.argv[1:]))
+    sys.exit(1 if found and "--repair" not in sys.argv[1:] else 0)
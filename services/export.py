@@ -0,0 +1,181 @@
+"""
+Выгрузка истории пользователя в CSV или JSONL (gzip)
+
+Записи читаются потоково (yield_per) и сразу сжимаются во временный
+файл в памяти, который при росте переносится на диск
+(SpooledTemporaryFile), поэтому память не зависит от длины истории.
+Месяцы, перенесённые в архив (services.archive), читаются из архивных
+файлов: по оглавлению распаковываются только блоки с этим пользователем.
+Одновременных выгрузок не больше EXPORT_MAX_CONCURRENT: каждая держит
+соединение из пула чтения, остальные соединения остаются обработчикам.
+"""
+import asyncio
+import csv
+import gzip
+import io
+import json
+import os
+import re
+from contextlib import asynccontextmanager
+from datetime import date
+from tempfile import SpooledTemporaryFile
+from typing import AsyncIterator, List, Optional, Set, Tuple
+from aiogram import Bot
+from aiogram.types import InputFile
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from config import ARCHIVE_DIR, EXPORT_MAX_CONCURRENT, EXPORT_SPOOL_MAX_BYTES
+from database.models import Meal, Meta
+from services.archive import read_user_rows
+from services.daily_summary import ARCHIVE_WATERMARK_KEY
+
+EXPORT_FORMATS = ("csv", "jsonl")
+CSV_HEADER = ("date", "product", "grams", "calories")
+
+# Строк за одно чтение из БД
+CHUNK_SIZE = 1000
+
+_ARCHIVE_NAME_RE = re.compile(r"meals-(\d{4})-(\d{2})\.jsonl\.gz")
+
+# (дата ISO, продукт, граммы, калории)
+ExportRow = Tuple[str, str, int, float]
+
+
+class ExportBusy(Exception):
+    """Все слоты выгрузки заняты или пользователь уже ждёт свою выгрузку"""
+
+
+class SpooledInputFile(InputFile):
+    """Файл для отправки в Telegram из SpooledTemporaryFile"""
+
+    def __init__(self, file: SpooledTemporaryFile, filename: str, chunk_size: int = 64 * 1024):
+        super().__init__(filename=filename, chunk_size=chunk_size)
+        self.file = file
+
+    async def read(self, bot: Bot) -> AsyncIterator[bytes]:
+        loop = asyncio.get_running_loop()
+        self.file.seek(0)
+        while chunk := await loop.run_in_executor(None, self.file.read, self.chunk_size):
+            yield chunk
+
+
+def _archived_rows(path: str, user_id: int) -> List[ExportRow]:
+    """Записи пользователя из одного архивного файла (один месяц)"""
+    return [
+        (row["date"], row["product_name"], row["grams"], row["calories"])
+        for row in read_user_rows(path, user_id)
+    ]
+
+
+async def iter_user_meals(
+    session: AsyncSession,
+    user_id: int,
+    archive_dir: str = ARCHIVE_DIR
+) -> AsyncIterator[List[ExportRow]]:
+    """
+    Записи пользователя по порядку пачками: сначала архив, затем meals
+
+    Args:
+        session: сессия БД
+        user_id: ID пользователя в БД
+        archive_dir: каталог архивных файлов
+    """
+    loop = asyncio.get_running_loop()
+    watermark = await session.scalar(select(Meta.value).where(Meta.key == ARCHIVE_WATERMARK_KEY))
+    archived_through = date.fromisoformat(watermark) if watermark else date.min
+
+    if watermark and os.path.isdir(archive_dir):
+        for name in sorted(os.listdir(archive_dir)):
+            match = _ARCHIVE_NAME_RE.fullmatch(name)
+            # Файл месяца после отметки — от прерванной архивации, эти строки ещё в meals
+            if match is None or date(int(match[1]), int(match[2]), 1) > archived_through:
+                continue
+            rows = await loop.run_in_executor(None, _archived_rows, os.path.join(archive_dir, name), user_id)
+            if rows:
+                yield rows
+
+    # Строки не позже отметки уже в архиве, даже если ещё не удалены из meals
+    result = await session.stream(
+        select(Meal.date, Meal.name, Meal.grams, Meal.calories)
+        .where(Meal.user_id == user_id, Meal.date > archived_through)
+        .order_by(Meal.date, Meal.id)
+        .execution_options(yield_per=CHUNK_SIZE)
+    )
+    async for partition in result.partitions():
+        yield [(row.date.isoformat(), row.name, row.grams, row.calories) for row in partition]
+
+
+def _encode(rows: List[ExportRow], file_format: str) -> bytes:
+    if file_format == "jsonl":
+        return "".join(
+            json.dumps(
+                {"date": day, "product": product, "grams": grams, "calories": round(calories, 2)},
+                ensure_ascii=False
+            ) + "\n"
+            for day, product, grams, calories in rows
+        ).encode()
+
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(
+        (day, product, grams, round(calories, 2)) for day, product, grams, calories in rows
+    )
+    return buffer.getvalue().encode()
+
+
+async def write_export(
+    session: AsyncSession,
+    user_id: int,
+    file_format: str = "csv",
+    archive_dir: str = ARCHIVE_DIR
+) -> Tuple[SpooledTemporaryFile, int]:
+    """
+    Записать историю пользователя в сжатый временный файл
+
+    Returns:
+        (файл, открытый на чтение с начала; число записей)
+    """
+    loop = asyncio.get_running_loop()
+    spool = SpooledTemporaryFile(max_size=EXPORT_SPOOL_MAX_BYTES)
+    count = 0
+    try:
+        with gzip.GzipFile(fileobj=spool, mode="wb") as compressed:
+            if file_format == "csv":
+                compressed.write((",".join(CSV_HEADER) + "\r\n").encode())
+            async for rows in iter_user_meals(session, user_id, archive_dir):
+                # Кодирование и сжатие — в пуле потоков
+                data = await loop.run_in_executor(None, _encode, rows, file_format)
+                await loop.run_in_executor(None, compressed.write, data)
+                count += len(rows)
+    except BaseException:
+        spool.close()
+        raise
+    spool.seek(0)
+    return spool, count
+
+
+class ExportLimiter:
+    """Ограничение одновременных выгрузок: всего и по одной на пользователя"""
+
+    def __init__(self, max_concurrent: int):
+        self._slots = asyncio.Semaphore(max_concurrent)
+        self._users: Set[int] = set()
+
+    @asynccontextmanager
+    async def slot(self, user_id: int):
+        # Не ставим в очередь: пользователь сразу узнает, что нужно подождать
+        if user_id in self._users or self._slots.locked():
+            raise ExportBusy()
+        await self._slots.acquire()
+        self._users.add(user_id)
+        try:
+            yield
+        finally:
+            self._users.discard(user_id)
+            self._slots.release()
+
+
+export_limiter = ExportLimiter(EXPORT_MAX_CONCURRENT)
+
+
+def export_filename(file_format: str, today: Optional[date] = None) -> str:
+    return f"calories_{(today or date.today()).isoformat()}.{file_format}.gz"
@@ -0,0 +1,178 @@
+"""
+Избранное: продукты и порции, которые пользователь добавляет чаще всего
+
+Таблица portions обновляется в той же транзакции, что и записи в meals
+(services.meals.insert_meals): для каждой пары продукт × граммы хранится
+число добавлений и день последнего. Вес порции убывает вдвое за каждые
+HALF_LIFE_DAYS дней без использования, поэтому наверху оказываются и
+частые, и недавние продукты. Порции пользователя держатся в LRU-кэше и
+обновляются в нём при добавлении, так что клавиатура быстрого добавления
+обычно строится без запросов к БД. Кэш — только подсказка: если
+транзакция с записью откатилась, порция в нём всё равно учтена.
+"""
+from collections import Counter, OrderedDict
+from datetime import date
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from config import QUICK_ADD_SIZE, FAVORITES_CACHE_SIZE
+from database.models import Portion
+
+# За столько дней без использования вес порции уменьшается вдвое
+HALF_LIFE_DAYS = 14
+
+# Сколько порций пользователя держать в кэше: больше, чем кнопок на клавиатуре,
+# чтобы порция могла подняться наверх после нескольких добавлений
+CANDIDATES = 32
+
+# Сколько последних порций читать из БД при заполнении кэша
+LOAD_LIMIT = 200
+
+
+class FavoritePortion(NamedTuple):
+    product_id: int
+    grams: int
+    uses: int
+    last_used: date
+
+    def score(self, today: date) -> float:
+        return self.uses * 0.5 ** ((today - self.last_used).days / HALF_LIFE_DAYS)
+
+
+def rank_portions(portions: Iterable[FavoritePortion], today: date, limit: int) -> List[FavoritePortion]:
+    """Самая весомая порция каждого продукта, по убыванию веса"""
+    best: Dict[int, FavoritePortion] = {}
+    for portion in sorted(portions, key=lambda portion: portion.score(today), reverse=True):
+        best.setdefault(portion.product_id, portion)
+    return list(best.values())[:limit]
+
+
+class FavoritesCache:
+    """LRU-кэш порций по id пользователя в БД"""
+
+    def __init__(self, maxsize: int, candidates: int = CANDIDATES):
+        self.maxsize = maxsize
+        self.candidates = candidates
+        self._items: "OrderedDict[int, Dict[Tuple[int, int], FavoritePortion]]" = OrderedDict()
+
+    def get(self, user_id: int) -> Optional[List[FavoritePortion]]:
+        portions = self._items.get(user_id)
+        if portions is None:
+            return None
+        self._items.move_to_end(user_id)
+        return list(portions.values())
+
+    def put(self, user_id: int, portions: Iterable[FavoritePortion]):
+        self._items[user_id] = {(portion.product_id, portion.grams): portion for portion in portions}
+        self._items.move_to_end(user_id)
+        self._trim(user_id)
+        if len(self._items) > self.maxsize:
+            self._items.popitem(last=False)
+
+    def record(self, user_id: int, product_id: int, grams: int, day: date):
+        """Учесть добавление, если порции пользователя уже в кэше"""
+        portions = self._items.get(user_id)
+        if portions is None:
+            return
+        current = portions.get((product_id, grams))
+        uses = current.uses + 1 if current else 1
+        last_used = max(current.last_used, day) if current else day
+        portions[(product_id, grams)] = FavoritePortion(product_id, grams, uses, last_used)
+        self._trim(user_id)
+
+    def _trim(self, user_id: int):
+        portions = self._items[user_id]
+        if len(portions) > self.candidates:
+            today = date.today()
+            kept = sorted(portions.values(), key=lambda portion: portion.score(today), reverse=True)[:self.candidates]
+            self._items[user_id] = {(portion.product_id, portion.grams): portion for portion in kept}
+
+    def invalidate(self, user_id: int):
+        self._items.pop(user_id, None)
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+
+favorites_cache = FavoritesCache(FAVORITES_CACHE_SIZE)
+
+
+async def record_portions(session: AsyncSession, entries: list):
+    """
+    Учесть добавленные записи в portions (в текущей транзакции) и в кэше
+
+    Args:
+        session: сессия БД
+        entries: записи MealEntry
+    """
+    # Блюда пользователя в избранное не попадают: порции хранятся по продуктам каталога
+    entries = [entry for entry in entries if entry.product_id is not None]
+    if not entries:
+        return
+    stmt = insert(Portion)
+    await session.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[Portion.user_id, Portion.product_id, Portion.grams],
+            set_={
+                "uses": Portion.uses + stmt.excluded.uses,
+                "last_used": func.max(Portion.last_used, stmt.excluded.last_used),
+            }
+        ),
+        [
+            {"user_id": entry.user_id, "product_id": entry.product_id, "grams": entry.grams, "uses": 1, "last_used": entry.date}
+            for entry in entries
+        ]
+    )
+    for entry in entries:
+        favorites_cache.record(entry.user_id, entry.product_id, entry.grams, entry.date)
+
+
+async def unrecord_portions(session: AsyncSession, user_id: int, portions: Iterable[Tuple[Optional[int], int]]):
+    """
+    Не учитывать удалённые записи в portions (в текущей транзакции)
+
+    Args:
+        session: сессия БД
+        user_id: ID пользователя в БД
+        portions: пары (id продукта, граммы) удалённых записей; записи блюд (id None) пропускаются
+    """
+    counts = Counter((product_id, grams) for product_id, grams in portions if product_id is not None)
+    if not counts:
+        return
+    for (product_id, grams), count in counts.items():
+        of_portion = (Portion.user_id == user_id, Portion.product_id == product_id, Portion.grams == grams)
+        await session.execute(update(Portion).where(*of_portion).values(uses=Portion.uses - count))
+    await session.execute(delete(Portion).where(Portion.user_id == user_id, Portion.uses <= 0))
+    # День последнего использования не восстановить, проще перечитать порции из БД
+    favorites_cache.invalidate(user_id)
+
+
+async def get_favorites(session: AsyncSession, user_id: int, limit: int = QUICK_ADD_SIZE) -> List[FavoritePortion]:
+    """
+    Обычные порции продуктов, которые пользователь добавляет чаще всего
+
+    Args:
+        session: сессия БД (нужна, только если порций нет в кэше)
+        user_id: ID пользователя в БД
+        limit: максимальное количество продуктов
+
+    Returns:
+        по одной порции на продукт, самые весомые первыми
+    """
+    portions = favorites_cache.get(user_id)
+    if portions is None:
+        result = await session.execute(
+            select(Portion.product_id, Portion.grams, Portion.uses, Portion.last_used)
+            .where(Portion.user_id == user_id)
+            .order_by(Portion.last_used.desc())
+            .limit(LOAD_LIMIT)
+        )
+        portions = [FavoritePortion(*row) for row in result]
+        favorites_cache.put(user_id, portions)
+    return rank_portions(portions, date.today(), limit)
+
+
+async def forget_products(session: AsyncSession, product_ids: List[int]):
+    """Удалить порции продуктов, которые удаляются из каталога (в текущей транзакции)"""
+    await session.execute(delete(Portion).where(Portion.product_id.in_(product_ids)))
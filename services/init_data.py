@@ -1,44 +1,108 @@
+import hashlib
 import json
+import logging
 import os
-from sqlalchemy import select
+import time
+from sqlalchemy import select, delete
+from sqlalchemy.dialects.sqlite import insert
 from sqlalchemy.ext.asyncio import AsyncSession
-from database.models import Product
+from database.models import Product, Meta
+from services.meals import snapshot_meal_names
+from services.favorites import forget_products
+from services.recipes import refresh_recipes, detach_products
+from services.product_search import bump_catalog_version
+
+logger = logging.getLogger(__name__)
+
+CATALOG_HASH_KEY = "catalog_hash"
+SEED_SOURCE = "seed"
+
+# Размер пачки для массовых upsert/delete
+BATCH_SIZE = 500
+
+
+def _batches(items: list, size: int = BATCH_SIZE):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
 
 
 async def load_products(session: AsyncSession):
-    """Загрузить продукты из JSON файла в базу данных"""
+    """
+    Синхронизировать каталог продуктов с JSON файлом
+
+    Если хэш файла совпадает с сохранённым, ничего не делает.
+    Иначе применяет только разницу: новые продукты, изменённую
+    калорийность и удалённые позиции. Продукты из импорта
+    (services.catalog_import) не удаляются; совпавший по названию
+    импортированный продукт переходит в seed.
+    """
     json_path = os.path.join("data", "products.json")
 
     if not os.path.exists(json_path):
-        print("⚠️ Файл products.json не найден")
+        logger.warning("⚠️ Файл products.json не найден")
         return
 
-    with open(json_path, "r", encoding="utf-8") as f:
-        products_data = json.load(f)
+    started = time.perf_counter()
 
-    loaded_count = 0
-    skipped_count = 0
+    with open(json_path, "rb") as f:
+        raw = f.read()
+    content_hash = hashlib.sha256(raw).hexdigest()
 
-    for item in products_data:
-        # Проверяем, есть ли уже такой продукт
+    stored_hash = await session.scalar(
+        select(Meta.value).where(Meta.key == CATALOG_HASH_KEY)
+    )
+    if stored_hash == content_hash:
+        logger.info("⏭️ Каталог не изменился, синхронизация пропущена")
+        return
+
+    # Последнее вхождение названия в файле побеждает
+    source = {item["name"]: item["kcal_per_100g"] for item in json.loads(raw)}
+
+    result = await session.execute(
+        select(Product.name, Product.kcal_per_100g, Product.id).where(Product.source == SEED_SOURCE)
+    )
+    rows = result.all()
+    existing = {row.name: row.kcal_per_100g for row in rows}
+    ids = {row.name: row.id for row in rows}
+
+    inserted = [name for name in source if name not in existing]
+    updated = [name for name in source if name in existing and existing[name] != source[name]]
+    removed = [name for name in existing if name not in source]
+
+    for batch in _batches(inserted + updated):
+        stmt = insert(Product).values(
+            [{"name": name, "kcal_per_100g": source[name], "source": SEED_SOURCE} for name in batch]
+        )
         result = await session.execute(
-            select(Product).where(Product.name == item["name"])
+            stmt.on_conflict_do_update(
+                index_elements=[Product.name],
+                set_={"kcal_per_100g": stmt.excluded.kcal_per_100g, "source": stmt.excluded.source}
+            ).returning(Product.id)
         )
-        existing = result.scalar_one_or_none()
-
-        if existing:
-            skipped_count += 1
-            continue
+        # Новое название могло совпасть с импортированным продуктом с другой калорийностью
+        await refresh_recipes(session, result.scalars().all())
 
-        # Добавляем новый продукт
-        product = Product(
-            name=item["name"],
-            kcal_per_100g=item["kcal_per_100g"]
+    for batch in _batches(removed):
+        # В истории остаётся название удалённого продукта
+        await snapshot_meal_names(session, [ids[name] for name in batch], detach=True)
+        await forget_products(session, [ids[name] for name in batch])
+        await detach_products(session, [ids[name] for name in batch])
+        await session.execute(
+            delete(Product).where(Product.name.in_(batch), Product.source == SEED_SOURCE)
         )
-        session.add(product)
-        loaded_count += 1
 
+    stmt = insert(Meta).values(key=CATALOG_HASH_KEY, value=content_hash)
+    await session.execute(
+        stmt.on_conflict_do_update(index_elements=[Meta.key], set_={"value": stmt.excluded.value})
+    )
+    await bump_catalog_version(session)
     await session.commit()
 
-    print(f"✅ Загружено продуктов: {loaded_count}")
-    print(f"⏭️ Пропущено (уже существуют): {skipped_count}")
\ No newline at end of file
+    logger.info(
+        "✅ Каталог синхронизирован за %.2f с: добавлено %d, обновлено %d, удалено %d, без изменений %d",
+        time.perf_counter() - started,
+        len(inserted),
+        len(updated),
+        len(removed),
+        len(source) - len(inserted) - len(updated)
+    )
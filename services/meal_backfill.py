@@ -0,0 +1,137 @@
+"""
+Фоновый перенос старых записей meals в компактный формат
+
+Миграция m0004 переименовала старую таблицу в meals_legacy и сразу
+перенесла записи последних дней. Остальные строки переносятся пачками
+по id: пачка копируется в meals и удаляется из meals_legacy одной короткой
+транзакцией, поэтому перенос можно прервать и продолжить в любой момент,
+а освободившиеся страницы сразу занимает новая таблица. Пока перенос не
+закончен, проверка итогов дней, архивация и выгрузка истории ждут: часть
+истории ещё в старой таблице. Статистика и графики читают daily_summaries
+и работают как обычно.
+
+Запуск вручную (например, в режиме шардирования):
+    python -m services.meal_backfill --vacuum
+"""
+import argparse
+import asyncio
+import logging
+import time
+from typing import Optional, Union
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine, AsyncSession
+from database.db import engine
+from database.migrations.m0004_compact_meals import LEGACY_TABLE, copy_legacy_meals
+
+logger = logging.getLogger(__name__)
+
+# Строк за одну транзакцию
+BATCH_SIZE = 2000
+
+# Как часто писать в лог о ходе переноса (в пачках)
+LOG_EVERY = 100
+
+
+async def legacy_meals_pending(conn: Union[AsyncConnection, AsyncSession]) -> bool:
+    """Остались ли записи в старом формате"""
+    found = await conn.scalar(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+        {"name": LEGACY_TABLE}
+    )
+    return found is not None
+
+
+async def backfill_meals(engine: AsyncEngine, batch_size: int = BATCH_SIZE) -> int:
+    """
+    Перенести все записи из meals_legacy и удалить её
+
+    Args:
+        engine: движок для записи
+        batch_size: строк за одну транзакцию
+
+    Returns:
+        число перенесённых строк
+    """
+    started = time.perf_counter()
+    moved = batches = 0
+    while True:
+        async with engine.begin() as conn:
+            if not await legacy_meals_pending(conn):
+                return moved
+            # Верхняя граница пачки: batch_size-я строка или последняя
+            upper = await conn.scalar(
+                text(f"SELECT id FROM {LEGACY_TABLE} ORDER BY id LIMIT 1 OFFSET :offset"),
+                {"offset": batch_size - 1}
+            )
+            if upper is None:
+                upper = await conn.scalar(text(f"SELECT max(id) FROM {LEGACY_TABLE}"))
+            if upper is None:
+                await conn.execute(text(f"DROP TABLE {LEGACY_TABLE}"))
+                logger.info("✅ Записи перенесены в компактный формат: %d за %.1f с", moved, time.perf_counter() - started)
+                return moved
+            moved += await conn.run_sync(copy_legacy_meals, "legacy.id <= :upper", {"upper": upper})
+
+        batches += 1
+        if batches % LOG_EVERY == 0:
+            logger.info("🔄 Перенос записей в компактный формат: %d", moved)
+        # Даём обработчикам взять соединение записи между пачками
+        await asyncio.sleep(0)
+
+
+class MealBackfill:
+    """Перенос записей в фоне; задача завершается, когда переносить нечего"""
+
+    def __init__(self, engine: AsyncEngine):
+        self.engine = engine
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        if not self.running:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if not self.running:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self):
+        try:
+            await backfill_meals(self.engine)
+        except Exception:
+            logger.exception("❌ Перенос записей в компактный формат не удался, продолжится при следующем запуске")
+
+
+# Запускается при старте бота
+meal_backfill = MealBackfill(engine)
+
+
+async def _main(vacuum: bool):
+    from database.db import init_db, close_db
+
+    await init_db()
+    try:
+        moved = await backfill_meals(engine)
+        if vacuum:
+            # Вернуть освободившееся место на диск; база на это время заблокирована
+            async with engine.connect() as conn:
+                conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+                await conn.exec_driver_sql("VACUUM")
+    finally:
+        await close_db()
+    print(f"Перенесено записей: {moved}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--vacuum", action="store_true", help="после переноса сжать файл базы")
+    asyncio.run(_main(parser.parse_args().vacuum))
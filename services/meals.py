@@ -0,0 +1,231 @@
+import asyncio
+import logging
+from datetime import date
+from typing import List, NamedTuple, Optional, Tuple
+from sqlalchemy import select, update, func
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from config import MEAL_WRITE_WINDOW_MS, MEAL_WRITE_QUEUE_SIZE
+from database.db import async_session_maker
+from database.models import CALORIES_SCALE, Meal, Product
+from services.daily_summary import add_meal_to_summary
+from services.favorites import record_portions
+
+logger = logging.getLogger(__name__)
+
+
+class MealEntry(NamedTuple):
+    """Запись о приёме пищи, готовая к сохранению"""
+    user_id: int
+    product_id: Optional[int]
+    grams: int
+    calories: float
+    date: date
+    goal: int
+    # Для блюда пользователя (product_id None) — его название
+    product_name: Optional[str] = None
+
+
+async def insert_meal(session: AsyncSession, entry: MealEntry) -> float:
+    """
+    Добавить запись и учесть её в итогах дня (в текущей транзакции)
+
+    Returns:
+        сумма калорий пользователя за день после добавления
+    """
+    return await insert_meals(session, [entry])
+
+
+async def insert_meals(session: AsyncSession, entries: List[MealEntry]) -> float:
+    """
+    Добавить несколько записей одного пользователя за один день
+
+    Итоги дня обновляются одним запросом на все записи, вместе с ними
+    учитываются порции для быстрого добавления (в текущей транзакции).
+
+    Returns:
+        сумма калорий пользователя за день после добавления
+    """
+    first = entries[0]
+    meals = [
+        Meal(
+            user_id=entry.user_id,
+            product_id=entry.product_id,
+            product_name=entry.product_name,
+            grams=entry.grams,
+            calories_x100=round(entry.calories * CALORIES_SCALE),
+            date=entry.date
+        )
+        for entry in entries
+    ]
+    session.add_all(meals)
+    summary = await add_meal_to_summary(
+        session,
+        first.user_id,
+        first.date,
+        sum(meal.calories_x100 for meal in meals),
+        first.goal,
+        items=len(entries)
+    )
+    await record_portions(session, entries)
+    return summary.calories
+
+
+async def snapshot_meal_names(session: AsyncSession, product_ids: List[int], detach: bool = False):
+    """
+    Сохранить в записях текущее название продуктов (в текущей транзакции)
+
+    Вызывается перед переименованием или удалением продукта из каталога,
+    чтобы в истории осталось название, под которым продукт был добавлен.
+
+    Args:
+        session: сессия БД
+        product_ids: ID продуктов
+        detach: продукты удаляются — убрать ссылку на них
+    """
+    values = {
+        "product_name": func.coalesce(
+            Meal.product_name,
+            select(Product.name).where(Product.id == Meal.product_id).scalar_subquery()
+        )
+    }
+    if detach:
+        values["product_id"] = None
+    # Индекса по product_id нет: каталог меняется редко, а индекс занял бы место в каждой записи
+    await session.execute(update(Meal).where(Meal.product_id.in_(product_ids)).values(values))
+
+
+class MealWriter:
+    """
+    Групповая запись приёмов пищи
+
+    Записи от разных пользователей копятся в ограниченной очереди несколько
+    миллисекунд и сохраняются одной транзакцией — один fsync на пачку вместо
+    одного на запись. submit() возвращает управление только после коммита,
+    поэтому пользователь получает подтверждение, когда запись уже на диске.
+    Если очередь заполнена, submit() ждёт (обратное давление).
+    """
+
+    def __init__(
+        self,
+        session_maker: async_sessionmaker,
+        window: float = 0.005,
+        max_batch: int = 256,
+        max_queue: int = 1024
+    ):
+        self.session_maker = session_maker
+        self.window = window
+        self.max_batch = max_batch
+        self._queue: "asyncio.Queue[Optional[Tuple[MealEntry, asyncio.Future]]]" = asyncio.Queue(max_queue)
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        """Запустить фоновую запись"""
+        if not self.running:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Дописать всё, что уже в очереди, и остановиться"""
+        if not self.running:
+            return
+        await self._queue.put(None)
+        await self._task
+        self._task = None
+
+    async def submit(self, entry: MealEntry) -> float:
+        """
+        Поставить запись в очередь и дождаться её коммита
+
+        Returns:
+            сумма калорий пользователя за день после добавления
+        """
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((entry, future))
+        return await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        stopping = False
+
+        while not stopping:
+            item = await self._queue.get()
+            if item is None:
+                break
+
+            batch = [item]
+            deadline = loop.time() + self.window
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                try:
+                    if timeout <= 0:
+                        item = self._queue.get_nowait()
+                    else:
+                        item = await asyncio.wait_for(self._queue.get(), timeout)
+                except (asyncio.QueueEmpty, asyncio.TimeoutError):
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            await self._flush(batch)
+
+        # Остановка: дописываем то, что успели положить после сигнала
+        while not self._queue.empty():
+            item = self._queue.get_nowait()
+            if item is not None:
+                await self._flush([item])
+
+    async def _flush(self, batch: List[Tuple[MealEntry, asyncio.Future]]):
+        try:
+            async with self.session_maker() as session:
+                totals = [await insert_meal(session, entry) for entry, _ in batch]
+                await session.commit()
+        except Exception as error:
+            if len(batch) == 1:
+                logger.exception("Не удалось сохранить запись %s", batch[0][0])
+                future = batch[0][1]
+                if not future.done():
+                    future.set_exception(error)
+                return
+            # Одна плохая запись не должна ронять всю пачку: повторяем по одной
+            logger.warning("Групповая запись не удалась, повтор по одной (%d записей)", len(batch))
+            for item in batch:
+                await self._flush([item])
+            return
+
+        for (_, future), total in zip(batch, totals):
+            if not future.done():
+                future.set_result(total)
+
+
+# Общий писатель; запускается при старте бота, если включён MEAL_WRITE_BEHIND
+meal_writer = MealWriter(
+    async_session_maker,
+    window=MEAL_WRITE_WINDOW_MS / 1000,
+    max_queue=MEAL_WRITE_QUEUE_SIZE
+)
+
+
+async def save_meal(session: AsyncSession, entry: MealEntry) -> float:
+    """
+    Сохранить запись: групповой записью, если она запущена, иначе сразу в сессии обработчика
+
+    Перед групповой записью сессия обработчика закрывается: у пула записи одно
+    соединение, и сессия, которая уже читала (например, пользователя не из кэша),
+    держала бы его, пока писатель ждёт то же соединение. Несохранённых
+    изменений в сессии к этому моменту быть не должно.
+
+    Returns:
+        сумма калорий пользователя за день после добавления
+    """
+    if meal_writer.running:
+        await session.close()
+        return await meal_writer.submit(entry)
+
+    today_calories = await insert_meal(session, entry)
+    await session.commit()
+    return today_calories
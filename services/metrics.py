@@ -0,0 +1,241 @@
+"""
+Метрики бота в формате Prometheus
+
+Middleware диспетчера измеряет время обработки апдейта по обработчикам,
+считает ошибки, переходы FSM и апдейты в обработке. Хуки SQLAlchemy
+считают запросы и их время для каждого апдейта. Всё это подключается
+только при заданном METRICS_PORT; без него бот работает без накладных
+расходов.
+"""
+import contextvars
+import time
+from bisect import bisect_left
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _format_labels(names: Iterable[str], values: Iterable[str]) -> str:
+    pairs = ",".join(f'{name}="{_escape(str(value))}"' for name, value in zip(names, values))
+    return f"{{{pairs}}}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    """Счётчик, который только растёт"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(labels, 0)
+
+    def render(self) -> List[str]:
+        return self.header() + [
+            f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+            for labels, value in self._values.items()
+        ]
+
+
+class Gauge(Counter):
+    """Значение, которое может расти и уменьшаться"""
+
+    kind = "gauge"
+
+    def dec(self, *labels: str, amount: float = 1):
+        self.inc(*labels, amount=-amount)
+
+    def set(self, value: float, *labels: str):
+        self._values[labels] = value
+
+    def render(self) -> List[str]:
+        if not self._values and not self.labelnames:
+            self._values[()] = 0
+        return super().render()
+
+
+class Histogram(_Metric):
+    """Гистограмма с фиксированными границами корзин"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # По меткам: количество в каждой корзине (последняя — +Inf), сумма
+        self._counts: Dict[LabelValues, List[int]] = {}
+        self._sums: Dict[LabelValues, float] = {}
+
+    def observe(self, value: float, *labels: str):
+        counts = self._counts.get(labels)
+        if counts is None:
+            counts = self._counts[labels] = [0] * (len(self.buckets) + 1)
+            self._sums[labels] = 0.0
+        counts[bisect_left(self.buckets, value)] += 1
+        self._sums[labels] += value
+
+    def count(self, *labels: str) -> int:
+        return sum(self._counts.get(labels, ()))
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        bounds = [_format_value(bound) for bound in self.buckets] + ["+Inf"]
+        bucket_labels = self.labelnames + ("le",)
+        for labels, counts in self._counts.items():
+            cumulative = 0
+            for bound, count in zip(bounds, counts):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_format_labels(bucket_labels, labels + (bound,))} {cumulative}")
+            label_text = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_text} {_format_value(self._sums[labels])}")
+            lines.append(f"{self.name}_count{label_text} {cumulative}")
+        return lines
+
+
+class Registry:
+    """Набор метрик процесса"""
+
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+
+    def register(self, metric: _Metric) -> Any:
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        """Метрики в текстовом формате Prometheus"""
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+updates_in_flight = registry.register(Gauge(
+    "bot_updates_in_flight", "Updates being processed right now"
+))
+update_duration = registry.register(Histogram(
+    "bot_update_duration_seconds", "Update processing time by handler", ("handler",)
+))
+update_errors = registry.register(Counter(
+    "bot_update_errors_total", "Updates that raised an exception", ("handler", "error")
+))
+fsm_transitions = registry.register(Counter(
+    "bot_fsm_transitions_total", "FSM state changes", ("from_state", "to_state")
+))
+update_queries = registry.register(Histogram(
+    "bot_update_sql_queries", "SQL statements per update by handler", ("handler",), buckets=QUERY_BUCKETS
+))
+update_sql_duration = registry.register(Histogram(
+    "bot_update_sql_duration_seconds", "Total SQL time per update by handler", ("handler",)
+))
+
+
+class _UpdateMetrics:
+    """Метрики апдейта, который сейчас обрабатывается"""
+
+    __slots__ = ("handler", "queries", "sql_seconds")
+
+    def __init__(self):
+        self.handler = "unhandled"
+        self.queries = 0
+        self.sql_seconds = 0.0
+
+
+_current: contextvars.ContextVar[Optional[_UpdateMetrics]] = contextvars.ContextVar("metrics_update", default=None)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("metrics_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info["metrics_started"].pop()
+    current = _current.get()
+    if current is not None:
+        current.queries += 1
+        current.sql_seconds += time.perf_counter() - started
+
+
+def _handle_error(exception_context):
+    # Запрос упал: after_cursor_execute не будет, снимаем отметку времени
+    conn = exception_context.connection
+    if conn is not None and conn.info.get("metrics_started"):
+        conn.info["metrics_started"].pop()
+
+
+def instrument_engine(engine: AsyncEngine):
+    """Подключить подсчёт запросов и их времени к движку"""
+    sync_engine = engine.sync_engine
+    if event.contains(sync_engine, "after_cursor_execute", _after_cursor_execute):
+        return
+    event.listen(sync_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(sync_engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(sync_engine, "handle_error", _handle_error)
+
+
+async def metrics_middleware(handler, event, data):
+    """Outer middleware апдейта: время, ошибки, SQL и переходы FSM"""
+    current = _UpdateMetrics()
+    token = _current.set(current)
+    state = data.get("state")
+    state_before = data.get("raw_state")
+
+    updates_in_flight.inc()
+    started = time.perf_counter()
+    try:
+        return await handler(event, data)
+    except Exception as e:
+        update_errors.inc(current.handler, type(e).__name__)
+        raise
+    finally:
+        update_duration.observe(time.perf_counter() - started, current.handler)
+        update_queries.observe(current.queries, current.handler)
+        update_sql_duration.observe(current.sql_seconds, current.handler)
+        updates_in_flight.dec()
+        _current.reset(token)
+
+        if state is not None:
+            state_after = await state.get_state()
+            if state_after != state_before:
+                fsm_transitions.inc(state_before or "none", state_after or "none")
+
+
+async def handler_name_middleware(handler, event, data):
+    """Inner middleware: запоминает, какой обработчик выбран для апдейта"""
+    current = _current.get()
+    if current is not None:
+        callback = data["handler"].callback
+        current.handler = f"{callback.__module__.rsplit('.', 1)[-1]}.{callback.__name__}"
+    return await handler(event, data)
@@ -1,5 +1,33 @@
 import re
-from typing import Optional, Dict
+from typing import Optional, Dict, List
+
+# Шаблоны компилируются один раз при импорте модуля
+_COMMAND_RE = re.compile(r'^/add(?:@\w+)?(?:\s+|$)', re.IGNORECASE)
+# Название продукта + число + опционально единицы измерения.
+# Жадный захват названия сразу откатывается к последнему числу в строке
+_ITEM_RE = re.compile(r'^(.*\S)\s+(\d+)\s*(?:г|гр|грамм|граммов)?\.?$', re.IGNORECASE)
+# Позиции в одной строке разделяются запятой, точкой с запятой или переносом строки
+_SEPARATOR_RE = re.compile(r'\s*[,;\n]\s*')
+
+# Больше позиций в одном сообщении не принимаем
+MAX_ITEMS = 20
+
+
+def _parse_item(text: str) -> Optional[Dict[str, any]]:
+    match = _ITEM_RE.match(text)
+    if match is None:
+        return None
+    return {
+        "product": match.group(1).strip().lower(),
+        "grams": int(match.group(2))
+    }
+
+
+def _strip_command(text: str) -> str:
+    text = text.strip()
+    if text[:1] == '/':
+        text = _COMMAND_RE.sub('', text, count=1)
+    return text
 
 
 def parse_meal_input(text: str) -> Optional[Dict[str, any]]:
@@ -19,23 +47,30 @@ def parse_meal_input(text: str) -> Optional[Dict[str, any]]:
     Returns:
         dict с ключами 'product' и 'grams' или None
     """
-    # Убираем команду /add если есть
-    text = text.strip()
-    if text.lower().startswith('/add'):
-        text = text[4:].strip()
+    return _parse_item(_strip_command(text))
 
-    # Паттерн: название продукта + число + опционально единицы измерения
-    # Ищем последнее число в строке
-    pattern = r'^(.+?)\s+(\d+)\s*(?:г|гр|грамм|граммов)?\.?$'
-    match = re.match(pattern, text, re.IGNORECASE)
 
-    if match:
-        product_name = match.group(1).strip().lower()
-        grams = int(match.group(2))
+def parse_meal_items(text: str) -> Optional[List[Dict[str, any]]]:
+    """
+    Парсит строку с одним или несколькими продуктами
+
+    Например: "яблоко 150, банан 120г; рис 200" или "/add рис 200".
+    Строка принимается, только если разобрана каждая позиция.
 
-        return {
-            "product": product_name,
-            "grams": grams
-        }
+    Args:
+        text: входная строка от пользователя
+
+    Returns:
+        список dict с ключами 'product' и 'grams' или None
+    """
+    parts = [part for part in _SEPARATOR_RE.split(_strip_command(text)) if part]
+    if not parts or len(parts) > MAX_ITEMS:
+        return None
 
-    return None
\ No newline at end of file
+    items = []
+    for part in parts:
+        item = _parse_item(part)
+        if item is None:
+            return None
+        items.append(item)
+    return items
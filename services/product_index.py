@@ -0,0 +1,282 @@
+import bisect
+import difflib
+import heapq
+import itertools
+import time
+from array import array
+from collections import Counter, OrderedDict
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set
+
+
+class IndexedProduct(NamedTuple):
+    """Продукт из каталога, загруженный в память"""
+    id: int
+    name: str
+    kcal_per_100g: int
+
+
+# Сколько кандидатов отбираем по триграммам перед точным переранжированием
+CANDIDATE_LIMIT = 200
+
+# Триграммы, которые встречаются в большей доле каталога, почти ничего не говорят
+# о названии, поэтому учитываем их только если редких триграмм не хватило
+FREQUENT_TRIGRAM_SHARE = 0.05
+
+# Сколько продуктов хранить для подсказки по префиксу (больше Telegram не покажет)
+COMPLETION_LIMIT = 50
+
+# Префиксы, под которые подходит больше продуктов, получают готовый список лучших
+# при построении; для остальных лучшие выбираются перебором диапазона при запросе
+DENSE_PREFIX_SIZE = 1000
+
+# Сколько ответов по префиксам держать в кэше
+COMPLETION_CACHE_SIZE = 10000
+
+# Больше любого символа в названиях: граница диапазона по префиксу
+_PREFIX_END = "\U0010ffff"
+
+
+def _trigrams(text: str) -> Set[str]:
+    """Множество триграмм строки с отступами по краям"""
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def normalize_prefix(text: str) -> str:
+    """Префикс для поиска: нижний регистр, слова через один пробел"""
+    words = text.lower().split()
+    query = " ".join(words)
+    # Пробел в конце значит, что слово дописано: «рис » не подходит к «рисовая каша»
+    return query + " " if words and text[-1:].isspace() else query
+
+
+class _Snapshot:
+    """
+    Неизменяемый срез каталога: словари для точного поиска, триграммный
+    индекс и префиксный индекс (названия по алфавиту и ранг популярности)
+
+    Вместе со срезом живёт кэш ответов по префиксам: при подмене среза
+    он сбрасывается вместе с ним.
+    """
+
+    __slots__ = (
+        "products", "by_name", "by_id", "postings", "gram_counts",
+        "names", "ranks", "by_rank", "dense", "completions", "version", "built_at"
+    )
+
+    def __init__(
+        self,
+        products: Iterable[IndexedProduct],
+        popularity: Optional[Dict[int, int]] = None,
+        version: Optional[str] = None
+    ):
+        self.products: List[IndexedProduct] = []
+        self.by_name: Dict[str, IndexedProduct] = {}
+        self.by_id: Dict[int, IndexedProduct] = {}
+        self.postings: Dict[str, array] = {}
+        self.gram_counts: array = array("H")
+
+        for product in products:
+            position = len(self.products)
+            self.products.append(product)
+            self.by_name[product.name] = product
+            self.by_id[product.id] = product
+
+            grams = _trigrams(product.name)
+            self.gram_counts.append(min(len(grams), 0xFFFF))
+            for gram in grams:
+                posting = self.postings.get(gram)
+                if posting is None:
+                    posting = self.postings[gram] = array("I")
+                posting.append(position)
+
+        self.version = version
+        self.built_at = time.monotonic()
+        self.completions: "OrderedDict[str, List[IndexedProduct]]" = OrderedDict()
+        self._build_prefix_index(popularity or {})
+
+    def _build_prefix_index(self, popularity: Dict[int, int]):
+        products = self.products
+        # Ранг: популярные первыми, при равной популярности — короткие названия
+        by_rank = sorted(
+            range(len(products)),
+            key=lambda position: (-popularity.get(products[position].id, 0), len(products[position].name), products[position].name)
+        )
+        rank_of = array("I", bytes(4 * len(products)))
+        for rank, position in enumerate(by_rank):
+            rank_of[position] = rank
+        self.by_rank = array("I", by_rank)
+
+        # Названия по алфавиту: продукты с общим префиксом идут подряд
+        order = sorted(range(len(products)), key=lambda position: products[position].name)
+        self.names = [products[position].name for position in order]
+        self.ranks = array("I", (rank_of[position] for position in order))
+        self.dense: Dict[str, array] = {}
+        self._collect_dense("", 0, len(self.names))
+
+    def _collect_dense(self, prefix: str, lo: int, hi: int) -> List[int]:
+        """Лучшие ранги диапазона [lo, hi) названий с префиксом; для больших запоминаются"""
+        if hi - lo <= DENSE_PREFIX_SIZE:
+            return heapq.nsmallest(COMPLETION_LIMIT, self.ranks[lo:hi])
+
+        parts = []
+        depth = len(prefix)
+        position = lo
+        # Название, совпадающее с префиксом, стоит первым
+        if len(self.names[position]) == depth:
+            parts.append([self.ranks[position]])
+            position += 1
+        # Остальные делятся по следующей букве; границы ищем двоичным поиском
+        while position < hi:
+            child = prefix + self.names[position][depth]
+            end = bisect.bisect_left(self.names, child + _PREFIX_END, position, hi)
+            parts.append(self._collect_dense(child, position, end))
+            position = end
+
+        best = list(itertools.islice(heapq.merge(*parts), COMPLETION_LIMIT))
+        self.dense[prefix] = array("I", best)
+        return best
+
+
+class ProductIndex:
+    """
+    Индекс каталога продуктов в памяти
+
+    Обслуживает точный поиск по названию и по id, а также нечёткий поиск
+    похожих названий: кандидаты отбираются по общим триграммам, затем
+    ограниченный список переранжируется через difflib.
+    Подсказки по началу названия (inline-режим) берутся из отсортированных
+    названий: для частых префиксов лучшие по популярности продукты готовы
+    заранее, для остальных выбираются из небольшого диапазона; ответы
+    по префиксам держатся в LRU-кэше.
+    Перестроение подменяет срез целиком, поэтому читатели никогда не видят
+    наполовину построенный индекс.
+    """
+
+    def __init__(self, completion_cache_size: int = COMPLETION_CACHE_SIZE):
+        self.completion_cache_size = completion_cache_size
+        self._snapshot: Optional[_Snapshot] = None
+
+    @property
+    def ready(self) -> bool:
+        """Индекс построен и может обслуживать запросы"""
+        return self._snapshot is not None
+
+    def __len__(self) -> int:
+        snapshot = self._snapshot
+        return len(snapshot.products) if snapshot else 0
+
+    @property
+    def version(self) -> Optional[str]:
+        """Версия каталога, по которой построен индекс"""
+        snapshot = self._snapshot
+        return snapshot.version if snapshot else None
+
+    @property
+    def age(self) -> float:
+        """Сколько секунд назад построен индекс"""
+        snapshot = self._snapshot
+        return time.monotonic() - snapshot.built_at if snapshot else float("inf")
+
+    def load(
+        self,
+        products: Iterable[IndexedProduct],
+        popularity: Optional[Dict[int, int]] = None,
+        version: Optional[str] = None
+    ):
+        """
+        Построить индекс заново и атомарно подменить текущий
+
+        Args:
+            products: продукты каталога
+            popularity: сколько раз добавляли продукт, по id (для порядка подсказок)
+            version: версия каталога, по которой построен индекс
+        """
+        self._snapshot = _Snapshot(products, popularity, version)
+
+    def get(self, name: str) -> Optional[IndexedProduct]:
+        """Точный поиск по названию (в нижнем регистре)"""
+        return self._snapshot.by_name.get(name.lower())
+
+    def get_by_id(self, product_id: int) -> Optional[IndexedProduct]:
+        """Точный поиск по id"""
+        return self._snapshot.by_id.get(product_id)
+
+    def similar(self, name: str, limit: int = 5, cutoff: float = 0.6) -> List[str]:
+        """
+        Поиск похожих названий
+
+        Args:
+            name: название продукта
+            limit: максимальное количество предложений
+            cutoff: минимальная похожесть по difflib (0..1)
+
+        Returns:
+            список похожих названий, самые похожие первыми
+        """
+        snapshot = self._snapshot
+        query = name.lower()
+        query_grams = _trigrams(query)
+
+        # Сначала самые редкие триграммы: они дешевле и точнее
+        postings = sorted(
+            (snapshot.postings[gram] for gram in query_grams if gram in snapshot.postings),
+            key=len
+        )
+        if not postings:
+            return []
+
+        frequent_limit = max(CANDIDATE_LIMIT, int(len(snapshot.products) * FREQUENT_TRIGRAM_SHARE))
+        overlap = Counter()
+        for posting in postings:
+            if overlap and len(posting) > frequent_limit:
+                break
+            overlap.update(posting)
+
+        # Коэффициент Дайса по триграммам: ограниченный список лучших кандидатов
+        query_size = len(query_grams)
+        gram_counts = snapshot.gram_counts
+        best = heapq.nlargest(
+            CANDIDATE_LIMIT,
+            overlap.items(),
+            key=lambda item: item[1] / (query_size + gram_counts[item[0]])
+        )
+        candidates = [snapshot.products[position].name for position, _ in best]
+
+        return difflib.get_close_matches(query, candidates, n=limit, cutoff=cutoff)
+
+    def complete(self, prefix: str, limit: int = COMPLETION_LIMIT) -> List[IndexedProduct]:
+        """
+        Продукты, название которых начинается с префикса
+
+        Args:
+            prefix: начало названия (пустая строка — самые популярные продукты)
+            limit: максимальное количество (не больше COMPLETION_LIMIT)
+
+        Returns:
+            самые популярные первыми
+        """
+        snapshot = self._snapshot
+        query = normalize_prefix(prefix)
+        completions = snapshot.completions
+        found = completions.get(query)
+        if found is not None:
+            completions.move_to_end(query)
+            return found[:limit]
+
+        ranks = snapshot.dense.get(query)
+        if ranks is None:
+            names = snapshot.names
+            lo = bisect.bisect_left(names, query)
+            hi = bisect.bisect_left(names, query + _PREFIX_END, lo)
+            ranks = heapq.nsmallest(COMPLETION_LIMIT, snapshot.ranks[lo:hi])
+        found = [snapshot.products[snapshot.by_rank[rank]] for rank in ranks]
+
+        completions[query] = found
+        if len(completions) > self.completion_cache_size:
+            completions.popitem(last=False)
+        return found[:limit]
+
+
+# Общий индекс каталога, строится при запуске бота
+product_index = ProductIndex()
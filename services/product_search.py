@@ -1,11 +1,80 @@
+import asyncio
 import difflib
-from typing import Optional, List
-from sqlalchemy import select
-from sqlalchemy.ext.asyncio import AsyncSession
-from database.models import Product
+import uuid
+from typing import Dict, Iterable, Optional, List, Union
+from sqlalchemy import select, func
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
+from database.models import Meta, Portion, Product
+from services.product_index import product_index, IndexedProduct
 
+# Ключ в meta: меняется при каждом изменении каталога, по нему индекс понимает, что устарел
+CATALOG_VERSION_KEY = "catalog_version"
 
-async def find_product(session: AsyncSession, product_name: str) -> Optional[Product]:
+
+class CatalogGate:
+    """
+    Готовность каталога продуктов в БД
+
+    По умолчанию открыт. При запуске бот закрывает его на время синхронизации
+    с products.json в фоне: поиск продуктов ждёт её окончания, остальные
+    обработчики работают сразу.
+    """
+
+    def __init__(self):
+        # Событие создаётся при закрытии, внутри работающего event loop
+        self._synced: Optional[asyncio.Event] = None
+
+    @property
+    def ready(self) -> bool:
+        return self._synced is None or self._synced.is_set()
+
+    def close(self):
+        self._synced = asyncio.Event()
+
+    def open(self):
+        if self._synced is not None:
+            self._synced.set()
+
+    async def wait(self):
+        if not self.ready:
+            await self._synced.wait()
+
+
+catalog_ready = CatalogGate()
+
+
+async def bump_catalog_version(conn: Union[AsyncConnection, AsyncSession]):
+    """Отметить изменение каталога (в текущей транзакции)"""
+    stmt = insert(Meta).values(key=CATALOG_VERSION_KEY, value=uuid.uuid4().hex)
+    await conn.execute(
+        stmt.on_conflict_do_update(index_elements=[Meta.key], set_={"value": stmt.excluded.value})
+    )
+
+
+async def get_catalog_version(session: AsyncSession) -> Optional[str]:
+    return await session.scalar(select(Meta.value).where(Meta.key == CATALOG_VERSION_KEY))
+
+
+async def build_product_index(session: AsyncSession):
+    """Загрузить каталог продуктов и популярность продуктов в индекс в памяти"""
+    # Версия и каталог читаются в одной транзакции, то есть из одного снимка БД
+    version = await get_catalog_version(session)
+    result = await session.execute(
+        select(Product.id, Product.name, Product.kcal_per_100g)
+    )
+    products = [IndexedProduct(*row) for row in result.all()]
+    result = await session.execute(
+        select(Portion.product_id, func.sum(Portion.uses)).group_by(Portion.product_id)
+    )
+    popularity = dict(result.all())
+
+    # Построение индекса на большом каталоге занимает заметное время
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(None, product_index.load, products, popularity, version)
+
+
+async def find_product(session: AsyncSession, product_name: str) -> Optional[Union[Product, IndexedProduct]]:
     """
     Поиск продукта по точному совпадению
 
@@ -14,17 +83,53 @@ async def find_product(session: AsyncSession, product_name: str) -> Optional[Pro
         product_name: название продукта (в нижнем регистре)
 
     Returns:
-        Product или None
+        IndexedProduct из индекса (или Product, пока индекс не построен) либо None
     """
+    await catalog_ready.wait()
+    if product_index.ready:
+        return product_index.get(product_name)
+
     result = await session.execute(
         select(Product).where(Product.name == product_name.lower())
     )
     return result.scalar_one_or_none()
 
 
+async def find_products(session: AsyncSession, product_names: Iterable[str]) -> Dict[str, Union[Product, IndexedProduct]]:
+    """
+    Поиск нескольких продуктов по точному совпадению одним запросом
+
+    Args:
+        session: сессия БД
+        product_names: названия продуктов (в нижнем регистре)
+
+    Returns:
+        найденные продукты по названию; ненайденных в словаре нет
+    """
+    names = {name.lower() for name in product_names}
+    await catalog_ready.wait()
+    if product_index.ready:
+        found = {name: product_index.get(name) for name in names}
+        return {name: product for name, product in found.items() if product is not None}
+
+    result = await session.execute(
+        select(Product).where(Product.name.in_(names))
+    )
+    return {product.name: product for product in result.scalars()}
+
+
+async def get_product_by_id(session: AsyncSession, product_id: int) -> Optional[Union[Product, IndexedProduct]]:
+    """Получить продукт по id (из индекса, если он построен)"""
+    await catalog_ready.wait()
+    if product_index.ready:
+        return product_index.get_by_id(product_id)
+
+    return await session.get(Product, product_id)
+
+
 async def find_similar_products(session: AsyncSession, product_name: str, limit: int = 5) -> List[str]:
     """
-    Поиск похожих продуктов используя difflib
+    Поиск похожих продуктов
 
     Args:
         session: сессия БД
@@ -34,11 +139,16 @@ async def find_similar_products(session: AsyncSession, product_name: str, limit:
     Returns:
         список похожих названий продуктов
     """
-    # Получаем все названия продуктов
+    await catalog_ready.wait()
+    if product_index.ready:
+        # Подсчёт похожести выполняем вне event loop
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, product_index.similar, product_name, limit)
+
+    # Индекс ещё не построен: полный перебор названий из БД
     result = await session.execute(select(Product.name))
     all_products = [row[0] for row in result.all()]
 
-    # Ищем похожие используя difflib
     matches = difflib.get_close_matches(
         product_name.lower(),
         all_products,
@@ -46,4 +156,4 @@ async def find_similar_products(session: AsyncSession, product_name: str, limit:
         cutoff=0.6
     )
 
-    return matches
\ No newline at end of file
+    return matches
@@ -0,0 +1,192 @@
+"""
+Блюда пользователей: состав из продуктов каталога и калорийность на 100 г
+
+Калорийность блюда считается при сохранении и хранится в recipes, так что
+запись блюда — один поиск по (user_id, name) и одна строка в meals, сколько
+бы в нём ни было ингредиентов. В каждом ингредиенте хранится калорийность
+продукта, по которой посчитано блюдо. Когда каталог меняется
+(services.init_data, services.catalog_import), refresh_recipes по индексу
+ix_recipe_ingredients_product находит ингредиенты изменённых продуктов
+и пересчитывает только зависящие от них блюда.
+"""
+import json
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple, Union
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
+from database.models import Product, Recipe, RecipeIngredient
+from services.product_index import IndexedProduct
+
+MAX_RECIPES = 100
+MAX_NAME_LENGTH = 64
+
+
+class RecipeInfo(NamedTuple):
+    """Блюдо, готовое к записи"""
+    id: int
+    name: str
+    kcal_per_100g: float
+
+
+def recipe_density(ingredients: Iterable[Tuple[int, int]], cooked_grams: Optional[int] = None) -> float:
+    """
+    Калорийность блюда на 100 г
+
+    Args:
+        ingredients: пары (ккал на 100 г продукта, граммы)
+        cooked_grams: вес готового блюда; по умолчанию сумма весов ингредиентов
+    """
+    ingredients = list(ingredients)
+    weight = cooked_grams or sum(grams for _, grams in ingredients)
+    return sum(kcal * grams for kcal, grams in ingredients) / weight if weight else 0.0
+
+
+def _id_list(ids: Iterable[int]):
+    """Подзапрос со списком id из одного параметра: без предела SQLite на число параметров"""
+    return select(func.json_each(json.dumps(list(ids))).table_valued("value").c.value)
+
+
+async def save_recipe(
+    session: AsyncSession,
+    user_id: int,
+    name: str,
+    ingredients: List[Tuple[Union[Product, IndexedProduct], int]],
+    cooked_grams: Optional[int] = None
+) -> RecipeInfo:
+    """
+    Сохранить блюдо (в текущей транзакции); блюдо с тем же названием заменяется
+
+    Args:
+        session: сессия БД
+        user_id: ID пользователя в БД
+        name: название в нижнем регистре
+        ingredients: пары (продукт каталога, граммы); один продукт можно указать несколько раз
+        cooked_grams: вес готового блюда, если он отличается от суммы весов
+
+    Returns:
+        сохранённое блюдо
+    """
+    grams: Dict[int, int] = {}
+    kcal: Dict[int, int] = {}
+    for product, amount in ingredients:
+        grams[product.id] = grams.get(product.id, 0) + amount
+        kcal[product.id] = product.kcal_per_100g
+    density = recipe_density(((kcal[product_id], amount) for product_id, amount in grams.items()), cooked_grams)
+
+    recipe_id = await session.scalar(
+        select(Recipe.id).where(Recipe.user_id == user_id, Recipe.name == name)
+    )
+    if recipe_id is None:
+        recipe = Recipe(user_id=user_id, name=name, cooked_grams=cooked_grams, kcal_per_100g=density)
+        session.add(recipe)
+        await session.flush()
+        recipe_id = recipe.id
+    else:
+        await session.execute(
+            update(Recipe).where(Recipe.id == recipe_id).values(cooked_grams=cooked_grams, kcal_per_100g=density)
+        )
+        await session.execute(delete(RecipeIngredient).where(RecipeIngredient.recipe_id == recipe_id))
+
+    session.add_all([
+        RecipeIngredient(recipe_id=recipe_id, product_id=product_id, grams=amount, kcal_per_100g=kcal[product_id])
+        for product_id, amount in grams.items()
+    ])
+    return RecipeInfo(recipe_id, name, density)
+
+
+async def find_recipes(session: AsyncSession, user_id: int, names: Iterable[str]) -> Dict[str, RecipeInfo]:
+    """
+    Блюда пользователя по названиям одним запросом
+
+    Returns:
+        найденные блюда по названию; ненайденных в словаре нет
+    """
+    result = await session.execute(
+        select(Recipe.id, Recipe.name, Recipe.kcal_per_100g)
+        .where(Recipe.user_id == user_id, Recipe.name.in_(set(names)))
+    )
+    return {row.name: RecipeInfo(*row) for row in result}
+
+
+async def get_recipe(session: AsyncSession, recipe_id: int) -> Optional[RecipeInfo]:
+    result = await session.execute(
+        select(Recipe.id, Recipe.name, Recipe.kcal_per_100g).where(Recipe.id == recipe_id)
+    )
+    row = result.one_or_none()
+    return RecipeInfo(*row) if row else None
+
+
+async def list_recipes(session: AsyncSession, user_id: int) -> List[RecipeInfo]:
+    """Блюда пользователя по алфавиту"""
+    result = await session.execute(
+        select(Recipe.id, Recipe.name, Recipe.kcal_per_100g)
+        .where(Recipe.user_id == user_id)
+        .order_by(Recipe.name)
+    )
+    return [RecipeInfo(*row) for row in result]
+
+
+async def count_recipes(session: AsyncSession, user_id: int) -> int:
+    return await session.scalar(select(func.count()).where(Recipe.user_id == user_id))
+
+
+async def delete_recipe(session: AsyncSession, user_id: int, recipe_id: int) -> Optional[str]:
+    """
+    Удалить блюдо пользователя (в текущей транзакции)
+
+    Returns:
+        название удалённого блюда или None, если его уже нет
+    """
+    name = await session.scalar(
+        delete(Recipe).where(Recipe.id == recipe_id, Recipe.user_id == user_id).returning(Recipe.name)
+    )
+    if name is not None:
+        await session.execute(delete(RecipeIngredient).where(RecipeIngredient.recipe_id == recipe_id))
+    return name
+
+
+async def refresh_recipes(conn: Union[AsyncConnection, AsyncSession], product_ids: List[int]) -> int:
+    """
+    Пересчитать блюда с продуктами, калорийность которых изменилась (в текущей транзакции)
+
+    Args:
+        conn: соединение или сессия БД
+        product_ids: продукты, которые добавлены или изменены; лишние id не мешают
+
+    Returns:
+        сколько блюд пересчитано
+    """
+    if not product_ids:
+        return 0
+    current = select(Product.kcal_per_100g).where(Product.id == RecipeIngredient.product_id).scalar_subquery()
+    result = await conn.execute(
+        update(RecipeIngredient)
+        .where(RecipeIngredient.product_id.in_(_id_list(product_ids)), RecipeIngredient.kcal_per_100g != current)
+        .values(kcal_per_100g=current)
+        .returning(RecipeIngredient.recipe_id)
+        .execution_options(synchronize_session=False)
+    )
+    recipe_ids = set(result.scalars())
+    if not recipe_ids:
+        return 0
+
+    of_recipe = RecipeIngredient.recipe_id == Recipe.id
+    kcal = select(func.sum(RecipeIngredient.kcal_per_100g * RecipeIngredient.grams)).where(of_recipe).scalar_subquery()
+    grams = select(func.sum(RecipeIngredient.grams)).where(of_recipe).scalar_subquery()
+    await conn.execute(
+        update(Recipe)
+        .where(Recipe.id.in_(_id_list(recipe_ids)))
+        # * 1.0: в SQLite деление целых — целое
+        .values(kcal_per_100g=kcal * 1.0 / func.coalesce(Recipe.cooked_grams, grams))
+        .execution_options(synchronize_session=False)
+    )
+    return len(recipe_ids)
+
+
+async def detach_products(session: AsyncSession, product_ids: List[int]):
+    """Убрать ссылку на продукты, которые удаляются из каталога (в текущей транзакции); блюда не меняются"""
+    await session.execute(
+        update(RecipeIngredient)
+        .where(RecipeIngredient.product_id.in_(product_ids))
+        .values(product_id=None)
+        .execution_options(synchronize_session=False)
+    )
@@ -0,0 +1,284 @@
+"""
+Планировщик исходящих запросов к Bot API
+
+Подключается к сессии бота как request middleware, поэтому через него
+проходят все вызовы: и из обработчиков, и ответы, которые обработчик
+вернул (при polling). Запросы с chat_id ставятся в очередь своего чата
+и отправляются с учётом лимитов Telegram: общего (SEND_GLOBAL_RATE
+сообщений в секунду) и на чат (SEND_CHAT_RATE с запасом SEND_CHAT_BURST).
+Остальные методы (answerCallbackQuery, getUpdates и т.п.) идут напрямую.
+
+Ответ 429 с retry_after приостанавливает очередь чата на указанное
+время, после чего запрос повторяется (до SEND_MAX_RETRIES раз).
+Интерактивные ответы отправляются раньше массовых рассылок: код рассылки
+помечает свои запросы через bulk_sending().
+"""
+import asyncio
+import contextvars
+import heapq
+import itertools
+import logging
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Deque, Dict, List, Optional, Tuple
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import SendMessage, TelegramMethod
+from config import SEND_GLOBAL_RATE, SEND_CHAT_RATE, SEND_CHAT_BURST, SEND_COALESCE, SEND_MAX_RETRIES
+
+logger = logging.getLogger(__name__)
+
+INTERACTIVE = 0
+BULK = 1
+
+# Максимальная длина текста сообщения в Telegram
+MAX_MESSAGE_LENGTH = 4096
+
+_priority: contextvars.ContextVar[int] = contextvars.ContextVar("send_priority", default=INTERACTIVE)
+
+
+@contextmanager
+def bulk_sending():
+    """Запросы внутри блока уступают очередь интерактивным ответам"""
+    token = _priority.set(BULK)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+class TokenBucket:
+    """Корзина токенов: rate токенов в секунду, не больше burst про запас"""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        # До этого момента отправлять нельзя (retry_after от Telegram)
+        self.paused_until = 0.0
+
+    def _refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self) -> float:
+        """Через сколько секунд будет доступен токен"""
+        now = time.monotonic()
+        self._refill(now)
+        wait = 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+        return max(wait, self.paused_until - now)
+
+    def take(self):
+        self.tokens -= 1
+
+    def pause(self, seconds: float):
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def until_full(self) -> float:
+        """Через сколько секунд корзина наполнится до burst"""
+        now = time.monotonic()
+        self._refill(now)
+        return max((self.burst - self.tokens) / self.rate, self.paused_until - now, 0.0)
+
+    @property
+    def full(self) -> bool:
+        return self.delay() == 0 and self.tokens >= self.burst
+
+
+class _PriorityGate:
+    """Общий лимит: токены достаются ожидающим по приоритету, затем по очереди"""
+
+    def __init__(self, bucket: TokenBucket):
+        self.bucket = bucket
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._seq = itertools.count()
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    async def acquire(self, priority: int):
+        if not self._waiters and self.bucket.delay() == 0:
+            self.bucket.take()
+            return
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), future))
+        self._schedule()
+        await future
+
+    def _schedule(self):
+        if self._timer is None and self._waiters:
+            self._timer = asyncio.get_running_loop().call_later(self.bucket.delay(), self._wake)
+
+    def _wake(self):
+        self._timer = None
+        while self._waiters and self.bucket.delay() == 0:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                self.bucket.take()
+                future.set_result(None)
+        self._schedule()
+
+
+class _Job:
+    __slots__ = ("method", "make_request", "priority", "futures")
+
+    def __init__(self, method: TelegramMethod, make_request: NextRequestMiddlewareType, priority: int):
+        self.method = method
+        self.make_request = make_request
+        self.priority = priority
+        self.futures = [asyncio.get_running_loop().create_future()]
+
+
+class _Chat:
+    """Очереди и лимит одного чата"""
+
+    def __init__(self, rate: float, burst: float):
+        self.bucket = TokenBucket(rate, burst)
+        self.lanes: Tuple[Deque[_Job], Deque[_Job]] = (deque(), deque())
+        self.task: Optional[asyncio.Task] = None
+
+    def pop(self) -> Optional[_Job]:
+        for lane in self.lanes:
+            if lane:
+                return lane.popleft()
+        return None
+
+
+def _mergeable(first: SendMessage, second: TelegramMethod) -> bool:
+    """Можно ли склеить два сообщения в одно без потери смысла"""
+    return (
+        isinstance(second, SendMessage)
+        and first.reply_markup is None
+        and not first.entities and not second.entities
+        and getattr(first, "reply_to_message_id", None) is None
+        and getattr(second, "reply_to_message_id", None) is None
+        and first.parse_mode == second.parse_mode
+        and len(first.text) + len(second.text) + 2 <= MAX_MESSAGE_LENGTH
+    )
+
+
+class SendScheduler(BaseRequestMiddleware):
+    """
+    Request middleware, выравнивающий исходящий поток под лимиты Telegram
+
+    Запросы одного чата отправляются строго по очереди, разные чаты —
+    параллельно в пределах общего лимита. С coalesce=True идущие подряд
+    текстовые сообщения в один чат, успевшие накопиться в очереди,
+    склеиваются в одно (все вызывающие получают одно и то же сообщение).
+    """
+
+    def __init__(
+        self,
+        global_rate: float = SEND_GLOBAL_RATE,
+        chat_rate: float = SEND_CHAT_RATE,
+        chat_burst: float = SEND_CHAT_BURST,
+        coalesce: bool = SEND_COALESCE,
+        max_retries: int = SEND_MAX_RETRIES
+    ):
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.coalesce = coalesce
+        self.max_retries = max_retries
+        # Общий лимит без запаса: запросы идут равномерно, а не пачкой в начале секунды
+        self._global = _PriorityGate(TokenBucket(global_rate, 1))
+        self._chats: Dict[Any, _Chat] = {}
+        # Для логов и бенчмарков
+        self.retries = 0
+        self.merged = 0
+
+    async def __call__(self, make_request: NextRequestMiddlewareType, bot: Bot, method: TelegramMethod) -> Any:
+        chat_id = getattr(method, "chat_id", None)
+        if chat_id is None:
+            return await make_request(bot, method)
+
+        chat = self._chats.get(chat_id)
+        if chat is None:
+            chat = self._chats[chat_id] = _Chat(self.chat_rate, self.chat_burst)
+
+        job = _Job(method, make_request, _priority.get())
+        chat.lanes[job.priority].append(job)
+        if chat.task is None:
+            chat.task = asyncio.create_task(self._drain(bot, chat_id, chat))
+        return await job.futures[0]
+
+    def _merge(self, job: _Job, chat: _Chat):
+        lane = chat.lanes[job.priority]
+        while lane and isinstance(job.method, SendMessage) and _mergeable(job.method, lane[0].method):
+            follower = lane.popleft()
+            job.method = job.method.model_copy(update={
+                "text": f"{job.method.text}\n\n{follower.method.text}",
+                "reply_markup": follower.method.reply_markup,
+            })
+            job.futures.extend(follower.futures)
+            self.merged += 1
+
+    async def _drain(self, bot: Bot, chat_id: Any, chat: _Chat):
+        job = None
+        try:
+            while True:
+                job = chat.pop()
+                if job is None:
+                    break
+                await self._send(bot, chat_id, chat, job)
+        except asyncio.CancelledError:
+            # Остановка бота: ожидающие отправки не дождутся
+            for pending in ([job] if job else []) + [job for lane in chat.lanes for job in lane]:
+                for future in pending.futures:
+                    future.cancel()
+            chat.lanes[INTERACTIVE].clear()
+            chat.lanes[BULK].clear()
+            raise
+        finally:
+            chat.task = None
+            # Состояние простаивающего чата не храним, когда его лимит восстановится:
+            # иначе после рассылки по всем пользователям в памяти остались бы все чаты
+            if not any(chat.lanes):
+                if chat.bucket.full:
+                    self._chats.pop(chat_id, None)
+                else:
+                    asyncio.get_running_loop().call_later(chat.bucket.until_full(), self._forget, chat_id, chat)
+
+    def _forget(self, chat_id: Any, chat: _Chat):
+        if self._chats.get(chat_id) is chat and chat.task is None and not any(chat.lanes):
+            self._chats.pop(chat_id)
+
+    async def _send(self, bot: Bot, chat_id: Any, chat: _Chat, job: _Job):
+        for attempt in range(self.max_retries + 1):
+            delay = chat.bucket.delay()
+            while delay > 0:
+                await asyncio.sleep(delay)
+                delay = chat.bucket.delay()
+            chat.bucket.take()
+            await self._global.acquire(job.priority)
+            # Пока ждали лимита, в очередь могли прийти ещё сообщения
+            if self.coalesce:
+                self._merge(job, chat)
+            # Вызывающий уже не ждёт ответа (например, остановлена рассылка): не отправляем
+            if all(future.cancelled() for future in job.futures):
+                return
+
+            try:
+                response = await job.make_request(bot, job.method)
+            except TelegramRetryAfter as e:
+                if attempt == self.max_retries:
+                    self._fail(job, e)
+                    return
+                self.retries += 1
+                logger.warning("⏳ Лимит Telegram в чате %s, повтор через %d с", chat_id, e.retry_after)
+                chat.bucket.pause(e.retry_after)
+                continue
+            except Exception as e:
+                self._fail(job, e)
+                return
+
+            for future in job.futures:
+                if not future.done():
+                    future.set_result(response)
+            return
+
+    @staticmethod
+    def _fail(job: _Job, error: BaseException):
+        for future in job.futures:
+            if not future.done():
+                future.set_exception(error)
@@ -0,0 +1,163 @@
+"""
+Запуск бота: замеры этапов и прогрев каталога в фоне
+
+Бот начинает принимать апдейты, как только готова схема БД.
+Синхронизация каталога с products.json и построение индекса продуктов
+идут в фоне; поиск продуктов ждёт только синхронизации (catalog_ready),
+а до построения индекса ищет по БД. Дальше CatalogWatcher перестраивает
+индекс, когда каталог изменился.
+"""
+import asyncio
+import logging
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from config import CATALOG_REFRESH_SECONDS
+from database.db import read_session_maker
+from services.init_data import load_products
+from services.product_index import product_index
+from services.product_search import build_product_index, catalog_ready, get_catalog_version
+
+logger = logging.getLogger(__name__)
+
+
+class StartupTimings:
+    """Длительность этапов запуска в порядке их начала"""
+
+    def __init__(self):
+        self.phases: Dict[str, float] = {}
+
+    def record(self, name: str, seconds: float):
+        self.phases[name] = seconds
+
+    @contextmanager
+    def phase(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - started)
+
+    def summary(self, *names: str) -> str:
+        """Строка для лога: выбранные этапы или все"""
+        return ", ".join(
+            f"{name} {seconds:.2f} с"
+            for name, seconds in self.phases.items()
+            if not names or name in names
+        )
+
+
+startup_timings = StartupTimings()
+
+
+async def warm_up_catalog(
+    session_maker: async_sessionmaker,
+    read_session_maker: async_sessionmaker,
+    sync: bool = True,
+    timings: Optional[StartupTimings] = None
+):
+    """
+    Синхронизировать каталог и построить индекс продуктов
+
+    Ошибка синхронизации не блокирует бота: поиск продолжит работать
+    по тому каталогу, что уже есть в БД. Если не удалось построить индекс,
+    поиск идёт по БД, а индекс построит CatalogWatcher.
+
+    Args:
+        session_maker: фабрика сессий для записи
+        read_session_maker: фабрика сессий для чтения; каталог для индекса
+            читается через неё, чтобы не занимать соединение записи
+        sync: синхронизировать каталог с products.json
+        timings: куда записать длительность этапов
+    """
+    timings = timings or startup_timings
+    try:
+        if sync:
+            with timings.phase("catalog_sync"):
+                async with session_maker() as session:
+                    await load_products(session)
+    except Exception:
+        logger.exception("❌ Не удалось синхронизировать каталог продуктов")
+    finally:
+        catalog_ready.open()
+
+    try:
+        with timings.phase("product_index"):
+            async with read_session_maker() as session:
+                await build_product_index(session)
+    except Exception:
+        logger.exception("❌ Не удалось построить индекс продуктов")
+        return
+
+    logger.info("🔥 Каталог прогрет: %s", timings.summary("catalog_sync", "product_index"))
+
+
+# Индекс перестраивается и без изменений каталога, чтобы обновить популярность продуктов
+POPULARITY_REFRESH_HOURS = 24
+
+
+class CatalogWatcher:
+    """
+    Перестроение индекса продуктов при изменении каталога
+
+    Раз в interval секунд сверяет версию каталога в meta с версией, по
+    которой построен индекс: каталог мог изменить импорт из другого
+    процесса. Новый индекс строится в пуле потоков и подменяет старый
+    целиком, поиск всё это время работает по старому.
+    """
+
+    def __init__(self, read_session_maker: async_sessionmaker, interval: float):
+        self.read_session_maker = read_session_maker
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+        self._warmup: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self, warmup: Optional[asyncio.Task] = None):
+        """
+        Args:
+            warmup: задача warm_up_catalog; пока она идёт, индекс строит она
+        """
+        self._warmup = warmup
+        if self.interval and not self.running:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if not self.running:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            # Первое построение ещё идёт (warm_up_catalog); если оно не удалось,
+            # индекс не готов и строится здесь
+            if not product_index.ready and self._warmup is not None and not self._warmup.done():
+                continue
+            try:
+                async with self.read_session_maker() as session:
+                    version = await get_catalog_version(session)
+                    if version == product_index.version and product_index.age < POPULARITY_REFRESH_HOURS * 3600:
+                        continue
+                    started = time.perf_counter()
+                    await build_product_index(session)
+                logger.info(
+                    "🔄 Индекс продуктов перестроен за %.1f с: %d продуктов",
+                    time.perf_counter() - started,
+                    len(product_index)
+                )
+            except Exception:
+                logger.exception("❌ Не удалось перестроить индекс продуктов")
+
+
+# Запускается при старте бота
+catalog_watcher = CatalogWatcher(read_session_maker, CATALOG_REFRESH_SECONDS)
@@ -0,0 +1,111 @@
+from collections import OrderedDict
+from typing import NamedTuple, Optional
+from sqlalchemy import select
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from config import USER_CACHE_SIZE
+from database.models import User
+
+DEFAULT_DAILY_GOAL = 2000
+
+
+class CachedUser(NamedTuple):
+    """Данные пользователя, которые нужны обработчикам"""
+    id: int
+    telegram_id: int
+    daily_goal: int
+
+
+class UserCache:
+    """LRU-кэш пользователей по telegram_id"""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._items: "OrderedDict[int, CachedUser]" = OrderedDict()
+
+    def get(self, telegram_id: int) -> Optional[CachedUser]:
+        user = self._items.get(telegram_id)
+        if user is not None:
+            self._items.move_to_end(telegram_id)
+        return user
+
+    def put(self, user: CachedUser):
+        self._items[user.telegram_id] = user
+        self._items.move_to_end(user.telegram_id)
+        if len(self._items) > self.maxsize:
+            self._items.popitem(last=False)
+
+    def invalidate(self, telegram_id: int):
+        self._items.pop(telegram_id, None)
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+
+user_cache = UserCache(USER_CACHE_SIZE)
+
+
+async def _select_user(session: AsyncSession, telegram_id: int) -> Optional[CachedUser]:
+    result = await session.execute(
+        select(User.id, User.telegram_id, User.daily_goal).where(User.telegram_id == telegram_id)
+    )
+    row = result.one_or_none()
+    return CachedUser(*row) if row else None
+
+
+async def get_user(session: AsyncSession, telegram_id: int, create: bool = True) -> Optional[CachedUser]:
+    """
+    Получить пользователя (из кэша или БД), при необходимости создать
+
+    Создание — один INSERT ... ON CONFLICT DO NOTHING RETURNING, поэтому
+    одновременные первые сообщения не падают на уникальном ключе.
+
+    Args:
+        session: сессия БД
+        telegram_id: ID пользователя в Telegram
+        create: создать пользователя, если его нет
+
+    Returns:
+        CachedUser или None (если create=False и пользователя нет)
+    """
+    user = user_cache.get(telegram_id)
+    if user is not None:
+        return user
+
+    user = await _select_user(session, telegram_id)
+
+    if user is None and create:
+        result = await session.execute(
+            insert(User)
+            .values(telegram_id=telegram_id, daily_goal=DEFAULT_DAILY_GOAL)
+            .on_conflict_do_nothing(index_elements=[User.telegram_id])
+            .returning(User.id, User.telegram_id, User.daily_goal)
+        )
+        row = result.one_or_none()
+        await session.commit()
+
+        # Пользователя успел создать параллельный запрос
+        user = CachedUser(*row) if row else await _select_user(session, telegram_id)
+
+    if user is not None:
+        user_cache.put(user)
+
+    return user
+
+
+async def set_daily_goal(session: AsyncSession, telegram_id: int, daily_goal: int) -> CachedUser:
+    """Установить дневную норму (создав пользователя при необходимости) и обновить кэш"""
+    stmt = insert(User).values(telegram_id=telegram_id, daily_goal=daily_goal)
+    result = await session.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[User.telegram_id],
+            set_={"daily_goal": stmt.excluded.daily_goal}
+        ).returning(User.id, User.telegram_id, User.daily_goal)
+    )
+    user = CachedUser(*result.one())
+
+    user_cache.invalidate(telegram_id)
+    await session.commit()
+    user_cache.put(user)
+
+    return user
@@ -9,4 +9,10 @@ class AddProductStates(StatesGroup):
 
 class SetGoalStates(StatesGroup):
     """Состояния для установки нормы"""
-    waiting_for_goal = State()
\ No newline at end of file
+    waiting_for_goal = State()
+
+
+class RecipeStates(StatesGroup):
+    """Состояния для создания блюда"""
+    waiting_for_ingredients = State()
+    waiting_for_weight = State()